@@ -0,0 +1,131 @@
+"""
+Benchmark ListingOptimizer.parse_optimization_response over a batch of responses.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_optimizer_parser [--responses DIR] [--count N]
+
+Recorded Gemini responses are read from DIR (one *.txt file per response);
+without it a batch of synthetic responses in the same shape is generated.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import time
+from typing import Dict, List
+
+from services.listing_optimizer import ListingOptimizer, SECTION_NAMES
+
+
+def legacy_parse(response: str) -> Dict:
+    """The original line-splitting parser, kept for comparison"""
+    sections = {}
+    current_section = None
+    current_content = []
+    for line in response.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line.endswith(':'):
+            if current_section:
+                sections[current_section] = '\n'.join(current_content).strip()
+            current_section = line[:-1]
+            current_content = []
+        else:
+            current_content.append(line)
+    if current_section:
+        sections[current_section] = '\n'.join(current_content).strip()
+    return sections
+
+
+def legacy_structured(response: str) -> Dict:
+    """
+    The original parser plus the fix-up callers needed to get lists and dicts
+    out of its sections, i.e. the work the current parser replaces
+    """
+    sections = legacy_parse(response)
+    for name, body in sections.items():
+        key = name.strip('#*_ ').lower()
+        if key in ('tags', 'key features', 'specifications', 'unique selling points'):
+            sections[name] = [re.sub(r'^\s*(?:[-*\u2022]|\d+[.)])\s*', '', line) for line in body.split('\n')]
+        elif key in ('item specifics', 'additional attributes'):
+            sections[name] = dict(
+                (k.strip('-* '), v.strip()) for k, _, v in (line.partition(':') for line in body.split('\n'))
+            )
+    return sections
+
+
+def unknown_sections(parse, responses: List[str]) -> int:
+    """Sections whose name is not one of the prompt's section headers"""
+    return sum(
+        1 for response in responses for name in parse(response)
+        if name.strip('#*_ ').lower() not in SECTION_NAMES
+    )
+
+
+def synthetic_response(rng: random.Random) -> str:
+    words = ['vinyl', 'collectible', 'exclusive', 'figure', 'marvel', 'limited', 'boxed', 'rare', 'mint', 'vaulted']
+    paragraph = lambda n: ' '.join(rng.choice(words) for _ in range(n)).capitalize() + '.'
+    bold = rng.random() < 0.5
+    header = (lambda name: f"**{name}:**") if bold else (lambda name: f"{name}:")
+    description = '\n'.join(paragraph(rng.randint(20, 40)) for _ in range(rng.randint(4, 10)))
+    return '\n\n'.join([
+        f"{header('Title')} {paragraph(10)}",
+        f"{header('Short Description')}\n{paragraph(18)}",
+        f"{header('Description')}\n{description}\nWhat's in the box:\n- {paragraph(4)}\nAdd to Cart today!",
+        f"{header('Unique Selling Points')}\n" + '\n'.join(f"- {paragraph(6)}" for _ in range(4)),
+        f"{header('Key Features')}\n" + '\n'.join(f"* {paragraph(5)}" for _ in range(5)),
+        f"{header('Specifications')}\n" + '\n'.join(f"- Spec {i}: {paragraph(2)}" for i in range(5)),
+        f"{header('Item Specifics')}\n" + '\n'.join(f"Aspect {i}: {rng.choice(words)}" for i in range(12)),
+        f"{header('Tags')}\n" + '\n'.join(f"- {rng.choice(words)} {rng.choice(words)}" for _ in range(15)),
+        f"{header('Additional Attributes')}\n" + '\n'.join(f"- Attr {i}: {rng.choice(words)}" for i in range(6)),
+    ])
+
+
+def load_responses(directory: str) -> List[str]:
+    responses = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.txt'))):
+        with open(path, encoding='utf-8') as f:
+            responses.append(f.read())
+    return responses
+
+
+def run(name: str, parse, responses: List[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for response in responses:
+            parse(response)
+        best = min(best, time.perf_counter() - start)
+    per_item_us = best / len(responses) * 1e6
+    print(f"{name:<10} {best * 1000:9.2f} ms total  {per_item_us:8.1f} us/response")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--responses', help='Directory of recorded responses (*.txt)')
+    parser.add_argument('--count', type=int, default=2000, help='Synthetic responses to generate')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.responses:
+        responses = load_responses(args.responses)
+    else:
+        rng = random.Random(42)
+        responses = [synthetic_response(rng) for _ in range(args.count)]
+    if not responses:
+        raise SystemExit('No responses to parse')
+
+    optimizer = ListingOptimizer.__new__(ListingOptimizer)  # parsing needs no model
+    print(f"Parsing {len(responses)} responses, best of {args.repeat}")
+    legacy = run('legacy', legacy_structured, responses, args.repeat)
+    current = run('current', optimizer.parse_optimization_response, responses, args.repeat)
+    print(f"speedup    {legacy / current:9.2f}x")
+    print(f"misparsed sections: legacy {unknown_sections(legacy_parse, responses)}, "
+          f"current {unknown_sections(optimizer.parse_optimization_response, responses)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Microbenchmarks for the CPU-bound helpers that run on every listing:
+prompt building, confidence scoring and keyword extraction in GeminiService,
+ListingOptimizer's response parser, template filling, the Taxonomy aspect
+filtering in EbayListingService and VisionService.extract_product_details.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_services [--filter NAME] [--rounds 7] [--min-time 0.2]
+        [--save results.json] [--compare results.json]
+
+Inputs are built from benchmarks/fixtures at listing scale: the 80-aspect
+Taxonomy category, a 2 KB description, the ~24 KB collectibles template.
+Each case reports per-call time (min/median of --rounds rounds) and, in a
+separate tracemalloc pass so tracing doesn't skew the timings, the peak
+memory a call allocates and the memory it leaves behind.
+
+Save a run before an optimization and --compare against it afterwards.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.bench_optimizer_parser import synthetic_response
+from benchmarks.mock_upstream import FIXTURES_DIR, load_fixture
+from services.ebay_listing_service import EbayListingService
+from services.gemini_service import GeminiService
+from services.listing_optimizer import ListingOptimizer
+from services.template_renderer import compile_template
+from services.template_service import TemplateService
+from services.vision_service import VisionService
+
+# The category with a full 80-aspect definition in the Taxonomy fixture
+CATEGORY_ID = '149372'
+WORDS = ['funko', 'pop', 'vinyl', 'figure', 'marvel', 'spider-man', 'exclusive', 'limited', 'edition', 'boxed',
+         'collectible', 'mint', 'condition', 'glow', 'dark', 'chase', 'vaulted', 'retired', 'rare', 'sealed',
+         'the', 'and', 'with', 'for', 'in', 'original', 'packaging', 'display', 'shelf', 'window']
+
+
+class Case:
+    def __init__(self, name: str, func: Callable[[], object], note: str = ''):
+        self.name = name
+        self.func = func
+        self.note = note
+
+
+def description(rng: random.Random, size: int = 2048) -> str:
+    sentences = []
+    length = 0
+    while length < size:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + '.'
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(sentences)[:size]
+
+
+def listing_context(rng: random.Random, aspects: List[Dict]) -> Dict:
+    """A listing's context as the item-specifics route assembles it"""
+    return {
+        'title': 'Funko Pop! Marvel Spider-Man #593 Glow in the Dark Exclusive Vinyl Figure',
+        'description': description(rng),
+        'upc': '889698123456',
+        'quantity': 3,
+        'brand': 'Funko',
+        'model': '593',
+        'color': 'Red',
+        'size': '3.75 in',
+        'dimensions': '4.5 x 3.5 x 6.25 in',
+        'weight': '0.4 lb',
+        'images': [f"https://i.ebayimg.com/images/g/{i:04d}/s-l1600.jpg" for i in range(12)],
+        'category': 'Collectibles > Animation Art & Merchandise > Animation Merchandise > Figures',
+        'additional_attributes': {f"Attribute {i}": ' '.join(rng.sample(WORDS, 3)) for i in range(20)},
+        'previous_values': {
+            aspect['name']: (aspect['values'] or ['Unknown'])[0] for aspect in aspects[:30]
+        },
+    }
+
+
+def suggested_values(aspects: List[Dict], rng: random.Random) -> List[tuple]:
+    """One suggestion per aspect, mixing allowed values, free text and blanks"""
+    suggestions = []
+    for aspect in aspects:
+        roll = rng.random()
+        if aspect['values'] and roll < 0.6:
+            value = rng.choice(aspect['values'])
+        elif roll < 0.9:
+            value = ' '.join(rng.sample(WORDS, 2)).title()
+        else:
+            value = ''
+        suggestions.append((value, aspect['name']))
+    return suggestions
+
+
+def template_data(rng: random.Random) -> Dict:
+    return {
+        'title': 'Funko Pop! Marvel Spider-Man #593 Glow in the Dark Exclusive',
+        'condition': 'New',
+        'description': description(rng),
+        'brand': 'Funko',
+        'model': '593',
+        'features': [' '.join(rng.sample(WORDS, 4)) for _ in range(12)],
+        'shipping': {'service': 'USPS Ground Advantage', 'cost': '5.25', 'handling_days': 1},
+        'returns': {'accepted': True, 'days': 30, 'paid_by': 'Buyer'},
+        'payment': {'methods': ['PayPal', 'Credit Card']},
+        'images': [f"https://i.ebayimg.com/images/g/{i:04d}/s-l1600.jpg" for i in range(12)],
+    }
+
+
+def build_cases(seed: int = 42) -> List[Case]:
+    rng = random.Random(seed)
+
+    # Services are created without __init__ where it would need credentials;
+    # the benchmarked helpers don't touch the clients
+    listing_service = EbayListingService.__new__(EbayListingService)
+    gemini = GeminiService.__new__(GeminiService)
+    optimizer = ListingOptimizer.__new__(ListingOptimizer)
+    vision_service = VisionService.__new__(VisionService)
+    template_service = TemplateService()
+
+    taxonomy = load_fixture('taxonomy_fetch_item_aspects.json.gz')
+    parsed = listing_service._parse_item_aspects(taxonomy, CATEGORY_ID)
+    aspects = [
+        {**aspect, 'required': kind == 'required'}
+        for kind, group in parsed.items() for aspect in group
+    ]
+    context = listing_context(rng, aspects)
+    suggestions = suggested_values(aspects, rng)
+
+    responses = [synthetic_response(rng) for _ in range(20)]
+    response_iter = itertools.cycle(responses)
+
+    with open(os.path.join(FIXTURES_DIR, 'templates', 'collectibles-ebay-template.html'), encoding='utf-8') as f:
+        template = f.read()
+    data = template_data(rng)
+
+    from google.cloud import vision
+    vision_response = vision.AnnotateImageResponse.from_json(
+        json.dumps(load_fixture('vision_batch_annotate.json')['responses'][0])
+    )
+    vision_result = vision_service._parse_response(vision_response)
+
+    def confidence_all():
+        for value, name in suggestions:
+            gemini._calculate_confidence(value, name, context)
+
+    def fill_cold():
+        compile_template.cache_clear()
+        return template_service.fill_template(template, data)
+
+    return [
+        Case('gemini.build_multiple_aspects_prompt',
+             lambda: gemini._build_multiple_aspects_prompt(aspects, context),
+             f"{len(aspects)} aspects, {len(context['description'])} B description"),
+        Case('gemini.calculate_confidence',
+             confidence_all,
+             f"{len(suggestions)} suggestions per call"),
+        Case('gemini.extract_keywords',
+             lambda: gemini._extract_keywords(context),
+             f"{len(context['description'])} B description"),
+        Case('optimizer.parse_optimization_response',
+             lambda: optimizer.parse_optimization_response(next(response_iter)),
+             f"{sum(map(len, responses)) // len(responses)} B average response"),
+        Case('template.fill_template',
+             lambda: template_service.fill_template(template, data),
+             f"{len(template) // 1024} KB template, compiled plan cached"),
+        Case('template.fill_template_cold',
+             fill_cold,
+             'including compiling the render plan'),
+        Case('listing.parse_item_aspects',
+             lambda: listing_service._parse_item_aspects(taxonomy, CATEGORY_ID),
+             f"{len(taxonomy['categoryAspects'])} categories, {len(aspects)} aspects kept"),
+        Case('vision.extract_product_details',
+             lambda: vision_service.extract_product_details(vision_result),
+             f"{len(vision_result['labels'])} labels, {len(vision_result['text'])} text blocks"),
+    ]
+
+
+def calls_per_round(func: Callable, min_time: float) -> int:
+    """Calls needed for one round to last at least min_time seconds"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 2
+
+
+def time_case(case: Case, rounds: int, min_time: float) -> Dict:
+    number = calls_per_round(case.func, min_time)
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            case.func()
+        per_call.append((time.perf_counter() - start) / number)
+    return {
+        'calls': number * rounds,
+        'min_us': round(min(per_call) * 1e6, 2),
+        'median_us': round(statistics.median(per_call) * 1e6, 2),
+        'stdev_us': round(statistics.stdev(per_call) * 1e6, 2) if len(per_call) > 1 else 0.0,
+    }
+
+
+def measure_memory(case: Case, calls: int = 50) -> Dict:
+    """
+    Peak bytes allocated during a call and bytes still held after its
+    result is dropped (caches, leaks), the median over `calls` calls after a warm-up call
+    """
+    case.func()
+    tracemalloc.start()
+    try:
+        peaks = []
+        retained = []
+        for _ in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = case.func()
+            peak = tracemalloc.get_traced_memory()[1]
+            # The return value is the caller's; only what the call keeps counts as retained
+            del result
+            peaks.append(peak - before)
+            retained.append(tracemalloc.get_traced_memory()[0] - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_kb': round(statistics.median(peaks) / 1024, 2),
+        'retained_kb': round(statistics.median(retained) / 1024, 2),
+    }
+
+
+def change(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ''
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def print_report(results: Dict[str, Dict], previous: Optional[Dict[str, Dict]] = None):
+    header = f"{'case':<40} {'min us':>10} {'median us':>10} {'peak KB':>9} {'kept KB':>8}"
+    if previous:
+        header += f" {'time':>8} {'peak':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        line = (f"{name:<40} {result['min_us']:>10.1f} {result['median_us']:>10.1f} "
+                f"{result['peak_kb']:>9.1f} {result['retained_kb']:>8.1f}")
+        if previous and name in previous:
+            line += (f" {change(result['median_us'], previous[name]['median_us']):>8}"
+                     f" {change(result['peak_kb'], previous[name]['peak_kb']):>8}")
+        print(line)
+        if result.get('note'):
+            print(f"  {result['note']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', action='append', help='Only run cases whose name contains this (repeatable)')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per round')
+    parser.add_argument('--memory-calls', type=int, default=50, help='Calls measured under tracemalloc')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Show the change against results saved with --save')
+    args = parser.parse_args()
+
+    cases = build_cases(args.seed)
+    if args.filter:
+        cases = [case for case in cases if any(f in case.name for f in args.filter)]
+    if not cases:
+        raise SystemExit('No benchmark matches the filter')
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)['results']
+
+    results = {}
+    for case in cases:
+        print(f"Running {case.name}", flush=True)
+        results[case.name] = {**time_case(case, args.rounds, args.min_time),
+                              **measure_memory(case, args.memory_calls),
+                              'note': case.note}
+    print()
+    print_report(results, previous)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'rounds': args.rounds, 'min_time': args.min_time, 'results': results}, f, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""
+Load-test the API against the mock upstreams and compare with a baseline.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test [--scenario upc_batch --scenario item_specifics ...]
+        [--concurrency 16] [--requests N] [--workers 1]
+        [--latency-ms 40] [--upstream gemini:latency_ms=900] [--error-rate 0.01]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.15]
+        [--output results.json]
+
+Starts benchmarks.mock_upstream and a uvicorn server for main:app (with a
+throwaway data directory), drives each scenario at the given concurrency,
+and reports throughput, latency percentiles, failures and the server's peak
+RSS, plus how often the event-loop watchdog saw the loop blocked. With a
+baseline, exits non-zero when throughput, p95, p99 or RSS regress beyond
+the tolerance, the failure rate grows, or the loop blocks more often (sync
+I/O back on the loop).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.mock_upstream import add_arguments, upstream_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Upstream credentials only need to be present; the mock ignores them
+DUMMY_CREDENTIALS = {
+    'EBAY_APP_ID': 'bench-app', 'EBAY_CERT_ID': 'bench-cert', 'EBAY_DEV_ID': 'bench-dev',
+    'EBAY_AUTH_TOKEN': 'bench-token', 'GOOGLE_API_KEY': 'bench-key', 'EBAY_USE_SANDBOX': 'false',
+}
+
+DESCRIPTION = (
+    "Officially licensed vinyl collectible in its original window box. The figure stands about 3.75 inches "
+    "tall and has been stored in a smoke-free, pet-free home away from sunlight. "
+) * 12
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    requests: int
+    build: Callable[[int], Dict]
+    validate: Callable[[httpx.Response], bool]
+
+
+def upc_batch(i: int) -> Dict:
+    # Fresh UPCs per request so every item goes upstream
+    return {'json': {'items': [{'upc': f"{890000000000 + i * 500 + j:012d}", 'quantity': 1} for j in range(500)]}}
+
+
+def item_specifics(i: int) -> Dict:
+    return {'json': {
+        'category_id': '149372',
+        'marketplace_id': 'EBAY_US',
+        'context': {
+            'title': f"Funko Pop! Marvel Spider-Man No Way Home #{1000 + i} Vinyl Figure",
+            'description': DESCRIPTION,
+            'item_specifics': {'Brand': 'Funko', 'Franchise': 'Marvel'}
+        }
+    }}
+
+
+def template_fill(i: int) -> Dict:
+    return {'json': {
+        'title': f"Funko Pop! Marvel Spider-Man #{1000 + i}",
+        'description': DESCRIPTION,
+        'condition': 'New in box',
+        'brand': 'Funko',
+        'model': str(50000 + i),
+        'features': ['Vinyl', 'Boxed', 'Officially licensed', 'Window display box'],
+        'images': [f"https://i.ebayimg.com/images/g/{i}-{n}/s-l1600.jpg" for n in range(8)]
+    }}
+
+
+def _jpeg(seed: int) -> bytes:
+    from PIL import Image
+    rng = random.Random(seed)
+    image = Image.new('RGB', (64, 64))
+    image.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(64 * 64)])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def vision_analyze(i: int) -> Dict:
+    return {'files': [('images', (f"photo{n}.jpg", _jpeg(i * 3 + n), 'image/jpeg')) for n in range(3)]}
+
+
+def all_succeeded(response: httpx.Response) -> bool:
+    return response.status_code == 200 and all(item.get('success') for item in response.json())
+
+
+def is_ok(response: httpx.Response) -> bool:
+    return response.status_code == 200
+
+
+SCENARIOS = {
+    'upc_batch': Scenario('upc_batch', 'POST', '/api/upc/batch', 20, upc_batch, all_succeeded),
+    'item_specifics': Scenario('item_specifics', 'POST', '/api/ai/item-specifics', 300, item_specifics, is_ok),
+    'template_fill': Scenario('template_fill', 'POST', '/api/templates/collectibles/fill', 2000, template_fill, is_ok),
+    'vision': Scenario('vision', 'POST', '/api/vision/analyze-multiple', 100, vision_analyze, is_ok),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """
+    Resident memory in bytes of a process and its children (Linux /proc only)
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            if current == pid:
+                return None
+    return total
+
+
+LOOP_BLOCKS_RE = re.compile(r'^event_loop_blocks_total\{site="(.*)"\} (\S+)$', re.MULTILINE)
+
+
+async def loop_blocks(client: httpx.AsyncClient) -> Dict[str, int]:
+    """
+    The server's event-loop block counts by code site, from /metrics.
+    With --workers above 1 each scrape reaches one worker, so this undercounts
+    """
+    text = (await client.get('/metrics')).text
+    return {site: int(float(count)) for site, count in LOOP_BLOCKS_RE.findall(text)}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def wait_until_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int,
+                       warmup: int, server_pid: Optional[int]) -> Dict:
+    for i in range(warmup):
+        await client.request(scenario.method, scenario.path, **scenario.build(-1 - i))
+    blocks_before = await loop_blocks(client)
+
+    latencies: List[float] = []
+    failures = 0
+    statuses: Dict[str, int] = {}
+    next_index = 0
+    peak_rss = process_tree_rss(server_pid) if server_pid else None
+
+    async def worker():
+        nonlocal next_index, failures
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            kwargs = scenario.build(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.path, **kwargs)
+                ok = scenario.validate(response)
+                status = str(response.status_code)
+            except (httpx.HTTPError, ValueError) as e:
+                ok = False
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not ok:
+                failures += 1
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            await asyncio.sleep(0.1)
+            rss = process_tree_rss(server_pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+
+    sampler = asyncio.create_task(sample_rss()) if server_pid else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if sampler:
+        sampler.cancel()
+
+    latencies.sort()
+    blocks_after = await loop_blocks(client)
+    block_sites = {site: count - blocks_before.get(site, 0) for site, count in blocks_after.items()
+                   if count > blocks_before.get(site, 0)}
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'failures': failures,
+        'failure_rate': round(failures / requests, 4) if requests else 0.0,
+        'statuses': statuses,
+        'seconds': round(elapsed, 3),
+        'throughput': round(requests / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'peak_rss_mb': round(peak_rss / 2 ** 20, 1) if peak_rss else None,
+        'loop_blocks': sum(block_sites.values()),
+        'loop_block_sites': block_sites,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float, rss_tolerance: float) -> List[str]:
+    """
+    Regressions of `results` against `baseline`, as readable lines
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']} < baseline {base['throughput']}")
+        for key in ('p95_ms', 'p99_ms'):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {current[key]} > baseline {base[key]}")
+        if current['failure_rate'] > base['failure_rate'] + 0.01:
+            regressions.append(f"{name}: failure rate {current['failure_rate']} > baseline {base['failure_rate']}")
+        if current['peak_rss_mb'] and base.get('peak_rss_mb') and \
+                current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_tolerance):
+            regressions.append(f"{name}: peak RSS {current['peak_rss_mb']} MB > baseline {base['peak_rss_mb']} MB")
+        # One block of slack: a slow import or GC pause can cross the threshold by chance
+        if 'loop_blocks' in base and current['loop_blocks'] > base['loop_blocks'] * (1 + tolerance) + 1:
+            regressions.append(f"{name}: event loop blocked {current['loop_blocks']} times > baseline "
+                               f"{base['loop_blocks']} ({current['loop_block_sites']})")
+    return regressions
+
+
+def print_report(results: Dict, baseline: Optional[Dict]):
+    header = f"{'scenario':<16}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'fail':>8}{'RSS MB':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f"{name:<16}{r['throughput']:>9.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['failure_rate']:>8.1%}{r['peak_rss_mb'] or 0:>9.1f}")
+        base = (baseline or {}).get('scenarios', {}).get(name)
+        if base:
+            print(f"{'  baseline':<16}{base['throughput']:>9.1f}{base['p50_ms']:>10.1f}{base['p95_ms']:>10.1f}"
+                  f"{base['p99_ms']:>10.1f}{base['failure_rate']:>8.1%}{base.get('peak_rss_mb') or 0:>9.1f}")
+        if r['failures']:
+            print(f"  responses: {r['statuses']}")
+        if r['loop_blocks']:
+            print(f"  event loop blocked: {r['loop_block_sites']}")
+
+
+async def drive(args, scenarios: List[Scenario]) -> Dict:
+    port, mock_port, grpc_port = free_port(), free_port(), free_port()
+    data_dir = tempfile.mkdtemp(prefix='aimagic-bench-')
+    env = {
+        **os.environ,
+        **DUMMY_CREDENTIALS,
+        **upstream_env('127.0.0.1', mock_port, grpc_port),
+        'AIMAGIC_DATA_DIR': data_dir,
+        'PYTHONUNBUFFERED': '1',
+    }
+
+    mock_cmd = [sys.executable, '-m', 'benchmarks.mock_upstream', '--port', str(mock_port),
+                '--grpc-port', str(grpc_port), '--latency-ms', str(args.latency_ms),
+                '--jitter-ms', str(args.jitter_ms), '--error-rate', str(args.error_rate)]
+    for override in args.upstream or []:
+        mock_cmd += ['--upstream', override]
+    server_cmd = [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+                  '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log']
+
+    processes = [
+        subprocess.Popen(mock_cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL),
+        subprocess.Popen(server_cmd, cwd=BACKEND_DIR, env=env),
+    ]
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{mock_port}/_stats")
+        await wait_until_ready(f"http://127.0.0.1:{port}/api/health")
+
+        results = {}
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout,
+                                     limits=limits) as client:
+            for scenario in scenarios:
+                requests = args.requests or scenario.requests
+                print(f"Running {scenario.name}: {requests} requests at concurrency {args.concurrency}", flush=True)
+                results[scenario.name] = await run_scenario(
+                    client, scenario, requests, args.concurrency, args.warmup, processes[1].pid
+                )
+            upstream_calls = (await client.get(f"http://127.0.0.1:{mock_port}/_stats")).json()
+        return {'scenarios': results, 'upstream_calls': upstream_calls}
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (repeatable; default: all)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, help='Requests per scenario (default: per-scenario)')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests before each scenario')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed throughput/latency regression')
+    parser.add_argument('--rss-tolerance', type=float, default=0.25, help='Allowed peak RSS growth')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [SCENARIOS[name] for name in (args.scenario or SCENARIOS)]
+    run = asyncio.run(drive(args, scenarios))
+    run['settings'] = {
+        'concurrency': args.concurrency, 'workers': args.workers, 'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate, 'upstream': args.upstream or [],
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print()
+    print_report(run['scenarios'], baseline)
+    print(f"\nupstream calls: {run['upstream_calls']['calls']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    if args.save_baseline:
+        failing = [name for name, r in run['scenarios'].items() if r['failure_rate'] > 0]
+        if failing:
+            raise SystemExit(f"Not saving the baseline: requests failed in {', '.join(failing)}")
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if baseline:
+        if baseline.get('settings') != run['settings']:
+            print(f"\nNote: baseline was recorded with different settings: {baseline.get('settings')}")
+        regressions = compare(run['scenarios'], baseline, args.tolerance, args.rss_tolerance)
+        if regressions:
+            print('\nRegressions:')
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print('\nNo regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
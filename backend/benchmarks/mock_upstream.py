@@ -0,0 +1,284 @@
+"""
+Local stand-in for every upstream the backend calls, replaying recorded
+responses from benchmarks/fixtures with configurable latency and errors.
+
+Usage (from the backend directory):
+    python -m benchmarks.mock_upstream [--port 8900] [--grpc-port 8901]
+        [--latency-ms 40] [--jitter-ms 10] [--error-rate 0]
+        [--upstream gemini:latency_ms=900] [--upstream upcitemdb:error_rate=0.05]
+
+HTTP (paths match the real APIs, so only the base URLs change):
+    eBay OAuth, Taxonomy, Browse (getItems and item_summary/search) and
+    Marketplace Insights item_sales/search, UPCItemDB, the listing template host
+gRPC (plain, no TLS):
+    Gemini GenerateContent, Cloud Vision BatchAnnotateImages
+
+Point the backend at it with the variables printed on startup (see
+upstream_env()). GET /_stats returns the calls served per upstream.
+"""
+import argparse
+import asyncio
+import copy
+import gzip
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+UPSTREAMS = ('ebay_oauth', 'ebay_taxonomy', 'ebay_browse', 'ebay_insights', 'upcitemdb', 'templates',
+             'gemini', 'vision')
+
+
+@dataclass
+class Behaviour:
+    latency_ms: float = 40.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+
+
+def load_fixture(name: str):
+    path = os.path.join(FIXTURES_DIR, name)
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f) if '.json' in name else f.read()
+
+
+def upstream_env(host: str, port: int, grpc_port: int) -> Dict[str, str]:
+    """
+    Environment pointing the backend's upstream clients at the mock
+    """
+    base = f"http://{host}:{port}"
+    return {
+        'EBAY_OAUTH_URL': f"{base}/identity/v1/oauth/token",
+        'EBAY_TAXONOMY_URL': f"{base}/commerce/taxonomy/v1",
+        'EBAY_BROWSE_URL': f"{base}/buy/browse/v1",
+        'EBAY_INSIGHTS_URL': f"{base}/buy/marketplace_insights/v1_beta",
+        'UPCITEMDB_URL': f"{base}/prod/trial/lookup",
+        'TEMPLATE_BASE_URL': f"{base}/templates",
+        'GEMINI_API_ENDPOINT': f"{host}:{grpc_port}",
+        'VISION_API_ENDPOINT': f"{host}:{grpc_port}",
+    }
+
+
+class MockUpstreams:
+    def __init__(self, behaviours: Dict[str, Behaviour], seed: int = 1):
+        self.behaviours = behaviours
+        self.calls = {name: 0 for name in UPSTREAMS}
+        self.errors = {name: 0 for name in UPSTREAMS}
+        self.rng = random.Random(seed)
+
+        self.oauth_token = load_fixture('ebay_oauth_token.json')
+        self.category_tree = load_fixture('taxonomy_category_tree_id.json')
+        with open(os.path.join(FIXTURES_DIR, 'taxonomy_fetch_item_aspects.json.gz'), 'rb') as f:
+            # Served as-is: the Taxonomy API returns a gzipped file, not a gzip-encoded response
+            self.item_aspects_gz = f.read()
+        self.browse_item = load_fixture('browse_item.json')
+        self.item_summaries = load_fixture('browse_item_summary_search.json')
+        self.item_sales = load_fixture('marketplace_insights_item_sales.json')
+        self.upc_lookup = load_fixture('upcitemdb_lookup.json')
+        self.gemini = load_fixture('gemini_generate_content.json')
+        self.vision = load_fixture('vision_batch_annotate.json')['responses'][0]
+
+    async def call(self, upstream: str) -> bool:
+        """
+        Wait out the upstream's latency; False if this call should fail
+        """
+        behaviour = self.behaviours[upstream]
+        self.calls[upstream] += 1
+        delay = max(0.0, self.rng.gauss(behaviour.latency_ms, behaviour.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if self.rng.random() < behaviour.error_rate:
+            self.errors[upstream] += 1
+            return False
+        return True
+
+    def http_app(self):
+        from starlette.applications import Starlette
+        from starlette.responses import JSONResponse, Response
+        from starlette.routing import Route
+
+        async def oauth_token(request):
+            if not await self.call('ebay_oauth'):
+                return JSONResponse({'error': 'temporarily_unavailable'}, status_code=503)
+            return JSONResponse(self.oauth_token)
+
+        async def category_tree_id(request):
+            if not await self.call('ebay_taxonomy'):
+                return JSONResponse({'errors': [{'errorId': 2003}]}, status_code=503)
+            return JSONResponse(self.category_tree)
+
+        async def item_aspects(request):
+            if not await self.call('ebay_taxonomy'):
+                return JSONResponse({'errors': [{'errorId': 2003}]}, status_code=503)
+            return Response(self.item_aspects_gz, media_type='application/octet-stream')
+
+        async def browse_items(request):
+            if not await self.call('ebay_browse'):
+                return JSONResponse({'errors': [{'errorId': 11000}]}, status_code=503)
+            items = []
+            for rest_id in request.query_params.get('item_ids', '').split(','):
+                if not rest_id:
+                    continue
+                item_id = rest_id.split('|')[1] if '|' in rest_id else rest_id
+                item = copy.deepcopy(self.browse_item)
+                item['itemId'] = f"v1|{item_id}|0"
+                item['itemWebUrl'] = item['itemWebUrl'].replace('ITEM_ID', item_id)
+                items.append(item)
+            return JSONResponse({'items': items})
+
+        async def item_summary_search(request):
+            if not await self.call('ebay_browse'):
+                return JSONResponse({'errors': [{'errorId': 11000}]}, status_code=503)
+            limit = int(request.query_params.get('limit', 50))
+            gtin = request.query_params.get('gtin')
+            if gtin is None:
+                data = copy.deepcopy(self.item_summaries)
+                data['itemSummaries'] = data['itemSummaries'][:limit]
+                data['limit'] = limit
+                return JSONResponse(data)
+            if int(gtin) % 4 == 0:
+                # A share of scanned codes has no eBay listing, so the UPCItemDB fallback runs too
+                return JSONResponse({'total': 0, 'limit': limit, 'offset': 0})
+            summary = copy.deepcopy(self.item_summaries['itemSummaries'][int(gtin) % 10])
+            summary['legacyItemId'] = gtin[-9:]
+            summary['itemId'] = f"v1|{gtin[-9:]}|0"
+            return JSONResponse({'total': 1, 'limit': limit, 'offset': 0, 'itemSummaries': [summary]})
+
+        async def item_sales_search(request):
+            if not await self.call('ebay_insights'):
+                return JSONResponse({'errors': [{'errorId': 11000}]}, status_code=503)
+            return JSONResponse(self.item_sales)
+
+        async def upc_lookup(request):
+            if not await self.call('upcitemdb'):
+                # UPCItemDB's trial tier answers overload with 429
+                return JSONResponse({'code': 'TOO_FAST'}, status_code=429)
+            data = copy.deepcopy(self.upc_lookup)
+            data['items'][0]['upc'] = request.query_params.get('upc', '')
+            return JSONResponse(data)
+
+        async def template(request):
+            if not await self.call('templates'):
+                return Response('Service Unavailable', status_code=503)
+            path = os.path.join(FIXTURES_DIR, 'templates', os.path.basename(request.path_params['name']))
+            if not os.path.exists(path):
+                # Every category is served from the one recorded template
+                path = os.path.join(FIXTURES_DIR, 'templates', 'collectibles-ebay-template.html')
+            with open(path, encoding='utf-8') as f:
+                body = f.read()
+            etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+            if request.headers.get('if-none-match') == etag:
+                return Response(status_code=304, headers={'ETag': etag})
+            return Response(body, media_type='text/html', headers={'ETag': etag})
+
+        async def stats(request):
+            return JSONResponse({'calls': self.calls, 'errors': self.errors})
+
+        return Starlette(routes=[
+            Route('/identity/v1/oauth/token', oauth_token, methods=['POST']),
+            Route('/commerce/taxonomy/v1/get_default_category_tree_id', category_tree_id),
+            Route('/commerce/taxonomy/v1/category_tree/{tree_id}/fetch_item_aspects', item_aspects),
+            Route('/buy/browse/v1/item/', browse_items),
+            Route('/buy/browse/v1/item_summary/search', item_summary_search),
+            Route('/buy/marketplace_insights/v1_beta/item_sales/search', item_sales_search),
+            Route('/prod/trial/lookup', upc_lookup),
+            Route('/templates/{name}', template),
+            Route('/_stats', stats),
+        ])
+
+    def grpc_server(self, port: int):
+        import grpc
+        from google.ai import generativelanguage as glm
+        from google.cloud import vision
+
+        gemini_response = glm.GenerateContentResponse.from_json(json.dumps(self.gemini))
+        vision_response = vision.AnnotateImageResponse.from_json(json.dumps(self.vision))
+
+        async def generate_content(request, context):
+            if not await self.call('gemini'):
+                await context.abort(grpc.StatusCode.UNAVAILABLE, 'The model is overloaded')
+            return gemini_response
+
+        async def batch_annotate_images(request, context):
+            if not await self.call('vision'):
+                await context.abort(grpc.StatusCode.UNAVAILABLE, 'Service unavailable')
+            return vision.BatchAnnotateImagesResponse(responses=[vision_response] * len(request.requests))
+
+        server = grpc.aio.server()
+        server.add_generic_rpc_handlers((
+            grpc.method_handlers_generic_handler('google.ai.generativelanguage.v1beta.GenerativeService', {
+                'GenerateContent': grpc.unary_unary_rpc_method_handler(
+                    generate_content,
+                    request_deserializer=glm.GenerateContentRequest.deserialize,
+                    response_serializer=glm.GenerateContentResponse.serialize
+                )
+            }),
+            grpc.method_handlers_generic_handler('google.cloud.vision.v1.ImageAnnotator', {
+                'BatchAnnotateImages': grpc.unary_unary_rpc_method_handler(
+                    batch_annotate_images,
+                    request_deserializer=vision.BatchAnnotateImagesRequest.deserialize,
+                    response_serializer=vision.BatchAnnotateImagesResponse.serialize
+                )
+            }),
+        ))
+        server.add_insecure_port(f"127.0.0.1:{port}")
+        return server
+
+    async def serve(self, port: int, grpc_port: int):
+        import uvicorn
+
+        grpc_server = self.grpc_server(grpc_port)
+        await grpc_server.start()
+        config = uvicorn.Config(self.http_app(), host='127.0.0.1', port=port, log_level='warning')
+        try:
+            await uvicorn.Server(config).serve()
+        finally:
+            await grpc_server.stop(grace=None)
+
+
+def parse_behaviours(latency_ms: float, jitter_ms: float, error_rate: float,
+                     overrides: Optional[List[str]] = None) -> Dict[str, Behaviour]:
+    """
+    Per-upstream behaviour from the defaults plus "name:key=value[,key=value]" overrides
+    """
+    behaviours = {name: Behaviour(latency_ms, jitter_ms, error_rate) for name in UPSTREAMS}
+    for override in overrides or []:
+        name, _, settings = override.partition(':')
+        if name not in behaviours:
+            raise SystemExit(f"Unknown upstream {name!r}; expected one of {', '.join(UPSTREAMS)}")
+        for setting in settings.split(','):
+            key, _, value = setting.partition('=')
+            if not hasattr(behaviours[name], key):
+                raise SystemExit(f"Unknown setting {key!r} for {name}")
+            setattr(behaviours[name], key, float(value))
+    return behaviours
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency-ms', type=float, default=40.0, help='Mean upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=10.0, help='Standard deviation of the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls that fail')
+    parser.add_argument('--upstream', action='append', metavar='NAME:KEY=VALUE',
+                        help='Per-upstream override, e.g. gemini:latency_ms=900,error_rate=0.02')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--grpc-port', type=int, default=8901)
+    parser.add_argument('--seed', type=int, default=1)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    behaviours = parse_behaviours(args.latency_ms, args.jitter_ms, args.error_rate, args.upstream)
+    for key, value in upstream_env('127.0.0.1', args.port, args.grpc_port).items():
+        print(f"{key}={value}")
+    asyncio.run(MockUpstreams(behaviours, args.seed).serve(args.port, args.grpc_port))
+
+
+if __name__ == '__main__':
+    main()
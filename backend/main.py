@@ -1,34 +1,162 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
+from typing import Iterable, List, Optional
+import importlib
+import logging
 import os
-from routers import upc_router, terapeak_router, listing_optimizer_router
+from routers import admin_router
+from services.cache import cache_stats
+from services.http_client import close_http_client
+from services.loop_watchdog import start_loop_watchdog, stop_loop_watchdog
+from services.metrics import REGISTRY, MetricsMiddleware
+from services.registry import close_services
+from services.responses import FastJSONResponse
+from services.tracing import TracingMiddleware, close_tracing
+from services.upload_budget import UploadLimitMiddleware
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="AIMagic eBay Lister")
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(upc_router.router)
-app.include_router(terapeak_router.router)
-app.include_router(listing_optimizer_router.router)
-
-# Health check endpoint
-@app.get("/api/health")
-async def health_check():
-    return {"status": "healthy", "service": "AIMagic eBay Lister"}
-
-# New endpoint
-@app.get("/")
-async def root():
-    return {"message": "AI Magic Lister API"}
+logger = logging.getLogger(__name__)
+
+# Feature name -> router module. A module may also define async startup()
+# and shutdown() functions, which run in the app lifespan.
+FEATURES = {
+    'upc': 'routers.upc_router',
+    'catalog': 'routers.catalog_router',
+    'vision': 'routers.vision_router',
+    'listing': 'routers.listing_router',
+    'bulk_listing': 'routers.bulk_listing_router',
+    'optimizer': 'routers.listing_optimizer_router',
+    'ai_assist': 'routers.ai_assist_router',
+    'ai': 'routers.ai_router',
+    'templates': 'routers.template_router',
+    'terapeak': 'routers.terapeak_router',
+    'ebay': 'routers.ebay_router',
+}
+
+# Named feature sets for slimmed-down worker fleets
+PROFILES = {
+    'all': list(FEATURES),
+    'scanner': ['upc', 'catalog', 'vision'],
+    'lister': ['listing', 'bulk_listing', 'optimizer', 'ai_assist', 'ai', 'templates', 'catalog'],
+    'research': ['terapeak', 'ebay', 'catalog'],
+}
+
+def resolve_features(features: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Expand profile names into feature names, keeping FEATURES order.
+    Defaults to the comma-separated AIMAGIC_FEATURES setting, or every feature
+    """
+    if features is None:
+        features = [name.strip() for name in os.getenv('AIMAGIC_FEATURES', 'all').split(',') if name.strip()]
+    selected = set()
+    for name in features:
+        if name in PROFILES:
+            selected.update(PROFILES[name])
+        elif name in FEATURES:
+            selected.add(name)
+        else:
+            raise ValueError(f"Unknown feature or profile: {name}")
+    return [name for name in FEATURES if name in selected]
+
+def create_app(features: Optional[Iterable[str]] = None) -> FastAPI:
+    """
+    Build the API with the given features (or profiles) mounted
+    """
+    enabled = resolve_features(features)
+    modules = [importlib.import_module(FEATURES[name]) for name in enabled]
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        started = []
+        # Logs and counts callbacks that block the loop; see LOOP_BLOCK_THRESHOLD_MS
+        start_loop_watchdog()
+        try:
+            for module in modules:
+                if hasattr(module, 'startup'):
+                    await module.startup()
+                started.append(module)
+            yield
+        finally:
+            for module in reversed(started):
+                if hasattr(module, 'shutdown'):
+                    try:
+                        await module.shutdown()
+                    except Exception as e:
+                        logger.error(f"Error shutting down {module.__name__}: {str(e)}")
+            close_services()
+            await close_http_client()
+            close_tracing()
+            await stop_loop_watchdog()
+
+    app = FastAPI(
+        title="AIMagic eBay Lister",
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse
+    )
+    app.state.features = enabled
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Compress large JSON (aspects, comps, job results); level 5 keeps CPU cost low
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=int(os.getenv('GZIP_MINIMUM_SIZE', '1024')),
+        compresslevel=int(os.getenv('GZIP_LEVEL', '5'))
+    )
+
+    if 'vision' in enabled:
+        # Cap upload sizes and the upload bytes in flight per worker
+        app.add_middleware(UploadLimitMiddleware, path_prefixes=["/api/vision"])
+
+    # Traces are exported per TRACE_EXPORTER; Server-Timing headers are opt-in
+    app.add_middleware(
+        TracingMiddleware,
+        sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '1.0')),
+        server_timing=os.getenv('TRACE_SERVER_TIMING', 'false').lower() == 'true'
+    )
+
+    # Added last, so outermost: latency includes time spent in the other middleware, tracing too
+    app.add_middleware(MetricsMiddleware)
+
+    # Include routers
+    for module in modules:
+        app.include_router(module.router)
+
+    # Operational endpoints, mounted on every worker and gated by ADMIN_TOKEN
+    app.include_router(admin_router.router)
+
+    # Health check endpoint
+    @app.get("/api/health")
+    async def health_check():
+        return {"status": "healthy", "service": "AIMagic eBay Lister", "features": enabled}
+
+    @app.get("/api/cache/stats")
+    async def get_cache_stats():
+        """Hit, miss and eviction counters per cache namespace in this worker"""
+        return cache_stats()
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus scrape endpoint for this worker"""
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/")
+    async def root():
+        return {"message": "AI Magic Lister API"}
+
+    return app
+
+app = create_app()
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import hmac
+import os
+from services.loop_watchdog import get_loop_watchdog
+from services.profiler import MAX_PROFILE_SECONDS, SamplingProfiler
+
+router = APIRouter()
+
+# One profile at a time per worker; overlapping samplers would skew each other
+_profile_lock = asyncio.Lock()
+
+def require_admin(
+    x_admin_token: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Admin routes need ADMIN_TOKEN, sent as X-Admin-Token or a bearer token.
+    Without ADMIN_TOKEN set they don't exist
+    """
+    expected = os.getenv('ADMIN_TOKEN')
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = x_admin_token
+    if token is None and authorization and authorization.lower().startswith('bearer '):
+        token = authorization[7:]
+    if token is None or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS, description="How long to sample"),
+    interval_ms: float = Query(5.0, ge=1, le=100, description="Time between stack samples"),
+    format: str = Query("json", pattern="^(json|collapsed)$",
+                        description="json for the full report, collapsed for flamegraph input only")
+):
+    """
+    Sample this worker for a while: thread stacks as collapsed (flamegraph)
+    stacks, event-loop lag and busy share, live tasks per route and what
+    they await, and thread-pool backlog
+    """
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+
+    async with _profile_lock:
+        report = await SamplingProfiler(seconds, interval_ms / 1000).run()
+
+    if format == "collapsed":
+        return PlainTextResponse(report['collapsed'])
+    return report
+
+@router.get("/api/admin/loop-blocks", dependencies=[Depends(require_admin)])
+async def get_loop_blocks():
+    """Recent times this worker's event loop was blocked, with the blocking stack"""
+    watchdog = get_loop_watchdog()
+    if watchdog is None:
+        raise HTTPException(status_code=404, detail="The event-loop watchdog is disabled (LOOP_WATCHDOG=false)")
+    return {
+        "threshold_ms": watchdog.threshold * 1000,
+        "blocks": watchdog.recent_blocks()
+    }
@@ -1,11 +1,9 @@
 from fastapi import APIRouter, HTTPException, Body
 from typing import Dict, List
-from services.gemini_service import GeminiService
-from services.ebay_listing_service import EbayListingService
+from services.sell_similar import suggest_item_specifics
+from services.registry import get_ebay_listing_service, get_gemini_service
 
 router = APIRouter()
-gemini_service = GeminiService()
-ebay_service = EbayListingService()
 
 @router.post("/api/ai/item-specifics")
 async def get_ai_item_specifics(
@@ -16,27 +14,12 @@ async def get_ai_item_specifics(
     """Get AI-suggested values for item specifics"""
     try:
         # Get category aspects
-        aspects = await ebay_service.fetch_item_aspects(category_id, marketplace_id)
+        aspects = await get_ebay_listing_service().fetch_item_aspects(category_id, marketplace_id)
         if not aspects:
             raise HTTPException(status_code=404, detail="Category aspects not found")
             
-        # Get AI suggestions for all aspects
-        all_aspects = (
-            aspects["required"] +
-            aspects["recommended"] +
-            aspects["upcoming_required"]
-        )
-        
-        suggestions = await gemini_service.get_multiple_item_specifics(all_aspects, context)
-        
-        # Validate suggestions
-        validated_suggestions = {}
-        for aspect in all_aspects:
-            value = suggestions.get(aspect["name"], "")
-            if gemini_service.validate_aspect_value(value, aspect):
-                validated_suggestions[aspect["name"]] = value
-                
-        return validated_suggestions
+        # Values already known (e.g. Color from vision analysis) skip the model
+        return await suggest_item_specifics(get_gemini_service(), aspects, context)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -51,7 +34,7 @@ async def get_ai_item_specific(
     """Get AI-suggested value for a single item specific"""
     try:
         # Get category aspects to validate the aspect
-        aspects = await ebay_service.fetch_item_aspects(category_id, marketplace_id)
+        aspects = await get_ebay_listing_service().fetch_item_aspects(category_id, marketplace_id)
         if not aspects:
             raise HTTPException(status_code=404, detail="Category aspects not found")
             
@@ -67,10 +50,10 @@ async def get_ai_item_specific(
             raise HTTPException(status_code=404, detail=f"Aspect '{aspect_name}' not found")
             
         # Get AI suggestion
-        value = await gemini_service.get_item_specific_value(aspect_name, context)
+        value = await get_gemini_service().get_item_specific_value(aspect_name, context)
         
         # Validate suggestion
-        if gemini_service.validate_aspect_value(value, aspect):
+        if get_gemini_service().validate_aspect_value(value, aspect):
             return {aspect_name: value}
         else:
             return {aspect_name: ""}
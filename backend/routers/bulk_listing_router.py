@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from services.listing_submission import get_listing_submitter
+
+router = APIRouter(prefix="/api/listings/bulk", tags=["bulk-listing"])
+submitter = get_listing_submitter()
+
+class DraftsRequest(BaseModel):
+    drafts: List[Dict]
+
+class SubmitRequest(BaseModel):
+    draft_ids: Optional[List[str]] = None
+
+async def startup():
+    await submitter.start()
+
+async def shutdown():
+    await submitter.stop()
+
+@router.post("/drafts")
+async def add_drafts(request: DraftsRequest):
+    """
+    Validate and store listing drafts for a later bulk submission
+    """
+    if not request.drafts:
+        raise HTTPException(status_code=400, detail="No drafts to add")
+    records = submitter.add_drafts(request.drafts)
+    return {
+        "success": True,
+        "drafts": records,
+        "invalid": sum(1 for record in records if record["status"] == "invalid")
+    }
+
+@router.get("/drafts")
+async def list_drafts(
+    status: Optional[str] = Query(None, description="draft, invalid, queued, submitting, listed or failed"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    List stored drafts, newest first
+    """
+    return submitter.list_drafts(status, limit)
+
+@router.get("/drafts/{draft_id}")
+async def get_draft(draft_id: str):
+    """
+    Get a draft with its submission result
+    """
+    draft = submitter.get_draft(draft_id)
+    if not draft:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    return draft
+
+@router.patch("/drafts/{draft_id}")
+async def update_draft(draft_id: str, changes: Dict):
+    """
+    Fix a draft that is invalid or failed to list
+    """
+    draft = submitter.update_draft(draft_id, changes)
+    if not draft:
+        raise HTTPException(status_code=404, detail="No editable draft with this id")
+    return draft
+
+@router.post("/submit", status_code=202)
+async def submit_drafts(request: SubmitRequest):
+    """
+    List drafts on eBay in the background; without ids, every valid draft is submitted
+    """
+    batch = submitter.submit(request.draft_ids)
+    if not batch["queued"]:
+        raise HTTPException(status_code=400, detail="No valid drafts to submit")
+    return {
+        "success": True,
+        **batch
+    }
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """
+    Get submission progress with the result of every listing
+    """
+    batch = submitter.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@router.post("/batches/{batch_id}/retry", status_code=202)
+async def retry_batch(batch_id: str):
+    """
+    Resubmit only the listings of a batch that failed
+    """
+    batch = submitter.retry_failed(batch_id)
+    if not batch["queued"]:
+        raise HTTPException(status_code=400, detail="No failed listings in this batch")
+    return {
+        "success": True,
+        **batch
+    }
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import time
+from services.catalog_service import get_catalog
+
+router = APIRouter(prefix="/api/catalog", tags=["catalog"])
+
+@router.get("/search")
+async def search_catalog(
+    q: str = Query(..., min_length=1, description="Words to match in title, brand, series or character"),
+    limit: int = Query(20, ge=1, le=100),
+    brand: Optional[str] = None
+):
+    """
+    Full-text search over every product resolved so far
+    """
+    start = time.perf_counter()
+    results = get_catalog().search(q, limit=limit, brand=brand)
+    return {
+        "success": True,
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+@router.get("/{code}")
+async def get_catalog_product(code: str):
+    """
+    Get a catalog product by UPC, EAN or model number
+    """
+    product = get_catalog().get_by_code(code)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not in catalog")
+    return {
+        "success": True,
+        "product": product
+    }
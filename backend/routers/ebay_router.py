@@ -1,11 +1,11 @@
 from fastapi import APIRouter, HTTPException
 from ebaysdk.finding import Connection as Finding
 from ebaysdk.exception import ConnectionError
-from services.ebay_service import EbayService
 import os
+from services.registry import get_ebay_service
+from services.metrics import instrument_upstream
 
 router = APIRouter(prefix="/api/ebay", tags=["ebay"])
-ebay_service = EbayService()
 
 def get_ebay_client():
     return Finding(
@@ -17,23 +17,26 @@ def get_ebay_client():
 async def search_by_upc(upc: str):
     try:
         api = get_ebay_client()
-        response = api.execute('findItemsByProduct', {
-            'productId': upc,
-            'productIdType': 'UPC'
-        })
+        with instrument_upstream('ebay_finding', 'findItemsByProduct'):
+            response = api.execute('findItemsByProduct', {
+                'productId': upc,
+                'productIdType': 'UPC'
+            })
         return response.dict()
     except ConnectionError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error searching eBay")
 
-@router.get("/category/{category_id}/aspects")
+@router.get("/category/{category_id}/aspects", deprecated=True)
 async def get_category_aspects(category_id: str):
     """
-    Get item aspects for a specific eBay category
+    Get item aspects for a specific eBay category from the legacy Trading
+    GetCategorySpecifics call. Deprecated: use /api/categories/{category_id}/aspects,
+    which returns Taxonomy API aspects grouped by requirement
     """
     try:
-        aspects = await ebay_service.get_category_aspects(category_id)
+        aspects = await get_ebay_service().get_category_aspects(category_id)
         return aspects
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
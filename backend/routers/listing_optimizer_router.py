@@ -1,17 +1,27 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Optional
-from services.listing_optimizer import ListingOptimizer
-from services.ebay_service import EbayService
+from typing import Dict, List, Optional
+import json
+from services.registry import get_item_fetcher, get_listing_optimizer, get_optimization_jobs
 
 router = APIRouter(prefix="/api/listing", tags=["listing"])
-optimizer = ListingOptimizer()
-ebay_service = EbayService()
 
 class OptimizationRequest(BaseModel):
     product_data: Dict
     listing_id: Optional[str] = None
 
+class BatchOptimizationRequest(BaseModel):
+    items: List[OptimizationRequest]
+    metadata: Optional[Dict] = None
+
+async def startup():
+    await get_optimization_jobs().start()
+
+async def shutdown():
+    await get_optimization_jobs().stop()
+
 @router.post("/optimize")
 async def optimize_listing(request: OptimizationRequest):
     """
@@ -21,10 +31,10 @@ async def optimize_listing(request: OptimizationRequest):
         # If listing_id provided, get the listing details
         top_listing = {}
         if request.listing_id:
-            top_listing = await ebay_service.get_listing_details(request.listing_id)
+            top_listing = await get_item_fetcher().get_item(request.listing_id) or {}
         
         # Get optimization suggestions
-        result = await optimizer.optimize_listing(request.product_data, top_listing)
+        result = await get_listing_optimizer().optimize_listing(request.product_data, top_listing)
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -33,3 +43,52 @@ async def optimize_listing(request: OptimizationRequest):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/optimize/batch", status_code=202)
+async def optimize_listing_batch(request: BatchOptimizationRequest):
+    """
+    Queue a batch of listings for background optimization
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items to optimize")
+
+    job_id = await get_optimization_jobs().submit(
+        [item.model_dump() for item in request.items],
+        metadata=request.metadata
+    )
+    return {
+        "success": True,
+        "job_id": job_id,
+        "total": len(request.items)
+    }
+
+@router.get("/jobs")
+async def list_optimization_jobs(limit: int = Query(50, ge=1, le=500)):
+    """
+    List recent optimization jobs
+    """
+    return await asyncio.to_thread(get_optimization_jobs().list_jobs, limit)
+
+@router.get("/jobs/{job_id}")
+async def get_optimization_job(job_id: str, include_results: bool = True):
+    """
+    Get progress and partial results of an optimization job
+    """
+    job = await asyncio.to_thread(get_optimization_jobs().get_job, job_id, include_results)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_optimization_job(job_id: str):
+    """
+    Stream job progress as server-sent events, each carrying newly finished items
+    """
+    if await asyncio.to_thread(get_optimization_jobs().get_job, job_id, False) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for snapshot in get_optimization_jobs().watch(job_id):
+            yield f"data: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
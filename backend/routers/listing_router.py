@@ -1,25 +1,40 @@
 from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
 from typing import Dict, List, Optional
-from services.ebay_listing_service import EbayListingService
+from services.registry import get_ebay_listing_service, get_sell_similar_pipeline
 
 router = APIRouter()
-listing_service = EbayListingService()
+
+class SellSimilarRequest(BaseModel):
+    template: str = "collectibles"
+    marketplace_id: str = "EBAY_US"
+    overrides: Optional[Dict] = None
 
 @router.get("/api/listings/{item_id}")
 async def get_listing_details(item_id: str) -> Dict:
     """Get full details of an eBay listing for Sell Similar"""
-    details = await listing_service.get_item_details(item_id)
+    details = await get_ebay_listing_service().get_item_details(item_id)
     if not details:
         raise HTTPException(status_code=404, detail="Listing not found")
     return details
 
+@router.post("/api/listings/{item_id}/sell-similar")
+async def sell_similar(item_id: str, request: SellSimilarRequest) -> Dict:
+    """Build a complete Sell Similar draft: item details, item specifics and filled template"""
+    draft = await get_sell_similar_pipeline().build_draft(
+        item_id, request.template, request.marketplace_id, request.overrides
+    )
+    if not draft:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return draft
+
 @router.get("/api/categories/{category_id}/aspects")
 async def get_category_aspects(
     category_id: str,
     marketplace_id: str = Query("EBAY_US", description="The eBay marketplace ID")
 ) -> Dict:
     """Get required and recommended item specifics for a category"""
-    aspects = await listing_service.fetch_item_aspects(category_id, marketplace_id)
+    aspects = await get_ebay_listing_service().fetch_item_aspects(category_id, marketplace_id)
     if not aspects:
         raise HTTPException(status_code=404, detail="Category aspects not found")
     return aspects
@@ -31,5 +46,5 @@ async def get_aspect_values(
     marketplace_id: str = Query("EBAY_US", description="The eBay marketplace ID")
 ) -> List[str]:
     """Get recommended values for a specific aspect"""
-    values = await listing_service.get_aspect_values(category_id, aspect_name, marketplace_id)
+    values = await get_ebay_listing_service().get_aspect_values(category_id, aspect_name, marketplace_id)
     return values
@@ -1,19 +1,44 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, List
-from services.template_service import TemplateService
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+import json
+from services.registry import get_template_service
 
 router = APIRouter()
-template_service = TemplateService()
+
+class BatchRenderItem(BaseModel):
+    category: str
+    data: Dict
+    filename: Optional[str] = None
+
+class BatchRenderRequest(BaseModel):
+    items: List[BatchRenderItem]
+    output_dir: Optional[str] = None
+    include_html: bool = True
 
 @router.get("/api/templates")
 async def get_available_templates() -> List[str]:
     """Get list of all available template categories"""
-    return template_service.get_available_templates()
+    return get_template_service().get_available_templates()
+
+@router.post("/api/templates/batch")
+async def render_templates_batch(request: BatchRenderRequest):
+    """Render many products across categories, streamed back as NDJSON as they finish"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items to render")
+
+    async def results():
+        items = [item.model_dump() for item in request.items]
+        async for result in get_template_service().render_many(items, request.output_dir, request.include_html):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 @router.get("/api/templates/{category}")
 async def get_template(category: str) -> Dict:
     """Get the HTML template for a specific category"""
-    template = await template_service.get_template(category)
+    template = await get_template_service().get_template(category)
     if template is None:
         raise HTTPException(status_code=404, detail=f"Template not found for category: {category}")
     return {"template": template}
@@ -21,9 +46,9 @@ async def get_template(category: str) -> Dict:
 @router.post("/api/templates/{category}/fill")
 async def fill_template(category: str, data: Dict) -> Dict:
     """Fill a template with product data"""
-    template = await template_service.get_template(category)
+    template = await get_template_service().get_template(category)
     if template is None:
         raise HTTPException(status_code=404, detail=f"Template not found for category: {category}")
         
-    filled_template = template_service.fill_template(template, data)
+    filled_template = get_template_service().fill_template(template, data)
     return {"html": filled_template}
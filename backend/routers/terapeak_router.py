@@ -1,9 +1,38 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
-from services.ebay_service import EbayService
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+import json
+from services.comps_store import get_comps_store
+from services.registry import get_ebay_service, get_research_jobs
+from services.research_jobs import (
+    ANALYTICS_API, NIGHTLY_RUN, TERAPEAK_DAY_WINDOWS, analytics_daily_limit, create_research_scheduler, research_items
+)
 
 router = APIRouter()
-ebay_service = EbayService()
+
+_scheduler = None
+
+class ResearchJobRequest(BaseModel):
+    upcs: List[str] = []
+    keywords: List[str] = []
+    days: List[int] = [30]
+    category_id: Optional[str] = None
+    priority: int = 0
+    metadata: Optional[Dict] = None
+
+async def startup():
+    global _scheduler
+    await get_research_jobs().start()
+    _scheduler = create_research_scheduler(get_research_jobs())
+    if _scheduler is not None:
+        _scheduler.start()
+
+async def shutdown():
+    if _scheduler is not None:
+        await _scheduler.stop()
+    await get_research_jobs().stop()
 
 @router.get("/api/terapeak")
 async def get_terapeak_data(
@@ -15,7 +44,7 @@ async def get_terapeak_data(
         raise HTTPException(status_code=400, detail="Days must be 30, 90, or 365")
         
     try:
-        data = ebay_service.get_terapeak_data(upc, days)
+        data = await get_ebay_service().get_terapeak_data(upc, days, query_type='upc')
         if data is None:
             raise HTTPException(status_code=404, detail="No Terapeak data found for this UPC")
             
@@ -26,3 +55,80 @@ async def get_terapeak_data(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/terapeak/jobs", status_code=202)
+async def submit_research_job(request: ResearchJobRequest):
+    """
+    Queue Terapeak research for many UPCs or keywords over one or more day windows.
+    Results are stored as comps; higher priorities run first
+    """
+    if any(days not in TERAPEAK_DAY_WINDOWS for days in request.days) or not request.days:
+        raise HTTPException(status_code=400, detail="Days must be 30, 90, or 365")
+
+    items = research_items(request.upcs, request.keywords, request.days, request.category_id)
+    if not items:
+        raise HTTPException(status_code=400, detail="No UPCs or keywords to research")
+
+    job_id = await get_research_jobs().submit(items, metadata=request.metadata, priority=request.priority)
+    return {
+        "success": True,
+        "job_id": job_id,
+        "total": len(items)
+    }
+
+@router.get("/api/terapeak/jobs")
+async def list_research_jobs(limit: int = Query(50, ge=1, le=500)):
+    """
+    List recent research jobs
+    """
+    return await asyncio.to_thread(get_research_jobs().list_jobs, limit)
+
+@router.get("/api/terapeak/jobs/{job_id}")
+async def get_research_job(job_id: str, include_results: bool = True):
+    """
+    Get progress and partial results of a research job
+    """
+    job = await asyncio.to_thread(get_research_jobs().get_job, job_id, include_results)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/api/terapeak/jobs/{job_id}/events")
+async def stream_research_job(job_id: str):
+    """
+    Stream job progress as server-sent events, each carrying newly finished items
+    """
+    if await asyncio.to_thread(get_research_jobs().get_job, job_id, False) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for snapshot in get_research_jobs().watch(job_id):
+            yield f"data: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.get("/api/terapeak/comps")
+async def get_comps(
+    query: str = Query(..., description="UPC or keywords that were researched"),
+    days: Optional[int] = Query(None, description="Only this day window (30, 90, or 365)"),
+    limit: int = Query(30, ge=1, le=365)
+):
+    """
+    Stored research results for a query, newest first
+    """
+    comps = get_comps_store().history(query, days, limit)
+    if not comps:
+        raise HTTPException(status_code=404, detail="No comps stored for this query")
+    return comps
+
+@router.get("/api/terapeak/quota")
+async def get_research_quota():
+    """
+    Analytics calls used today (UTC) against the daily limit, and the last nightly refresh
+    """
+    store = get_comps_store()
+    return {
+        "used": store.quota_usage(ANALYTICS_API),
+        "daily_limit": analytics_daily_limit(),
+        "last_nightly_run": store.last_run(NIGHTLY_RUN)
+    }
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
-from services.upc_lookup import UPCLookupService
-from services.ebay_service import EbayService
+import asyncio
+import logging
+from services.cache import cached
+from services.catalog_service import get_catalog
+from services.inventory_service import get_inventory
 import json
 import os
 from datetime import datetime
+from services.registry import get_ebay_service, get_upc_service
+from services.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/upc", tags=["upc"])
-upc_service = UPCLookupService()
-ebay_service = EbayService()
 
 class UPCRequest(BaseModel):
     upc: str
@@ -30,96 +35,146 @@ class InventoryItem(BaseModel):
     suggested_price: Optional[float]
     last_updated: datetime
 
-@router.post("/scan")
-async def scan_upc(request: UPCRequest, response: Response):
+# How long a product title's eBay sales stay cached; each scan past that refreshes them
+MARKET_DATA_TTL = float(os.getenv('MARKET_DATA_TTL', '3600'))
+
+@cached('ebay_market_data', ttl=MARKET_DATA_TTL, method=False, cache_if=bool)
+async def market_data_for(title: str) -> dict:
     """
-    Scan a single UPC and return product information with eBay market data
+    eBay transaction history for a product title
     """
     try:
-        # First try eBay lookup since it provides more detailed market data
-        ebay_result = await ebay_service.find_by_upc(request.upc)
-        
+        market_data = await get_ebay_service().get_item_transactions(title)
+    except Exception as e:
+        # Not cached, so the next scan tries eBay again
+        logger.warning(f"No eBay market data for {title!r}: {str(e)}")
+        return {}
+    return market_data.get("data", {})
+
+@traced()
+async def lookup_product(request: UPCRequest, response: Response) -> dict:
+    """
+    Resolve a UPC to product information with eBay market data
+    """
+    # Products resolved before are identified from the local catalog
+    product = await asyncio.to_thread(get_catalog().get_by_code, request.upc, ('upc', 'ean'))
+
+    if product is None:
+        # Then try eBay lookup since it provides more detailed market data
+        try:
+            ebay_result = await get_ebay_service().find_by_upc(request.upc)
+        except Exception as e:
+            logger.warning(f"eBay lookup failed for UPC {request.upc}: {str(e)}")
+            ebay_result = {"success": False}
         if ebay_result["success"]:
-            # Get eBay transaction history
-            market_data = await ebay_service.get_item_transactions(ebay_result["product"]["title"])
-            
-            # Set rate limit headers
-            response.headers["X-RateLimit-Remaining"] = "100"  # Replace with actual values
-            response.headers["X-RateLimit-Limit"] = "100"
-            
-            return {
-                "success": True,
-                "product": {
-                    **ebay_result["product"],
-                    "market_data": market_data.get("data", {}),
-                    "quantity": request.quantity
-                }
-            }
-        
+            product = ebay_result["product"]
+
+    if product is None:
         # If eBay lookup fails, try UPCItemDB
-        product_info = await upc_service.lookup_upc(request.upc)
-        
+        product_info = await get_upc_service().lookup_upc(request.upc)
         if not product_info["success"]:
             raise HTTPException(status_code=404, detail="Product not found in any database")
-            
-        # Try to get eBay market data using the product title
-        market_data = await ebay_service.get_item_transactions(product_info["product"]["title"])
-        
-        # Set rate limit headers
-        response.headers["X-RateLimit-Remaining"] = "100"  # Replace with actual values
-        response.headers["X-RateLimit-Limit"] = "100"
-        
-        return {
-            "success": True,
-            "product": {
-                **product_info["product"],
-                "market_data": market_data.get("data", {}),
-                "quantity": request.quantity
-            }
+        product = product_info["product"]
+
+    # The catalog only holds identity, so prices always come from eBay (or its short-lived cache)
+    market_data = await market_data_for(product["title"])
+
+    # Set rate limit headers
+    response.headers["X-RateLimit-Remaining"] = "100"  # Replace with actual values
+    response.headers["X-RateLimit-Limit"] = "100"
+
+    return {
+        "success": True,
+        "product": {
+            **product,
+            "market_data": market_data,
+            "quantity": request.quantity
         }
+    }
 
+@router.post("/scan")
+async def scan_upc(request: UPCRequest, response: Response):
+    """
+    Scan a single UPC, add it to inventory and return product information with eBay market data
+    """
+    try:
+        result = await lookup_product(request, response)
+        await asyncio.to_thread(get_inventory().record_scans, [{**result["product"], "upc": request.upc}])
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/batch")
-async def batch_scan_upc(request: BatchUPCRequest):
+async def batch_scan_upc(request: BatchUPCRequest, response: Response):
     """
-    Scan multiple UPC codes in batch and manage inventory
+    Scan multiple UPC codes in batch and add them to inventory in one transaction
     """
     results = []
+    scanned = []
     for item in request.items:
         try:
-            result = await scan_upc(item)
+            result = await lookup_product(item, response)
             results.append(result)
+            scanned.append({**result["product"], "upc": item.upc})
         except HTTPException as e:
             results.append({
                 "success": False,
                 "upc": item.upc,
                 "error": e.detail
             })
+        except Exception as e:
+            results.append({
+                "success": False,
+                "upc": item.upc,
+                "error": str(e)
+            })
+    await asyncio.to_thread(get_inventory().record_scans, scanned)
     return results
 
+@router.get("/inventory")
+async def list_inventory(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    brand: Optional[str] = None,
+    category: Optional[str] = None,
+    min_quantity: Optional[int] = Query(None, ge=0)
+):
+    """
+    List inventory items, most recently scanned first.
+    Pass `next_cursor` from a page as `cursor` to get the next one
+    """
+    try:
+        page = await asyncio.to_thread(get_inventory().list_items, limit, cursor, brand, category, min_quantity)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "success": True,
+        **page
+    }
+
 @router.get("/{upc}")
-async def get_inventory_item(upc: str):
+async def get_inventory_item(upc: str, response: Response):
     """
     Get detailed information about a specific inventory item
     """
+    item = await asyncio.to_thread(get_inventory().get_item, upc)
+    if item:
+        return {
+            "success": True,
+            "product": item,
+            "market_data": item["market_data"]
+        }
+
+    # Not scanned yet: look it up on eBay, then UPCItemDB, with market data
     try:
-        # First try eBay
-        product = await ebay_service.find_by_upc(upc)
-        if product["success"]:
-            history = await ebay_service.get_item_transactions(product["product"]["title"])
-            return {
-                **product,
-                "market_data": history.get("data", {})
-            }
-        
-        # Fallback to UPC database
-        product = await upc_service.lookup_upc(upc)
-        if not product["success"]:
-            raise HTTPException(status_code=404, detail="Product not found")
-            
-        return product
-        
+        result = await lookup_product(UPCRequest(upc=upc), response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {
+        **result,
+        "market_data": result["product"]["market_data"]
+    }
@@ -1,12 +1,43 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from typing import List, Dict
-import aiohttp
-from services.vision_service import VisionService
-from services.ebay_service import EbayService
+import logging
+from services.listing_submission import get_listing_submitter
+from services.registry import get_ebay_service, get_vision_service
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/vision", tags=["vision"])
-vision_service = VisionService()
-ebay_service = EbayService()
+
+# Minimum resolver confidence for using the matched product's title
+IDENTITY_CONFIDENCE = 0.6
+
+async def build_product_response(vision_results: Dict) -> Dict:
+    """
+    Extract product details from Vision results and add eBay market data
+    """
+    # Extract product details
+    product_details = get_vision_service().extract_product_details(vision_results)
+
+    # Search eBay for similar items; the analysis is still worth returning without them
+    try:
+        market_data = await get_ebay_service().search_completed_items(product_details['main_object'])
+    except Exception as e:
+        logger.warning(f"No eBay market data for {product_details['main_object']!r}: {str(e)}")
+        market_data = {}
+
+    # Prefer a confidently resolved product title over the object/label guess
+    suggested_title = f"{product_details['main_object']} {' '.join(product_details['attributes'][:3])}"
+    identity = product_details.get('identity')
+    if identity and identity['candidates'] and identity['confidence'] >= IDENTITY_CONFIDENCE:
+        suggested_title = identity['candidates'][0]['product']['title']
+
+    # Combine all information
+    return {
+        'product_details': product_details,
+        'market_data': market_data,
+        'suggested_title': suggested_title,
+        'suggested_price': market_data['price_analysis']['median'] if market_data.get('success') else None,
+    }
 
 @router.post("/analyze")
 async def analyze_product(image: UploadFile = File(...)):
@@ -14,38 +45,42 @@ async def analyze_product(image: UploadFile = File(...)):
     Analyze a product image and return detailed information
     """
     try:
-        # Read image content
-        contents = await image.read()
-        
-        # Analyze image with Google Vision API
-        vision_results = await vision_service.analyze_image(contents)
-        
-        # Extract product details
-        product_details = vision_service.extract_product_details(vision_results)
+        # The upload is already spooled to a temp file; preprocessing reads it in place
+        vision_results = await get_vision_service().analyze_image(image.file)
         
-        # Search eBay for similar items
-        market_data = await ebay_service.search_completed_items(product_details['main_object'])
-        
-        # Combine all information
-        response = {
-            'product_details': product_details,
-            'market_data': market_data,
-            'suggested_title': f"{product_details['main_object']} {' '.join(product_details['attributes'][:3])}",
-            'suggested_price': market_data['price_analysis']['median'] if market_data['success'] else None,
-        }
+        return await build_product_response(vision_results)
         
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analyze-multiple")
+async def analyze_product_images(images: List[UploadFile] = File(...)):
+    """
+    Analyze all photos of one product in a single batched Vision call
+    and return the merged product information
+    """
+    try:
+        results = await get_vision_service().analyze_images([image.file for image in images])
+        vision_results = get_vision_service().merge_results(results)
+
+        response = await build_product_response(vision_results)
+        response['image_count'] = vision_results['image_count']
+        response['image_errors'] = vision_results['errors']
         return response
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/create-listing")
 async def create_listing(listing_data: Dict):
     """
-    Create an eBay listing with the analyzed data
+    Save the analyzed data as a listing draft for bulk submission
     """
     try:
-        result = await ebay_service.create_draft_listing(listing_data)
-        return result
+        record = get_listing_submitter().add_drafts([listing_data])[0]
+        return {
+            "success": record["status"] == "draft",
+            "draft": record
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
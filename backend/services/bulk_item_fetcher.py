@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from services.ebay_oauth import BROWSE_SCOPE, AppToken, api_host
+from services.http_client import http_client
+from services.metrics import instrument_upstream
+from services.tracing import trace_methods
+
+logger = logging.getLogger(__name__)
+
+# Browse getItems accepts at most this many item IDs per call
+MAX_ITEMS_PER_CALL = 20
+
+
+@trace_methods
+class BulkItemFetcher:
+    """
+    Fetches listing details through the Browse API getItems call, 20 items per
+    request. Single-item lookups made close together (e.g. by concurrent job
+    workers) are collected into shared batches, batches run concurrently, and
+    results are cached for a short TTL.
+    """
+    def __init__(
+        self,
+        cache_ttl: Optional[float] = None,
+        max_concurrent_batches: Optional[int] = None,
+        batch_window: float = 0.02,
+        max_cache_entries: int = 5000
+    ):
+        self.browse_url = os.getenv('EBAY_BROWSE_URL', f'{api_host()}/buy/browse/v1').rstrip('/')
+        self.marketplace_id = os.getenv('EBAY_MARKETPLACE_ID', 'EBAY_US')
+
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv('ITEM_CACHE_TTL', '300'))
+        self.max_concurrent_batches = max_concurrent_batches or int(os.getenv('ITEM_FETCH_CONCURRENCY', '4'))
+        self.batch_window = batch_window
+        self.max_cache_entries = max_cache_entries
+
+        self._cache: OrderedDict = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._token = AppToken([BROWSE_SCOPE])
+
+    async def get_item(self, item_id: str) -> Optional[Dict]:
+        """
+        Details of one listing, batched with other lookups made at the same time
+        """
+        item_id = str(item_id)
+        cached = self._cached(item_id)
+        if cached is not None:
+            return cached
+
+        future = self._pending.get(item_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[item_id] = future
+            if len(self._pending) >= MAX_ITEMS_PER_CALL:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    async def get_items(self, item_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Details of many listings keyed by legacy item ID; items that can't be
+        fetched are left out
+        """
+        ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+        results = {}
+        missing = []
+        for item_id in ids:
+            cached = self._cached(item_id)
+            if cached is not None:
+                results[item_id] = cached
+            else:
+                missing.append(item_id)
+
+        batches = [missing[i:i + MAX_ITEMS_PER_CALL] for i in range(0, len(missing), MAX_ITEMS_PER_CALL)]
+        for fetched in await asyncio.gather(*(self._fetch_batch(batch) for batch in batches), return_exceptions=True):
+            if isinstance(fetched, Exception):
+                logger.error(f"Error fetching items: {str(fetched)}")
+                continue
+            results.update(fetched)
+        return {item_id: results[item_id] for item_id in ids if item_id in results}
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            asyncio.get_running_loop().create_task(self._resolve(pending))
+
+    async def _resolve(self, pending: Dict[str, asyncio.Future]):
+        try:
+            fetched = await self._fetch_batch(list(pending))
+        except Exception as e:
+            fetched = {}
+            logger.error(f"Error fetching items: {str(e)}")
+        for item_id, future in pending.items():
+            if not future.done():
+                future.set_result(fetched.get(item_id))
+
+    async def _fetch_batch(self, item_ids: List[str]) -> Dict[str, Dict]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+
+        async with self._semaphore:
+            token = await self._token.get()
+            async with http_client() as client:
+                with instrument_upstream('ebay_browse', 'getItems'):
+                    response = await client.get(
+                        f"{self.browse_url}/item/",
+                        params={'item_ids': ','.join(f"v1|{item_id}|0" for item_id in item_ids)},
+                        headers={
+                            'Authorization': f"Bearer {token}",
+                            'X-EBAY-C-MARKETPLACE-ID': self.marketplace_id
+                        }
+                    )
+                    response.raise_for_status()
+                data = response.json()
+
+        results = {}
+        expires = time.monotonic() + self.cache_ttl
+        for item in data.get('items', []):
+            details = self._parse_item(item)
+            results[details['itemId']] = details
+            self._cache[details['itemId']] = (expires, details)
+            self._cache.move_to_end(details['itemId'])
+        while len(self._cache) > self.max_cache_entries:
+            self._cache.popitem(last=False)
+        return results
+
+    def _cached(self, item_id: str) -> Optional[Dict]:
+        entry = self._cache.get(item_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[item_id]
+            return None
+        return entry[1]
+
+    def _parse_item(self, item: Dict) -> Dict:
+        """
+        Browse item in the shape of EbayService.get_listing_details, plus
+        the item specifics as a dict
+        """
+        aspects = item.get('localizedAspects') or []
+        shipping = (item.get('shippingOptions') or [{}])[0]
+        availability = (item.get('estimatedAvailabilities') or [{}])[0]
+        item_id = item.get('legacyItemId')
+        if not item_id:
+            # RESTful IDs look like v1|<legacy id>|<variation id>
+            parts = item.get('itemId', '').split('|')
+            item_id = parts[1] if len(parts) > 1 else parts[0]
+        return {
+            'itemId': item_id,
+            'title': item.get('title'),
+            'subtitle': item.get('subtitle') or item.get('shortDescription'),
+            'description': item.get('description'),
+            'price': (item.get('price') or {}).get('value'),
+            'quantity': availability.get('estimatedAvailableQuantity'),
+            'condition': item.get('condition'),
+            'specifics': [{'Name': aspect.get('name'), 'Value': aspect.get('value')} for aspect in aspects],
+            'itemSpecifics': {aspect.get('name'): aspect.get('value') for aspect in aspects},
+            'categoryId': item.get('categoryId'),
+            'images': [image['imageUrl'] for image in [item.get('image') or {}] + (item.get('additionalImages') or [])
+                       if image.get('imageUrl')],
+            'shipping': {
+                'type': shipping.get('shippingCostType'),
+                'service': shipping.get('shippingServiceCode'),
+                'cost': (shipping.get('shippingCost') or {}).get('value')
+            }
+        }
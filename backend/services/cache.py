@@ -0,0 +1,488 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.local_store import connect
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Sentinel for "not in cache", so that falsy values can be cached
+MISSING = object()
+
+
+class JSONSerializer:
+    """Values made of dicts, lists, strings and numbers"""
+    def dumps(self, value: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class PickleSerializer:
+    """Arbitrary Python objects; only for values this service produced itself"""
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+JSON = JSONSerializer()
+PICKLE = PickleSerializer()
+
+
+class CacheStats:
+    __slots__ = ('hits', 'shared_hits', 'misses', 'loads', 'evictions', 'errors', 'waits')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self) -> Dict[str, float]:
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        lookups = self.hits + self.shared_hits + self.misses
+        stats['hit_ratio'] = round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class MemoryTier:
+    """
+    Bounded LRU of live Python objects with per-entry expiry. Values are
+    shared with callers, so callers must not mutate what they get back
+    """
+    def __init__(self, max_entries: int, stats: CacheStats):
+        self.max_entries = max_entries
+        self.stats = stats
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteTier:
+    """
+    Cache shared by every worker on the host through a local SQLite file
+    """
+    SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries (expires_at);
+    '''
+    # Expired rows are purged once every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, db_file: str = 'cache.db'):
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        """
+        Take a short-lived cross-process lock; False if another worker holds it
+        """
+        lock_key = f"lock:{key}"
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?", (lock_key, now))
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (lock_key, b'', now + ttl)
+            )
+        return cursor.rowcount == 1
+
+    def release_lock(self, key: str):
+        self.delete(f"lock:{key}")
+
+
+class RedisTier:
+    """
+    Cache shared across hosts through any Redis-protocol server
+    """
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        return bool(self._client.set(f"lock:{key}", b'1', nx=True, px=int(ttl * 1000)))
+
+    def release_lock(self, key: str):
+        self._client.delete(f"lock:{key}")
+
+
+_shared_tier = MISSING
+_shared_tier_lock = threading.Lock()
+
+
+def get_shared_tier():
+    """
+    The shared tier chosen by CACHE_BACKEND: sqlite (default), redis or none
+    """
+    global _shared_tier
+    if _shared_tier is MISSING:
+        with _shared_tier_lock:
+            if _shared_tier is MISSING:
+                backend = os.getenv('CACHE_BACKEND', 'sqlite').lower()
+                if backend == 'redis':
+                    _shared_tier = RedisTier(os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+                elif backend == 'sqlite':
+                    _shared_tier = SQLiteTier()
+                else:
+                    _shared_tier = None
+    return _shared_tier
+
+
+class Cache:
+    """
+    Two-tier cache for one namespace: an in-process LRU in front of the
+    optional shared tier. Loads of the same key are collapsed into one,
+    within the process and, through a short lock in the shared tier,
+    across workers.
+    """
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float = 300,
+        max_entries: int = 1024,
+        serializer: Any = JSON,
+        shared: bool = True,
+        lock_timeout: float = 10.0
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.serializer = serializer
+        self.shared = shared
+        self.lock_timeout = lock_timeout
+        self.stats = CacheStats()
+        self.memory = MemoryTier(max_entries, self.stats)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._sync_inflight: Dict[str, threading.Event] = {}
+        self._sync_lock = threading.Lock()
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tier(self):
+        return get_shared_tier() if self.shared else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is MISSING:
+            self.stats.misses += 1
+            return default
+        return value
+
+    def _lookup(self, key: str) -> Any:
+        value = self._lookup_memory(key)
+        return self._lookup_shared(key) if value is MISSING else value
+
+    async def _lookup_async(self, key: str) -> Any:
+        value = self._lookup_memory(key)
+        if value is MISSING and self._tier() is not None:
+            # SQLite and Redis calls block, so they run off the event loop
+            value = await asyncio.to_thread(self._lookup_shared, key)
+        return value
+
+    def _lookup_memory(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self.stats.hits += 1
+        return value
+
+    def _lookup_shared(self, key: str) -> Any:
+        tier = self._tier()
+        if tier is None:
+            return MISSING
+        try:
+            data = tier.get(self._key(key))
+            if data is None:
+                return MISSING
+            value = self.serializer.loads(data)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Shared cache read failed for {self.namespace}: {str(e)}")
+            return MISSING
+        self.stats.shared_hits += 1
+        self.memory.set(key, value, self.ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl)
+        self._set_shared(key, value, ttl)
+
+    def _set_shared(self, key: str, value: Any, ttl: float):
+        tier = self._tier()
+        if tier is not None:
+            try:
+                tier.set(self._key(key), self.serializer.dumps(value), ttl)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"Shared cache write failed for {self.namespace}: {str(e)}")
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        tier = self._tier()
+        if tier is not None:
+            try:
+                tier.delete(self._key(key))
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"Shared cache delete failed for {self.namespace}: {str(e)}")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None,
+                          cache_if: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Cached value for `key`, or the result of awaiting `loader()`.
+        Concurrent callers for the same key share one load
+        """
+        value = await self._lookup_async(key)
+        if value is not MISSING:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.waits += 1
+            return await asyncio.shield(future)
+
+        self.stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load_shared(key, loader, ttl, cache_if)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load_shared(self, key, loader, ttl, cache_if):
+        tier = self._tier()
+        locked = False
+        if tier is not None:
+            # Another worker loading the same key: wait briefly for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    locked = await asyncio.to_thread(tier.acquire_lock, self._key(key), self.lock_timeout)
+                except Exception:
+                    break
+                if locked:
+                    break
+                self.stats.waits += 1
+                await asyncio.sleep(0.05)
+                value = await self._lookup_async(key)
+                if value is not MISSING or time.monotonic() > deadline:
+                    if value is not MISSING:
+                        return value
+                    break
+        try:
+            self.stats.loads += 1
+            value = await loader()
+            if cache_if is None or cache_if(value):
+                ttl = self.ttl if ttl is None else ttl
+                self.memory.set(key, value, ttl)
+                if tier is not None:
+                    await asyncio.to_thread(self._set_shared, key, value, ttl)
+            return value
+        finally:
+            if locked:
+                try:
+                    await asyncio.to_thread(tier.release_lock, self._key(key))
+                except Exception:
+                    pass
+
+    def get_or_load_sync(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None,
+                         cache_if: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Blocking variant of get_or_load for synchronous callers
+        """
+        while True:
+            value = self._lookup(key)
+            if value is not MISSING:
+                return value
+            with self._sync_lock:
+                event = self._sync_inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._sync_inflight[key] = event
+                    break
+            self.stats.waits += 1
+            event.wait(self.lock_timeout)
+            # Loaded (or failed and not cached): look again, loading ourselves if still missing
+
+        self.stats.misses += 1
+        try:
+            self.stats.loads += 1
+            value = loader()
+            if cache_if is None or cache_if(value):
+                self.set(key, value, ttl)
+            return value
+        finally:
+            with self._sync_lock:
+                self._sync_inflight.pop(key, None)
+            event.set()
+
+    def clear(self):
+        """
+        Drop this namespace's in-process entries
+        """
+        self.memory.clear()
+
+
+_caches: Dict[str, Cache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str, **options) -> Cache:
+    """
+    The process-wide cache for a namespace; options apply when it is first created
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = Cache(namespace, **options)
+                _caches[namespace] = cache
+    return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Hit, miss, load and eviction counters for every namespace
+    """
+    return {namespace: cache.stats.as_dict() for namespace, cache in sorted(_caches.items())}
+
+
+def make_key(args: Tuple, kwargs: Dict) -> str:
+    """
+    Stable key for call arguments; long keys are hashed
+    """
+    raw = json.dumps([args, kwargs], sort_keys=True, default=str, separators=(',', ':'))
+    if len(raw) <= 200:
+        return raw
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def cached(
+    namespace: str,
+    ttl: float = 300,
+    key: Optional[Callable[..., str]] = None,
+    cache_if: Optional[Callable[[Any], bool]] = None,
+    method: bool = True,
+    **options
+):
+    """
+    Cache a function's results in `namespace`.
+
+    `key` builds the cache key from the call arguments (default: all of them,
+    without `self` when `method` is true). `cache_if` decides whether a result
+    is worth keeping, e.g. to skip error responses. Works on sync and async
+    functions; concurrent calls for the same key run the function once.
+    """
+    def decorator(func):
+        cache = get_cache(namespace, ttl=ttl, **options)
+
+        def build_key(args, kwargs):
+            if key is not None:
+                return str(key(*args, **kwargs))
+            return make_key(args[1:] if method else args, kwargs)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await cache.get_or_load(
+                    build_key(args, kwargs), lambda: func(*args, **kwargs), ttl, cache_if
+                )
+            async_wrapper.cache = cache
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache.get_or_load_sync(build_key(args, kwargs), lambda: func(*args, **kwargs), ttl, cache_if)
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -0,0 +1,227 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.local_store import connect
+from services.tracing import trace_methods
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    upc TEXT,
+    ean TEXT,
+    model TEXT,
+    title TEXT NOT NULL DEFAULT '',
+    brand TEXT NOT NULL DEFAULT '',
+    series TEXT NOT NULL DEFAULT '',
+    character TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_upc ON products (upc) WHERE upc IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_ean ON products (ean) WHERE ean IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_products_model ON products (model) WHERE model IS NOT NULL;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    title, brand, series, character,
+    content='products', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, title, brand, series, character)
+    VALUES (new.id, new.title, new.brand, new.series, new.character);
+END;
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, brand, series, character)
+    VALUES ('delete', old.id, old.title, old.brand, old.series, old.character);
+END;
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, brand, series, character)
+    VALUES ('delete', old.id, old.title, old.brand, old.series, old.character);
+    INSERT INTO products_fts (rowid, title, brand, series, character)
+    VALUES (new.id, new.title, new.brand, new.series, new.character);
+END;
+'''
+
+COLUMNS = ('upc', 'ean', 'model', 'title', 'brand', 'series', 'character', 'category')
+CODE_COLUMNS = ('upc', 'ean', 'model')
+FTS_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# What sellers enter when a product has no real model or brand
+PLACEHOLDER_VALUES = {'does not apply', 'n/a', 'na', 'not applicable', 'unbranded', 'unknown', 'none', '-'}
+
+
+def real_value(value) -> str:
+    """
+    The value stripped, or '' for a placeholder such as "Does Not Apply"
+    """
+    value = str(value or '').strip()
+    return '' if value.lower() in PLACEHOLDER_VALUES else value
+
+
+@trace_methods
+class ProductCatalog:
+    """
+    Local catalog of every product the service has resolved, keyed by
+    UPC/EAN/model with full-text search over title, brand, series and character
+    """
+    def __init__(self, db_file: str = 'catalog.db'):
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def upsert(self, product: Dict, source: str) -> int:
+        """
+        Insert a product or merge it into the entry with the same UPC or EAN,
+        or the same model and brand
+        """
+        return self.upsert_many([product], source)[0]
+
+    def upsert_many(self, products: List[Dict], source: str) -> List[int]:
+        """
+        Upsert several products in one transaction; returns their row ids
+        """
+        ids = []
+        stored = []
+        now = time.time()
+        with self._lock, self._conn:
+            for product in products:
+                fields = self._fields(product)
+                existing = self._find(fields)
+                if existing:
+                    data = {**json.loads(existing['data']), **{k: v for k, v in product.items() if v not in (None, '', [], {})}}
+                    # Existing codes win so a merge never collides with another entry's code
+                    merged = {
+                        column: (existing[column] or fields[column]) if column in CODE_COLUMNS
+                        else (fields[column] or existing[column])
+                        for column in COLUMNS
+                    }
+                    try:
+                        self._update(existing['id'], merged, source, data, now)
+                    except sqlite3.IntegrityError:
+                        merged.update({column: existing[column] for column in CODE_COLUMNS})
+                        self._update(existing['id'], merged, source, data, now)
+                    ids.append(existing['id'])
+                    stored.append(data)
+                else:
+                    cursor = self._conn.execute(
+                        f"INSERT INTO products ({', '.join(COLUMNS)}, source, data, updated_at) "
+                        f"VALUES ({', '.join('?' for _ in COLUMNS)}, ?, ?, ?)",
+                        (*(fields[c] for c in COLUMNS), source, json.dumps(product), now)
+                    )
+                    ids.append(cursor.lastrowid)
+                    stored.append(product)
+
+        # Keep the photo-text resolver in step with the catalog
+        from services.product_resolver import get_product_index
+        index = get_product_index()
+        for product in stored:
+            index.add(product)
+        return ids
+
+    def _update(self, row_id: int, fields: Dict, source: str, data: Dict, now: float):
+        self._conn.execute(
+            f"UPDATE products SET {', '.join(f'{c} = ?' for c in COLUMNS)}, source = ?, data = ?, updated_at = ? "
+            "WHERE id = ?",
+            (*(fields[c] for c in COLUMNS), source, json.dumps(data), now, row_id)
+        )
+
+    def _fields(self, product: Dict) -> Dict:
+        fields = {column: str(product.get(column) or '').strip() for column in COLUMNS}
+        fields['model'] = real_value(fields['model'])
+        fields['brand'] = real_value(fields['brand'])
+        fields['series'] = fields['series'] or str(product.get('franchise') or '').strip()
+        for column in CODE_COLUMNS:
+            # Codes are compared without leading zeros and stored as NULL when absent
+            value = fields[column].upper() if column == 'model' else fields[column].lstrip('0')
+            fields[column] = value or None
+        return fields
+
+    def _find(self, fields: Dict):
+        for column in ('upc', 'ean'):
+            if fields[column]:
+                row = self._conn.execute(f"SELECT * FROM products WHERE {column} = ?", (fields[column],)).fetchone()
+                if row:
+                    return row
+        # Model numbers aren't unique across brands
+        if fields['model'] and fields['brand']:
+            return self._conn.execute(
+                "SELECT * FROM products WHERE model = ? AND brand = ? COLLATE NOCASE", (fields['model'], fields['brand'])
+            ).fetchone()
+        return None
+
+    def get_by_code(self, code: str, columns: Tuple[str, ...] = CODE_COLUMNS) -> Optional[Dict]:
+        """
+        Look a product up by UPC, EAN or model number, or only the given code columns
+        """
+        code = code.strip()
+        values = {'upc': code.lstrip('0'), 'ean': code.lstrip('0'), 'model': code.upper()}
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM products WHERE {' OR '.join(f'{column} = ?' for column in columns)} LIMIT 1",
+                tuple(values[column] for column in columns)
+            ).fetchone()
+        return self._row_to_product(row) if row else None
+
+    def search(self, query: str, limit: int = 20, brand: Optional[str] = None) -> List[Dict]:
+        """
+        Full-text search ranked by BM25; the last word matches as a prefix
+        """
+        tokens = FTS_TOKEN_RE.findall(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{token}"' for token in tokens[:-1]) + f' "{tokens[-1]}"*'
+
+        sql = (
+            "SELECT p.*, bm25(products_fts, 4.0, 2.0, 3.0, 3.0) AS rank FROM products_fts "
+            "JOIN products p ON p.id = products_fts.rowid WHERE products_fts MATCH ?"
+        )
+        params: list = [match.strip()]
+        if brand:
+            sql += " AND p.brand = ? COLLATE NOCASE"
+            params.append(brand)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{**self._row_to_product(row), 'rank': round(-row['rank'], 4)} for row in rows]
+
+    def all_products(self) -> Iterator[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM products ORDER BY id").fetchall()
+        for row in rows:
+            yield self._row_to_product(row)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def _row_to_product(self, row) -> Dict:
+        return {
+            **json.loads(row['data']),
+            'catalog_id': row['id'],
+            'source': row['source'],
+            'updated_at': row['updated_at']
+        }
+
+
+_catalog: Optional[ProductCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> ProductCatalog:
+    """
+    The process-wide product catalog
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ProductCatalog()
+    return _catalog
@@ -0,0 +1,92 @@
+from typing import Dict, List
+import numpy as np
+
+# eBay Color aspect values with representative sRGB shades. Metallic and
+# transparent values (Gold, Silver, Bronze, Clear) can't be told apart from
+# a dominant color alone and are left to the seller.
+COLOR_SHADES = {
+    'Black': [(0, 0, 0), (35, 35, 35)],
+    'Gray': [(128, 128, 128), (90, 90, 90), (169, 169, 169), (112, 128, 144)],
+    'White': [(255, 255, 255), (240, 240, 235), (220, 220, 220)],
+    'Red': [(255, 0, 0), (200, 16, 46), (178, 34, 34), (139, 0, 0)],
+    'Pink': [(255, 192, 203), (255, 105, 180), (219, 112, 147), (255, 20, 147)],
+    'Orange': [(255, 165, 0), (255, 140, 0), (255, 127, 80), (230, 100, 20)],
+    'Yellow': [(255, 255, 0), (255, 215, 0), (240, 230, 140), (255, 240, 100)],
+    'Green': [(0, 128, 0), (34, 139, 34), (144, 238, 144), (0, 100, 0), (107, 142, 35), (0, 200, 120)],
+    'Blue': [(0, 0, 255), (0, 0, 128), (65, 105, 225), (135, 206, 235), (70, 130, 180), (0, 160, 220)],
+    'Purple': [(128, 0, 128), (138, 43, 226), (216, 191, 216), (75, 0, 130), (186, 85, 211)],
+    'Brown': [(139, 69, 19), (160, 82, 45), (101, 67, 33), (92, 64, 51)],
+    'Beige': [(245, 245, 220), (222, 184, 135), (210, 180, 140), (238, 220, 190)],
+}
+
+# A product is Multi-Color when this many names each cover at least MULTI_COLOR_SHARE
+MULTI_COLOR_MIN_NAMES = 3
+MULTI_COLOR_SHARE = 0.2
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert an (n, 3) array of 0-255 sRGB values to CIELAB (D65)
+    """
+    c = rgb / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[:, 1] - 16,
+        500 * (f[:, 0] - f[:, 1]),
+        200 * (f[:, 1] - f[:, 2]),
+    ], axis=1)
+
+
+# Precomputed lookup table: one Lab row per shade and the index of its color name
+COLOR_NAMES = list(COLOR_SHADES)
+_SHADE_LAB = srgb_to_lab(np.array([shade for shades in COLOR_SHADES.values() for shade in shades], dtype=float))
+_SHADE_NAME_INDEX = np.array([i for i, shades in enumerate(COLOR_SHADES.values()) for _ in shades])
+
+
+def name_colors(colors: List[Dict]) -> List[Dict]:
+    """
+    Map Vision dominant colors to eBay color names in one vectorized
+    nearest-neighbour pass, weighted by pixel fraction.
+    Returns names ranked by their share of the weighted pixels
+    """
+    if not colors:
+        return []
+
+    rgb = np.array(
+        [[c['color']['red'] or 0, c['color']['green'] or 0, c['color']['blue'] or 0] for c in colors],
+        dtype=float
+    )
+    weights = np.array([c.get('pixel_fraction') or c.get('score') or 0.0 for c in colors], dtype=float)
+    if weights.sum() <= 0:
+        weights = np.ones(len(colors))
+
+    lab = srgb_to_lab(rgb)
+    distances = ((lab[:, None, :] - _SHADE_LAB[None, :, :]) ** 2).sum(axis=2)
+    nearest = _SHADE_NAME_INDEX[distances.argmin(axis=1)]
+
+    totals = np.bincount(nearest, weights=weights, minlength=len(COLOR_NAMES))
+    shares = totals / totals.sum()
+    order = np.argsort(-shares)
+    return [
+        {'name': COLOR_NAMES[i], 'share': round(float(shares[i]), 4)}
+        for i in order if shares[i] > 0
+    ]
+
+
+def primary_color(named_colors: List[Dict]) -> str:
+    """
+    The value for the Color item specific from ranked color names
+    """
+    if not named_colors:
+        return ''
+    significant = [c for c in named_colors if c['share'] >= MULTI_COLOR_SHARE]
+    if len(significant) >= MULTI_COLOR_MIN_NAMES:
+        return 'Multi-Color'
+    return named_colors[0]['name']
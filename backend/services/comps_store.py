@@ -0,0 +1,191 @@
+import datetime
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.local_store import connect
+from services.tracing import trace_methods
+
+SCHEMA = '''
+-- One row per Terapeak research result; amounts are stored in cents
+CREATE TABLE IF NOT EXISTS comps (
+    query TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    captured_at REAL NOT NULL,
+    query_type TEXT NOT NULL,
+    total_sold INTEGER,
+    avg_sold_cents INTEGER,
+    sell_through REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (query, days, captured_at)
+) WITHOUT ROWID;
+
+-- Analytics calls made per UTC day, shared by every worker
+CREATE TABLE IF NOT EXISTS api_usage (
+    api TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (api, day)
+) WITHOUT ROWID;
+
+-- Scheduled refreshes already started, so only one worker runs each
+CREATE TABLE IF NOT EXISTS scheduled_runs (
+    name TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    job_id TEXT,
+    PRIMARY KEY (name, run_date)
+) WITHOUT ROWID;
+'''
+HISTORY_LIMIT = 30
+
+
+def _cents(value) -> Optional[int]:
+    try:
+        return round(float(value) * 100) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _utc_day(now: Optional[float] = None) -> str:
+    return datetime.datetime.fromtimestamp(now or time.time(), datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+def seconds_until_utc_midnight(now: Optional[float] = None) -> float:
+    now = now or time.time()
+    today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).date()
+    midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time(),
+                                         tzinfo=datetime.timezone.utc)
+    return midnight.timestamp() - now
+
+
+@trace_methods
+class CompsStore:
+    """
+    Local store of Terapeak comps (sold metrics and top listings) per query
+    and day window, with the bookkeeping research jobs share across workers:
+    daily Analytics call counts and claimed scheduled runs.
+    """
+    def __init__(self, db_file: str = 'comps.db'):
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def record(self, query: str, days: int, query_type: str, data: Dict, captured_at: Optional[float] = None):
+        """
+        Store one research result
+        """
+        metrics = data.get('metrics') or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO comps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (query, days, captured_at or time.time(), query_type, metrics.get('totalSold'),
+                 _cents(metrics.get('avgSoldPrice')), metrics.get('sellThrough'), json.dumps(data))
+            )
+
+    def latest(self, query: str, days: int) -> Optional[Dict]:
+        """
+        The most recent comps for a query and day window
+        """
+        history = self.history(query, days, limit=1)
+        return history[0] if history else None
+
+    def history(self, query: str, days: Optional[int] = None, limit: int = HISTORY_LIMIT) -> List[Dict]:
+        """
+        Comps for a query, newest first, optionally for one day window
+        """
+        sql = "SELECT * FROM comps WHERE query = ?"
+        params: list = [query]
+        if days is not None:
+            sql += " AND days = ?"
+            params.append(days)
+        sql += " ORDER BY captured_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_comps(row) for row in rows]
+
+    def consume_quota(self, api: str, calls: int, daily_limit: int) -> bool:
+        """
+        Reserve `calls` of today's (UTC) allowance for `api`; False if they
+        don't fit. A daily_limit of 0 only counts the calls
+        """
+        day = _utc_day()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO api_usage VALUES (?, ?, 0)", (api, day))
+            # A single conditional UPDATE, so workers sharing the database can't overspend
+            cursor = self._conn.execute(
+                "UPDATE api_usage SET calls = calls + ? WHERE api = ? AND day = ? AND (? = 0 OR calls + ? <= ?)",
+                (calls, api, day, daily_limit, calls, daily_limit)
+            )
+        return cursor.rowcount == 1
+
+    def release_quota(self, api: str, calls: int):
+        """
+        Give back `calls` reserved today with consume_quota that were never made
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE api_usage SET calls = MAX(calls - ?, 0) WHERE api = ? AND day = ?", (calls, api, _utc_day())
+            )
+
+    def quota_usage(self, api: str) -> int:
+        """
+        Calls made to `api` so far today (UTC)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT calls FROM api_usage WHERE api = ? AND day = ?", (api, _utc_day())
+            ).fetchone()
+        return row['calls'] if row else 0
+
+    def claim_run(self, name: str, run_date: str) -> bool:
+        """
+        Claim a scheduled run; False if another worker already started it
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO scheduled_runs (name, run_date, started_at) VALUES (?, ?, ?)",
+                (name, run_date, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def set_run_job(self, name: str, run_date: str, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE scheduled_runs SET job_id = ? WHERE name = ? AND run_date = ?", (job_id, name, run_date)
+            )
+
+    def last_run(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM scheduled_runs WHERE name = ? ORDER BY run_date DESC LIMIT 1", (name,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def _row_to_comps(self, row) -> Dict:
+        return {
+            'query': row['query'],
+            'query_type': row['query_type'],
+            'days': row['days'],
+            'captured_at': row['captured_at'],
+            **json.loads(row['data'])
+        }
+
+
+_store: Optional[CompsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_comps_store() -> CompsStore:
+    """
+    The process-wide comps store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CompsStore()
+    return _store
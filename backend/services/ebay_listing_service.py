@@ -1,11 +1,21 @@
 from typing import Dict, List, Optional
 from ebaysdk.trading import Connection as Trading
 from datetime import datetime
+import asyncio
 import os
 import gzip
 import json
-import httpx
+from services.cache import cached
+from services.catalog_service import get_catalog, real_value
+from services.metrics import instrument_upstream
+from services.product_resolver import get_product_index
+from services.http_client import http_client
+from services.tracing import trace_methods
 
+# Aspects whose values name what a product is, fed to the product resolver
+IDENTITY_ASPECTS = {'Brand', 'Franchise', 'Series', 'Character', 'Character Family', 'TV Show', 'Movie', 'Theme'}
+
+@trace_methods
 class EbayListingService:
     def __init__(self):
         self.trading_api = Trading(
@@ -13,25 +23,28 @@ class EbayListingService:
             appid=os.getenv('EBAY_APP_ID'),
             devid=os.getenv('EBAY_DEV_ID'),
             certid=os.getenv('EBAY_CERT_ID'),
-            token=os.getenv('EBAY_AUTH_TOKEN')
+            token=os.getenv('EBAY_AUTH_TOKEN'),
+            config_file=None
         )
         
         self.api_url = "https://api.ebay.com/commerce/taxonomy/v1"
         self.sandbox_url = "https://api.sandbox.ebay.com/commerce/taxonomy/v1"
         self.use_sandbox = os.getenv('EBAY_USE_SANDBOX', 'True').lower() == 'true'
-        self.base_url = self.sandbox_url if self.use_sandbox else self.api_url
+        self.base_url = os.getenv('EBAY_TAXONOMY_URL') or (self.sandbox_url if self.use_sandbox else self.api_url)
         
     async def get_item_details(self, item_id: str) -> Dict:
         """Get full details of an eBay item for Sell Similar"""
         try:
-            response = self.trading_api.execute('GetItem', {
-                'ItemID': item_id,
-                'DetailLevel': 'ReturnAll',
-                'IncludeItemSpecifics': True
-            })
+            # The Trading SDK call blocks, so it runs off the event loop
+            with instrument_upstream('ebay_trading', 'GetItem'):
+                response = await asyncio.to_thread(self.trading_api.execute, 'GetItem', {
+                    'ItemID': item_id,
+                    'DetailLevel': 'ReturnAll',
+                    'IncludeItemSpecifics': True
+                })
             
             item = response.dict()['Item']
-            return {
+            details = {
                 'title': item.get('Title', ''),
                 'description': item.get('Description', ''),
                 'category_id': item.get('PrimaryCategory', {}).get('CategoryID', ''),
@@ -47,15 +60,21 @@ class EbayListingService:
                 'listing_type': item.get('ListingType', ''),
                 'pictures': self._parse_pictures(item.get('PictureDetails', {}))
             }
+            get_catalog().upsert(self._catalog_product(item_id, details), 'ebay')
+            return details
         except Exception as e:
             print(f"Error getting item details: {str(e)}")
             return None
 
+    # Application tokens live for two hours; refresh a little early. Kept in
+    # process memory only, so credentials never land in the shared cache
+    @cached('ebay_oauth', ttl=7000, shared=False)
     async def get_oauth_token(self) -> str:
         """Get OAuth token using client credentials flow"""
         auth_url = "https://api.ebay.com/identity/v1/oauth/token"
         if self.use_sandbox:
             auth_url = "https://api.sandbox.ebay.com/identity/v1/oauth/token"
+        auth_url = os.getenv('EBAY_OAUTH_URL', auth_url)
             
         credentials = f"{os.getenv('EBAY_APP_ID')}:{os.getenv('EBAY_CERT_ID')}"
         
@@ -69,11 +88,13 @@ class EbayListingService:
             "scope": "https://api.ebay.com/oauth/api_scope https://api.ebay.com/oauth/api_scope/metadata.insights"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(auth_url, headers=headers, data=data)
-            response.raise_for_status()
+        async with http_client() as client:
+            with instrument_upstream('ebay_oauth', 'client_credentials'):
+                response = await client.post(auth_url, headers=headers, data=data)
+                response.raise_for_status()
             return response.json()["access_token"]
 
+    @cached('ebay_category_tree', ttl=86400)
     async def get_category_tree_id(self, marketplace_id: str = "EBAY_US") -> str:
         """Get the category tree ID for a marketplace"""
         token = await self.get_oauth_token()
@@ -84,17 +105,31 @@ class EbayListingService:
             "X-EBAY-C-MARKETPLACE-ID": marketplace_id
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/get_default_category_tree_id",
-                headers=headers,
-                params={"marketplace_id": marketplace_id}
-            )
-            response.raise_for_status()
+        async with http_client() as client:
+            with instrument_upstream('ebay_taxonomy', 'get_default_category_tree_id'):
+                response = await client.get(
+                    f"{self.base_url}/get_default_category_tree_id",
+                    headers=headers,
+                    params={"marketplace_id": marketplace_id}
+                )
+                response.raise_for_status()
             return response.json()["categoryTreeId"]
 
     async def fetch_item_aspects(self, category_id: str, marketplace_id: str = "EBAY_US") -> Dict:
         """Fetch item aspects for a category using the Taxonomy API"""
+        aspects = await self._fetch_item_aspects(category_id, marketplace_id)
+        # Known identity values help resolve products from photo text; cached
+        # aspects count too, so this runs after the cache
+        index = get_product_index()
+        if aspects and not index.has_aspect_values(category_id):
+            for aspect_type in aspects.values():
+                for aspect in aspect_type:
+                    if aspect["name"] in IDENTITY_ASPECTS and aspect["values"]:
+                        index.add_aspect_values(category_id, aspect["name"], aspect["values"])
+        return aspects
+
+    @cached('ebay_aspects', ttl=86400, max_entries=512, cache_if=lambda aspects: aspects is not None)
+    async def _fetch_item_aspects(self, category_id: str, marketplace_id: str = "EBAY_US") -> Dict:
         try:
             token = await self.get_oauth_token()
             tree_id = await self.get_category_tree_id(marketplace_id)
@@ -107,49 +142,54 @@ class EbayListingService:
             
             url = f"{self.base_url}/category_tree/{tree_id}/fetch_item_aspects"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
+            async with http_client() as client:
+                with instrument_upstream('ebay_taxonomy', 'fetch_item_aspects'):
+                    response = await client.get(url, headers=headers)
+                    response.raise_for_status()
                 
                 # Decompress gzipped response
                 decompressed_data = gzip.decompress(response.content)
                 data = json.loads(decompressed_data)
                 
-                # Process aspects data
-                aspects_data = {
-                    "required": [],
-                    "recommended": [],
-                    "upcoming_required": []
-                }
-                
-                for category_aspect in data.get("categoryAspects", []):
-                    if category_aspect["category"]["categoryId"] == category_id:
-                        for aspect in category_aspect.get("aspects", []):
-                            aspect_info = {
-                                "name": aspect["localizedAspectName"],
-                                "values": [v["localizedValue"] for v in aspect.get("aspectValues", [])],
-                                "mode": aspect["aspectConstraint"]["aspectMode"],
-                                "data_type": aspect["aspectConstraint"]["aspectDataType"],
-                                "max_length": aspect["aspectConstraint"].get("aspectMaxLength"),
-                                "cardinality": aspect["aspectConstraint"]["itemToAspectCardinality"],
-                                "variation_enabled": aspect["aspectConstraint"]["aspectEnabledForVariations"],
-                                "search_count": aspect.get("relevanceIndicator", {}).get("searchCount")
-                            }
-                            
-                            if aspect["aspectConstraint"]["aspectRequired"]:
-                                aspects_data["required"].append(aspect_info)
-                            elif aspect["aspectConstraint"].get("expectedRequiredByDate"):
-                                aspect_info["required_by"] = aspect["aspectConstraint"]["expectedRequiredByDate"]
-                                aspects_data["upcoming_required"].append(aspect_info)
-                            else:
-                                aspects_data["recommended"].append(aspect_info)
-                
-                return aspects_data
+                return self._parse_item_aspects(data, category_id)
                 
         except Exception as e:
             print(f"Error fetching item aspects: {str(e)}")
             return None
 
+    def _parse_item_aspects(self, data: Dict, category_id: str) -> Dict:
+        """Pick one category's aspects out of the Taxonomy API's category file"""
+        # Process aspects data
+        aspects_data = {
+            "required": [],
+            "recommended": [],
+            "upcoming_required": []
+        }
+        
+        for category_aspect in data.get("categoryAspects", []):
+            if category_aspect["category"]["categoryId"] == category_id:
+                for aspect in category_aspect.get("aspects", []):
+                    aspect_info = {
+                        "name": aspect["localizedAspectName"],
+                        "values": [v["localizedValue"] for v in aspect.get("aspectValues", [])],
+                        "mode": aspect["aspectConstraint"]["aspectMode"],
+                        "data_type": aspect["aspectConstraint"]["aspectDataType"],
+                        "max_length": aspect["aspectConstraint"].get("aspectMaxLength"),
+                        "cardinality": aspect["aspectConstraint"]["itemToAspectCardinality"],
+                        "variation_enabled": aspect["aspectConstraint"]["aspectEnabledForVariations"],
+                        "search_count": aspect.get("relevanceIndicator", {}).get("searchCount")
+                    }
+                    
+                    if aspect["aspectConstraint"]["aspectRequired"]:
+                        aspects_data["required"].append(aspect_info)
+                    elif aspect["aspectConstraint"].get("expectedRequiredByDate"):
+                        aspect_info["required_by"] = aspect["aspectConstraint"]["expectedRequiredByDate"]
+                        aspects_data["upcoming_required"].append(aspect_info)
+                    else:
+                        aspects_data["recommended"].append(aspect_info)
+
+        return aspects_data
+
     async def get_aspect_values(self, category_id: str, aspect_name: str, marketplace_id: str = "EBAY_US") -> List[str]:
         """Get recommended values for a specific aspect"""
         try:
@@ -186,6 +226,23 @@ class EbayListingService:
         
         return value
 
+    def _catalog_product(self, item_id: str, details: Dict) -> Dict:
+        """Catalog entry for an eBay item from its parsed details"""
+        specifics = details['item_specifics']
+        return {
+            'title': details['title'],
+            'upc': specifics.get('UPC', '') if str(specifics.get('UPC', '')).isdigit() else '',
+            'ean': specifics.get('EAN', '') if str(specifics.get('EAN', '')).isdigit() else '',
+            # "Does Not Apply" and the like would merge unrelated items into one entry
+            'model': real_value(specifics.get('Model')) or real_value(specifics.get('MPN')),
+            'brand': real_value(specifics.get('Brand')),
+            'series': specifics.get('Franchise') or specifics.get('Series', ''),
+            'character': specifics.get('Character', ''),
+            'category_id': details['category_id'],
+            'images': details['pictures'],
+            'ebay_item_id': item_id
+        }
+
     def _parse_item_specifics(self, specifics: List) -> Dict:
         """Parse item specifics into a structured format"""
         return {
@@ -0,0 +1,54 @@
+import base64
+import os
+import time
+from typing import Iterable, Optional
+
+from services.http_client import http_client
+from services.metrics import instrument_upstream
+
+BROWSE_SCOPE = 'https://api.ebay.com/oauth/api_scope'
+MARKETPLACE_INSIGHTS_SCOPE = 'https://api.ebay.com/oauth/api_scope/buy.marketplace.insights'
+
+
+def api_host() -> str:
+    """
+    Root of eBay's REST APIs, sandbox unless EBAY_USE_SANDBOX is false
+    """
+    use_sandbox = os.getenv('EBAY_USE_SANDBOX', 'True').lower() == 'true'
+    return 'https://api.sandbox.ebay.com' if use_sandbox else 'https://api.ebay.com'
+
+
+class AppToken:
+    """
+    Application access token (client credentials grant) for a set of
+    scopes, renewed a minute before eBay expires it. Held in process memory only
+    """
+    def __init__(self, scopes: Iterable[str], token_url: Optional[str] = None):
+        self.scope = ' '.join(scopes)
+        self.token_url = token_url or os.getenv('EBAY_OAUTH_URL', f'{api_host()}/identity/v1/oauth/token')
+        self._token: Optional[str] = None
+        self._expires = 0.0
+
+    async def get(self) -> str:
+        if self._token and time.monotonic() < self._expires:
+            return self._token
+
+        credentials = base64.b64encode(
+            f"{os.getenv('EBAY_APP_ID')}:{os.getenv('EBAY_CERT_ID')}".encode()
+        ).decode()
+        async with http_client() as client:
+            with instrument_upstream('ebay_oauth', 'client_credentials'):
+                response = await client.post(
+                    self.token_url,
+                    headers={
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                        'Authorization': f"Basic {credentials}"
+                    },
+                    data={'grant_type': 'client_credentials', 'scope': self.scope}
+                )
+                response.raise_for_status()
+            data = response.json()
+
+        self._token = data['access_token']
+        self._expires = time.monotonic() + float(data.get('expires_in', 7200)) - 60
+        return self._token
@@ -1,10 +1,40 @@
+import asyncio
+import logging
 import os
+import statistics
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from ebaysdk.trading import Connection as Trading
 from ebaysdk.finding import Connection as Finding
-from ebaysdk.analytics import Connection as Analytics
+from services.ebay_oauth import BROWSE_SCOPE, MARKETPLACE_INSIGHTS_SCOPE, AppToken, api_host
+from services.http_client import http_client
+from services.registry import get_item_fetcher
+from services.metrics import instrument_upstream
+from services.cache import cached
+from services.tracing import trace_methods
 
+logger = logging.getLogger(__name__)
+
+# Terapeak queries default to the Funko Pop category
+FUNKO_POP_CATEGORY = '149372'
+# Marketplace Insights returns at most this many item sales per call
+ITEM_SALES_PAGE_SIZE = 200
+TOP_LISTINGS = 10
+# Active listings priced for a product's market data
+MARKET_LISTINGS = 50
+
+
+def legacy_item_id(item: Dict) -> str:
+    """
+    Trading item ID of a REST item
+    """
+    if item.get('legacyItemId'):
+        return str(item['legacyItemId'])
+    # RESTful IDs look like v1|<legacy id>|<variation id>
+    parts = (item.get('itemId') or '').split('|')
+    return parts[1] if len(parts) > 1 else parts[0]
+
+@trace_methods
 class EbayService:
     def __init__(self):
         self.app_id = os.getenv('EBAY_APP_ID')
@@ -25,89 +55,246 @@ class EbayService:
             config_file=None
         )
         
-        self.analytics_api = Analytics(
-            appid=self.app_id,
-            certid=self.cert_id,
-            devid=self.dev_id,
-            token=self.auth_token,
-            config_file=None
-        )
+        # Product lookups, market prices and Terapeak data come from the Browse
+        # and Marketplace Insights REST APIs
+        self.marketplace_id = os.getenv('EBAY_MARKETPLACE_ID', 'EBAY_US')
+        self.insights_url = os.getenv(
+            'EBAY_INSIGHTS_URL', f'{api_host()}/buy/marketplace_insights/v1_beta'
+        ).rstrip('/')
+        self.browse_url = os.getenv('EBAY_BROWSE_URL', f'{api_host()}/buy/browse/v1').rstrip('/')
+        self.browse_token = AppToken([BROWSE_SCOPE])
+        # Marketplace Insights is only open to apps eBay approved for it
+        self.insights_token = AppToken([BROWSE_SCOPE, MARKETPLACE_INSIGHTS_SCOPE])
+
+        self.item_fetcher = get_item_fetcher()
 
-    def get_terapeak_data(self, query: str, days: int = 30) -> Dict:
+    @cached('terapeak', ttl=3600, cache_if=lambda data: data is not None)
+    async def get_terapeak_data(self, query: str, days: int = 30, query_type: str = 'keywords') -> Dict:
         """
         Get Terapeak sales data for a specific query
         """
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
         try:
-            response = self.analytics_api.execute('getMarketplaceInsights', {
-                'keywords': query,
-                'categoryId': '149372',  # Funko Pop category
-                'dateRange': {
-                    'from': start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
-                    'to': end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-                },
-                'marketplaceId': 'EBAY_US',
-                'metricKeys': [
-                    'SOLD_ITEMS',
-                    'AVERAGE_SOLD_PRICE',
-                    'SELL_THROUGH_RATE',
-                    'TOTAL_GMV',
-                    'AVERAGE_SHIPPING_COST'
-                ]
-            })
-            
-            # Get top performing listings
-            top_listings = self.analytics_api.execute('getListingAnalytics', {
-                'keywords': query,
-                'categoryId': '149372',
-                'dateRange': {
-                    'from': start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
-                    'to': end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-                },
-                'marketplaceId': 'EBAY_US',
-                'limit': 10,
-                'offset': 0,
-                'sort': 'TOTAL_GMV',
-                'sortOrder': 'DESC'
-            })
-            
-            # Format the response
-            metrics = response.dict()['insights'][0]['metrics']
-            listings = top_listings.dict()['listings']
-            
-            return {
-                'metrics': {
-                    'totalSold': metrics['SOLD_ITEMS'],
-                    'avgSoldPrice': metrics['AVERAGE_SOLD_PRICE'],
-                    'sellThrough': metrics['SELL_THROUGH_RATE'],
-                    'totalGMV': metrics['TOTAL_GMV'],
-                    'avgShipping': metrics['AVERAGE_SHIPPING_COST']
-                },
-                'topListings': [{
-                    'itemId': listing['itemId'],
-                    'title': listing['title'],
-                    'price': listing['price'],
-                    'soldQuantity': listing['soldQuantity'],
-                    'totalGMV': listing['totalGMV'],
-                    'sellThrough': listing['sellThroughRate']
-                } for listing in listings]
-            }
-            
+            return await self.fetch_terapeak_data(query, days, query_type=query_type)
         except Exception as e:
             print(f"Error getting Terapeak data: {str(e)}")
             return None
-            
+
+    async def fetch_terapeak_data(self, query: str, days: int = 30, category_id: str = FUNKO_POP_CATEGORY,
+                                  query_type: str = 'keywords') -> Dict:
+        """
+        Terapeak metrics and top listings for a query, uncached; errors are raised.
+        Sales come from one Marketplace Insights item_sales search (the first
+        200 matches), the active listings behind the sell-through rate from a
+        Browse search. UPC queries match on GTIN
+        """
+        match = {'gtin': query} if query_type == 'upc' else {'q': query}
+        sales = await self._item_sales({**match, 'category_ids': category_id}, days)
+        active = int((await self._search_items({**match, 'category_ids': category_id}, limit=1)).get('total') or 0)
+
+        listings = []
+        for sale in sales:
+            price = float((sale.get('lastSoldPrice') or {}).get('value') or 0)
+            sold = int(sale.get('totalSoldQuantity') or 0)
+            shipping = ((sale.get('shippingOptions') or [{}])[0].get('shippingCost') or {}).get('value')
+            listings.append({
+                'itemId': legacy_item_id(sale),
+                'title': sale.get('title'),
+                'price': price,
+                'soldQuantity': sold,
+                'totalGMV': round(price * sold, 2),
+                # Item sales don't say how many of a listing were offered
+                'sellThrough': None,
+                'shipping': float(shipping) if shipping is not None else None
+            })
+
+        total_sold = sum(listing['soldQuantity'] for listing in listings)
+        total_gmv = round(sum(listing['totalGMV'] for listing in listings), 2)
+        shipping_costs = [listing['shipping'] for listing in listings if listing['shipping'] is not None]
+        top_listings = sorted(listings, key=lambda listing: listing['totalGMV'], reverse=True)[:TOP_LISTINGS]
+        for listing in top_listings:
+            del listing['shipping']
+
+        return {
+            'metrics': {
+                'totalSold': total_sold,
+                'avgSoldPrice': round(total_gmv / total_sold, 2) if total_sold else 0.0,
+                # Percent of the sold and still listed units that sold
+                'sellThrough': round(100 * total_sold / (total_sold + active), 1) if total_sold + active else 0.0,
+                'totalGMV': total_gmv,
+                'avgShipping': round(sum(shipping_costs) / len(shipping_costs), 2) if shipping_costs else 0.0
+            },
+            'topListings': top_listings
+        }
+
+    async def find_by_upc(self, upc: str) -> Dict:
+        """
+        Identify a product from the active eBay listings carrying its UPC
+        """
+        try:
+            summaries = (await self._search_items({'gtin': upc}, limit=1)).get('itemSummaries') or []
+            if not summaries:
+                return {"success": False, "message": "Product not found"}
+            summary = summaries[0]
+            details = await self.item_fetcher.get_item(legacy_item_id(summary)) or {}
+        except Exception as e:
+            print(f"Error finding product by UPC: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+        specifics = details.get('itemSpecifics') or {}
+        images = details.get('images') or [
+            image['imageUrl'] for image in [summary.get('image') or {}] if image.get('imageUrl')
+        ]
+        product = {
+            "title": summary.get('title', ''),
+            "description": details.get('description') or '',
+            "brand": specifics.get('Brand', ''),
+            "model": specifics.get('Model', ''),
+            "category": ((summary.get('categories') or [{}])[0]).get('categoryName', ''),
+            "upc": upc,
+            "images": images,
+            "source": "ebay"
+        }
+        # Keep every resolved product in the local catalog
+        from services.catalog_service import get_catalog
+        await asyncio.to_thread(get_catalog().upsert, product, 'ebay')
+        return {"success": True, "product": product}
+
+    async def get_item_transactions(self, title: str) -> Dict:
+        """
+        Market data for a product title: prices of the current listings from
+        Browse and units sold over the last 30 days from Marketplace Insights,
+        when the app has access to it and the daily Analytics limit allows
+        """
+        try:
+            active = await self._search_items({'q': title}, limit=MARKET_LISTINGS)
+        except Exception as e:
+            print(f"Error getting market data: {str(e)}")
+            return {"success": False, "data": {}}
+
+        prices = [float(item['price']['value']) for item in active.get('itemSummaries') or []
+                  if (item.get('price') or {}).get('value')]
+        data = {
+            'average_price': round(sum(prices) / len(prices), 2) if prices else None,
+            'min_price': min(prices) if prices else None,
+            'max_price': max(prices) if prices else None,
+            'total_listings': int(active.get('total') or 0),
+            'sold_last_month': None
+        }
+
+        if await self._reserve_insights_call():
+            try:
+                sales = await self._item_sales({'q': title}, 30)
+                data['sold_last_month'] = sum(int(sale.get('totalSoldQuantity') or 0) for sale in sales)
+            except Exception as e:
+                logger.warning(f"No sold data for market prices: {str(e)}")
+        return {"success": True, "data": data}
+
+    async def search_completed_items(self, query: str, days: int = 90) -> Dict:
+        """
+        Items sold over the last `days` matching a query, with a price summary.
+        Current listings stand in when Marketplace Insights isn't available
+        """
+        items = None
+        source = 'sold'
+        if await self._reserve_insights_call():
+            try:
+                items = [{
+                    'itemId': legacy_item_id(sale),
+                    'title': sale.get('title'),
+                    'price': float((sale.get('lastSoldPrice') or {}).get('value') or 0),
+                    'soldQuantity': int(sale.get('totalSoldQuantity') or 0)
+                } for sale in await self._item_sales({'q': query}, days)]
+            except Exception as e:
+                logger.warning(f"No sold data for {query!r}, pricing current listings: {str(e)}")
+
+        if items is None:
+            source = 'active'
+            try:
+                summaries = (await self._search_items({'q': query}, limit=MARKET_LISTINGS)).get('itemSummaries') or []
+            except Exception as e:
+                print(f"Error searching completed items: {str(e)}")
+                return {'success': False, 'error': str(e), 'source': None, 'items': [], 'price_analysis': None}
+            items = [{
+                'itemId': legacy_item_id(summary),
+                'title': summary.get('title'),
+                'price': float((summary.get('price') or {}).get('value') or 0),
+                'soldQuantity': None
+            } for summary in summaries]
+
+        prices = [item['price'] for item in items if item['price']]
+        if not prices:
+            return {'success': False, 'source': source, 'items': items, 'price_analysis': None}
+        return {
+            'success': True,
+            'source': source,
+            'items': items,
+            'price_analysis': {
+                'median': round(statistics.median(prices), 2),
+                'average': round(sum(prices) / len(prices), 2),
+                'min': min(prices),
+                'max': max(prices),
+                'count': len(prices)
+            }
+        }
+
+    async def _reserve_insights_call(self) -> bool:
+        """
+        Marketplace Insights calls outside research count against the same daily limit
+        """
+        from services.comps_store import get_comps_store
+        from services.research_jobs import ANALYTICS_API, analytics_daily_limit
+        return await asyncio.to_thread(get_comps_store().consume_quota, ANALYTICS_API, 1, analytics_daily_limit())
+
+    async def _search_items(self, params: Dict, limit: int) -> Dict:
+        """
+        Browse item_summary/search: active listings and their total
+        """
+        async with http_client() as client:
+            with instrument_upstream('ebay_browse', 'item_summary_search'):
+                response = await client.get(
+                    f"{self.browse_url}/item_summary/search",
+                    params={**params, 'limit': limit},
+                    headers={
+                        'Authorization': f"Bearer {await self.browse_token.get()}",
+                        'X-EBAY-C-MARKETPLACE-ID': self.marketplace_id
+                    }
+                )
+                response.raise_for_status()
+            return response.json()
+
+    async def _item_sales(self, params: Dict, days: int) -> List[Dict]:
+        """
+        Marketplace Insights item_sales/search: items sold over the last `days`
+        """
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        async with http_client() as client:
+            with instrument_upstream('ebay_analytics', 'item_sales_search'):
+                response = await client.get(
+                    f"{self.insights_url}/item_sales/search",
+                    params={
+                        **params,
+                        'filter': f"lastSoldDate:[{start_date:%Y-%m-%dT%H:%M:%S.000Z}..{end_date:%Y-%m-%dT%H:%M:%S.000Z}]",
+                        'limit': ITEM_SALES_PAGE_SIZE
+                    },
+                    headers={
+                        'Authorization': f"Bearer {await self.insights_token.get()}",
+                        'X-EBAY-C-MARKETPLACE-ID': self.marketplace_id
+                    }
+                )
+                response.raise_for_status()
+            return response.json().get('itemSales') or []
+
     def get_listing_details(self, item_id: str) -> Optional[Dict]:
         """
         Get detailed information about a specific listing
         """
         try:
-            response = self.trading_api.execute('GetItem', {
-                'ItemID': item_id,
-                'DetailLevel': 'ReturnAll'
-            })
+            with instrument_upstream('ebay_trading', 'GetItem'):
+                response = self.trading_api.execute('GetItem', {
+                    'ItemID': item_id,
+                    'DetailLevel': 'ReturnAll'
+                })
             
             item = response.dict()['Item']
             
@@ -130,33 +317,43 @@ class EbayService:
             print(f"Error getting listing details: {str(e)}")
             return None
             
-    def get_similar_listings(self, item_id: str) -> List[Dict]:
+    async def get_similar_listings(self, item_id: str, include_details: bool = True) -> List[Dict]:
         """
-        Get similar active listings
+        Get similar active listings, with their item specifics fetched in bulk
         """
         try:
-            item_details = self.get_listing_details(item_id)
+            item_details = await self.item_fetcher.get_item(item_id)
             if not item_details:
                 return []
                 
-            response = self.finding_api.execute('findItemsAdvanced', {
-                'keywords': item_details['title'],
-                'categoryId': '149372',
-                'itemFilter': [
-                    {'name': 'Condition', 'value': item_details['condition']},
-                    {'name': 'ListingType', 'value': 'FixedPrice'}
-                ],
-                'sortOrder': 'PricePlusShippingHighest'
-            })
+            with instrument_upstream('ebay_finding', 'findItemsAdvanced'):
+                response = await asyncio.to_thread(self.finding_api.execute, 'findItemsAdvanced', {
+                    'keywords': item_details['title'],
+                    'categoryId': '149372',
+                    'itemFilter': [
+                        {'name': 'Condition', 'value': item_details['condition']},
+                        {'name': 'ListingType', 'value': 'FixedPrice'}
+                    ],
+                    'sortOrder': 'PricePlusShippingHighest'
+                })
             
             items = response.dict()['searchResult']['item']
-            return [{
+            listings = [{
                 'itemId': item['itemId'],
                 'title': item['title'],
                 'price': item['sellingStatus']['currentPrice']['value'],
                 'shipping': item.get('shippingInfo', {}).get('shippingServiceCost', {}).get('value', '0.00'),
                 'condition': item.get('condition', {}).get('conditionDisplayName')
             } for item in items]
+
+            if include_details:
+                # One getItems call per 20 listings instead of a GetItem each
+                details = await self.item_fetcher.get_items(listing['itemId'] for listing in listings)
+                for listing in listings:
+                    detail = details.get(str(listing['itemId'])) or {}
+                    listing['itemSpecifics'] = detail.get('itemSpecifics', {})
+                    listing['images'] = detail.get('images', [])
+            return listings
             
         except Exception as e:
             print(f"Error getting similar listings: {str(e)}")
@@ -167,10 +364,11 @@ class EbayService:
         Get item aspects for a specific category
         """
         try:
-            response = self.trading_api.execute('GetCategorySpecifics', {
-                'CategoryID': category_id,
-                'DetailLevel': 'ReturnAll'
-            })
+            with instrument_upstream('ebay_trading', 'GetCategorySpecifics'):
+                response = self.trading_api.execute('GetCategorySpecifics', {
+                    'CategoryID': category_id,
+                    'DetailLevel': 'ReturnAll'
+                })
             
             # Extract aspects from response
             aspects = []
@@ -4,7 +4,28 @@ from typing import Dict, List, Optional, Tuple
 import json
 from difflib import SequenceMatcher
 import re
+from services.cache import cached
+from services.metrics import instrument_upstream
+from services.tracing import trace_methods
 
+
+def bind_local_endpoint(model: genai.GenerativeModel):
+    """
+    Send a model's async calls to GEMINI_API_ENDPOINT over plain gRPC, for
+    offline runs against a local stand-in; the SDK only offers TLS endpoints.
+    Must run inside the event loop that will make the calls
+    """
+    endpoint = os.getenv('GEMINI_API_ENDPOINT')
+    if endpoint and model._async_client is None:
+        import grpc
+        from google.ai import generativelanguage as glm
+        from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+            GenerativeServiceGrpcAsyncIOTransport
+        )
+        transport = GenerativeServiceGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(endpoint))
+        model._async_client = glm.GenerativeServiceAsyncClient(transport=transport)
+
+@trace_methods
 class GeminiService:
     def __init__(self):
         genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
@@ -16,14 +37,16 @@ class GeminiService:
             # Build context-aware prompt
             prompt = self._build_aspect_prompt(aspect_name, context)
             
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,  # Lower temperature for more focused responses
-                    candidate_count=1,
-                    stop_sequences=["\n"]  # Stop at newline to get just the value
+            bind_local_endpoint(self.model)
+            with instrument_upstream('gemini', 'get_item_specific_value'):
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.3,  # Lower temperature for more focused responses
+                        candidate_count=1,
+                        stop_sequences=["\n"]  # Stop at newline to get just the value
+                    )
                 )
-            )
             
             value = response.text.strip()
             confidence = self._calculate_confidence(value, aspect_name, context)
@@ -34,19 +57,22 @@ class GeminiService:
             print(f"Error getting item specific value: {str(e)}")
             return "", 0.0
             
+    @cached('gemini_item_specifics', ttl=86400, max_entries=2048, cache_if=bool)
     async def get_multiple_item_specifics(self, aspects: List[Dict], context: Dict) -> Dict[str, Dict]:
         """Get multiple item specific values with confidence scores"""
         try:
             # Build a comprehensive prompt for all aspects
             prompt = self._build_multiple_aspects_prompt(aspects, context)
             
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,
-                    candidate_count=1
+            bind_local_endpoint(self.model)
+            with instrument_upstream('gemini', 'get_multiple_item_specifics'):
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.3,
+                        candidate_count=1
+                    )
                 )
-            )
             
             try:
                 # Parse the response as JSON with confidence scores
@@ -205,6 +231,9 @@ Category: {category}
 Additional Attributes:
 {additional_attrs}
 
+Values Read From Product Photos (may be wrong; use only if consistent with the details above):
+{self._format_item_specific_hints(context)}
+
 Previous Successful Values:
 {self._format_previous_values(previous_values)}
 
@@ -244,6 +273,14 @@ Response:"""
             
         return "\n".join([f"- {key}: {value}" for key, value in additional.items()])
 
+    def _format_item_specific_hints(self, context: Dict) -> str:
+        """Format unverified aspect values from context"""
+        hints = context.get('item_specific_hints', {})
+        if not hints:
+            return "None"
+
+        return "\n".join([f"- {key}: {value}" for key, value in hints.items()])
+
     def _calculate_confidence(self, value: str, aspect_name: str, context: Dict) -> float:
         """Calculate confidence score for a suggested value"""
         if not value:
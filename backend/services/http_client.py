@@ -0,0 +1,47 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The process-wide HTTP client. Its connection pool keeps TLS sessions to
+    eBay, Google and UPCitemdb alive between requests instead of opening a
+    new connection for every call
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # Pooled connections belong to the loop that opened them
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(float(os.getenv('HTTP_TIMEOUT', '15')), connect=5.0),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+                max_keepalive_connections=int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+            )
+        )
+        _client_loop = loop
+    return _client
+
+
+@asynccontextmanager
+async def http_client() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Drop-in for `async with httpx.AsyncClient() as client` that borrows the
+    shared client instead of opening and closing one
+    """
+    yield get_http_client()
+
+
+async def close_http_client():
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
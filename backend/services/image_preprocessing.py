@@ -0,0 +1,62 @@
+import hashlib
+import io
+import os
+from typing import BinaryIO, Union
+from PIL import Image, ImageOps
+
+# Longest side sent to Vision; enough for labels and small box text
+MAX_DIMENSION = int(os.getenv('VISION_MAX_DIMENSION', '1600'))
+JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', '85'))
+
+
+class PreparedImage:
+    """A downscaled, EXIF-free JPEG ready for Vision, with its hashes"""
+    __slots__ = ('content', 'content_hash', 'perceptual_hash', 'width', 'height', 'original_size')
+
+    def __init__(self, content: bytes, perceptual_hash: int, width: int, height: int, original_size: int):
+        self.content = content
+        self.content_hash = hashlib.sha256(content).hexdigest()
+        self.perceptual_hash = perceptual_hash
+        self.width = width
+        self.height = height
+        self.original_size = original_size
+
+
+def prepare_image(source: Union[bytes, BinaryIO]) -> PreparedImage:
+    """
+    Downscale and re-encode a photo for Vision. The image is rotated per its
+    EXIF orientation and saved without metadata
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        original_size = len(source)
+        source = io.BytesIO(source)
+    else:
+        source.seek(0, os.SEEK_END)
+        original_size = source.tell()
+        source.seek(0)
+
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding
+        image.draft('RGB', (MAX_DIMENSION, MAX_DIMENSION))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    return PreparedImage(output.getvalue(), difference_hash(image), image.width, image.height, original_size)
+
+
+def difference_hash(image: Image.Image) -> int:
+    """
+    64-bit dHash: near-identical photos differ in only a few bits
+    """
+    pixels = list(image.convert('L').resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
@@ -0,0 +1,256 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.local_store import connect
+from services.tracing import trace_methods
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inventory_items (
+    upc TEXT PRIMARY KEY,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL DEFAULT '',
+    description TEXT,
+    brand TEXT,
+    category TEXT,
+    images TEXT NOT NULL DEFAULT '[]',
+    market_data TEXT NOT NULL DEFAULT '{}',
+    suggested_price REAL,
+    created_at REAL NOT NULL,
+    last_updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_updated ON inventory_items (last_updated DESC, upc);
+CREATE INDEX IF NOT EXISTS idx_inventory_brand ON inventory_items (brand COLLATE NOCASE, last_updated DESC);
+CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory_items (category, last_updated DESC);
+
+-- One row per change in market prices; amounts are stored in cents
+CREATE TABLE IF NOT EXISTS price_history (
+    upc TEXT NOT NULL,
+    captured_at INTEGER NOT NULL,
+    average_cents INTEGER,
+    min_cents INTEGER,
+    max_cents INTEGER,
+    total_listings INTEGER,
+    sold_last_month INTEGER,
+    PRIMARY KEY (upc, captured_at)
+) WITHOUT ROWID;
+'''
+
+# market_data keys captured in a price snapshot, in column order
+SNAPSHOT_PRICES = ('average_price', 'min_price', 'max_price')
+SNAPSHOT_COUNTS = ('total_listings', 'sold_last_month')
+HISTORY_LIMIT = 50
+
+UPSERT_SQL = '''
+INSERT INTO inventory_items (upc, quantity, title, description, brand, category, images,
+                             market_data, suggested_price, created_at, last_updated)
+VALUES (:upc, :quantity, :title, :description, :brand, :category, :images,
+        :market_data, :suggested_price, :now, :now)
+ON CONFLICT (upc) DO UPDATE SET
+    quantity = quantity + excluded.quantity,
+    title = CASE WHEN excluded.title != '' THEN excluded.title ELSE title END,
+    description = COALESCE(excluded.description, description),
+    brand = COALESCE(excluded.brand, brand),
+    category = COALESCE(excluded.category, category),
+    images = CASE WHEN excluded.images != '[]' THEN excluded.images ELSE images END,
+    market_data = CASE WHEN excluded.market_data != '{}' THEN excluded.market_data ELSE market_data END,
+    suggested_price = COALESCE(excluded.suggested_price, suggested_price),
+    last_updated = excluded.last_updated
+'''
+
+
+def _cents(value) -> Optional[int]:
+    try:
+        return round(float(value) * 100) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _count(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+@trace_methods
+class InventoryStore:
+    """
+    Scanned inventory in SQLite. Repeated scans of a UPC add to its quantity,
+    and market prices are kept as a compact history of changes.
+    """
+    def __init__(self, db_file: str = 'inventory.db'):
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def record_scans(self, products: List[Dict]) -> int:
+        """
+        Upsert scanned products in a single transaction; returns the number stored
+        """
+        now = time.time()
+        rows = []
+        snapshots = []
+        for product in products:
+            upc = str(product.get('upc') or '').strip()
+            if not upc:
+                continue
+            market_data = product.get('market_data') or {}
+            rows.append({
+                'upc': upc,
+                'quantity': int(product.get('quantity') or 1),
+                'title': product.get('title') or '',
+                'description': product.get('description') or None,
+                'brand': product.get('brand') or None,
+                'category': product.get('category') or None,
+                'images': json.dumps(product.get('images') or []),
+                'market_data': json.dumps(market_data),
+                'suggested_price': product.get('suggested_price') or market_data.get('average_price'),
+                'now': now
+            })
+            snapshot = self._snapshot(market_data)
+            if snapshot:
+                snapshots.append((upc, snapshot))
+
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT_SQL, rows)
+            for upc, snapshot in snapshots:
+                self._add_snapshot(upc, snapshot, int(now))
+        return len(rows)
+
+    def _snapshot(self, market_data: Dict) -> Optional[tuple]:
+        snapshot = tuple(_cents(market_data.get(key)) for key in SNAPSHOT_PRICES) + \
+            tuple(_count(market_data.get(key)) for key in SNAPSHOT_COUNTS)
+        return snapshot if any(value is not None for value in snapshot) else None
+
+    def _add_snapshot(self, upc: str, snapshot: tuple, captured_at: int):
+        last = self._conn.execute(
+            "SELECT captured_at, average_cents, min_cents, max_cents, total_listings, sold_last_month "
+            "FROM price_history WHERE upc = ? ORDER BY captured_at DESC LIMIT 1",
+            (upc,)
+        ).fetchone()
+        if last is not None:
+            # Unchanged prices don't get a new row
+            if tuple(last)[1:] == snapshot:
+                return
+            # A change within the same second still gets its own row after the last one
+            captured_at = max(captured_at, last['captured_at'] + 1)
+        self._conn.execute(
+            "INSERT INTO price_history VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (upc, captured_at, *snapshot)
+        )
+
+    def get_item(self, upc: str, history_limit: int = HISTORY_LIMIT) -> Optional[Dict]:
+        """
+        An inventory item with its most recent price history
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM inventory_items WHERE upc = ?", (upc.strip(),)).fetchone()
+            if not row:
+                return None
+            history = self._conn.execute(
+                "SELECT * FROM price_history WHERE upc = ? ORDER BY captured_at DESC LIMIT ?",
+                (row['upc'], history_limit)
+            ).fetchall()
+
+        item = self._row_to_item(row)
+        item['price_history'] = [
+            {
+                'captured_at': entry['captured_at'],
+                'average_price': entry['average_cents'] / 100 if entry['average_cents'] is not None else None,
+                'min_price': entry['min_cents'] / 100 if entry['min_cents'] is not None else None,
+                'max_price': entry['max_cents'] / 100 if entry['max_cents'] is not None else None,
+                'total_listings': entry['total_listings'],
+                'sold_last_month': entry['sold_last_month']
+            }
+            for entry in history
+        ]
+        return item
+
+    def list_items(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        brand: Optional[str] = None,
+        category: Optional[str] = None,
+        min_quantity: Optional[int] = None
+    ) -> Dict:
+        """
+        Page through inventory, most recently updated first.
+        `cursor` is the `next_cursor` of the previous page
+        """
+        clauses = []
+        params: list = []
+        if brand:
+            clauses.append("brand = ? COLLATE NOCASE")
+            params.append(brand)
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if min_quantity is not None:
+            clauses.append("quantity >= ?")
+            params.append(min_quantity)
+        if cursor:
+            # Keyset pagination on (last_updated, upc) stays fast on deep pages
+            updated, _, upc = cursor.partition(':')
+            clauses.append("(last_updated < ? OR (last_updated = ? AND upc > ?))")
+            params.extend([float(updated), float(updated), upc])
+
+        sql = "SELECT * FROM inventory_items"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY last_updated DESC, upc LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        items = [self._row_to_item(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last['last_updated']!r}:{last['upc']}"
+        return {
+            'items': items,
+            'next_cursor': next_cursor
+        }
+
+    def upcs(self) -> List[str]:
+        """
+        Every UPC in inventory, most recently updated first
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT upc FROM inventory_items ORDER BY last_updated DESC").fetchall()
+        return [row['upc'] for row in rows]
+
+    def _row_to_item(self, row) -> Dict:
+        return {
+            'upc': row['upc'],
+            'quantity': row['quantity'],
+            'title': row['title'],
+            'description': row['description'],
+            'brand': row['brand'],
+            'category': row['category'],
+            'images': json.loads(row['images']),
+            'market_data': json.loads(row['market_data']),
+            'suggested_price': row['suggested_price'],
+            'last_updated': row['last_updated']
+        }
+
+
+_store: Optional[InventoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_inventory() -> InventoryStore:
+    """
+    The process-wide inventory store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = InventoryStore()
+    return _store
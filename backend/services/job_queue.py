@@ -0,0 +1,458 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from services.local_store import connect
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    queue TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (queue, created_at);
+CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (status, job_id);
+'''
+
+
+class TransientJobError(Exception):
+    """
+    Raised by a job handler when the item should be retried later. With
+    `retry_after` (seconds) the item waits that long and the attempt isn't
+    counted, e.g. when a daily API quota is used up
+    """
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# HTTP statuses worth retrying: timeouts, throttling and server-side failures
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """
+    The HTTP status behind an error: google.api_core exceptions carry it as
+    `code`, httpx, requests and ebaysdk errors on their `response`
+    """
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and 100 <= code < 600:
+        return code
+    code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether a failed upstream call may succeed if retried later: network
+    errors and timeouts, or a throttling or server-error status
+    """
+    import httpx
+    import requests
+
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError, httpx.TransportError,
+                          requests.ConnectionError, requests.Timeout)):
+        return True
+    return _status_code(error) in TRANSIENT_STATUS_CODES
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that no more than `requests_per_minute` start per minute
+    """
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class JobQueue:
+    """
+    SQLite-backed batch job queue processed by a pool of asyncio workers.
+
+    Each job is a list of item payloads handed one at a time to `handler`.
+    Items of higher-priority jobs are processed first. Item state is
+    persisted after every transition so that a restarted process picks up
+    where the previous one stopped.
+
+    Several processes may share the database. An item is claimed with a
+    conditional UPDATE, so only one of them runs it, and the claim is a
+    lease its owner renews while the item runs; items whose lease expired
+    (their process died) are handed back out. Database work runs in
+    threads, so a busy database never holds up the event loop; callers of
+    `get_job` and `list_jobs` do the same.
+    """
+    def __init__(
+        self,
+        name: str,
+        handler: JobHandler,
+        db_file: str = 'jobs.db',
+        concurrency: int = 4,
+        requests_per_minute: float = 60,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+        lease_seconds: float = 60.0
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._conn = connect(db_file)
+        self._db_lock = threading.Lock()
+        with self._db_lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+        # Entries are (-priority, sequence, job_id, idx): highest priority first, FIFO within it
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._leases: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Condition] = None
+
+    async def start(self):
+        """
+        Start the worker pool and enqueue pending items, including those
+        left running by a process whose lease has expired
+        """
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._changed = asyncio.Condition()
+
+        pending = await asyncio.to_thread(self._pending_items)
+        for row in pending:
+            self._enqueue(row['job_id'], row['idx'], row['priority'])
+        if pending:
+            logger.info(f"Resuming {len(pending)} pending items for queue {self.name}")
+        await self._reclaim_expired()
+
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self._leases = asyncio.create_task(self._renew_leases(), name=f"{self.name}-leases")
+
+    async def stop(self):
+        """
+        Stop the workers and expire the leases of their in-flight items, so
+        the next process to reclaim expired items resumes them
+        """
+        tasks = self._workers + ([self._leases] if self._leases else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._leases = None
+        await asyncio.to_thread(self._expire_own_leases)
+
+    async def submit(self, items: List[Dict[str, Any]], metadata: Optional[Dict] = None, priority: int = 0) -> str:
+        """
+        Persist a new job and enqueue its items; higher priorities run first
+        """
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._insert_job, job_id, items, metadata, priority)
+        if self._queue is not None:
+            for idx in range(len(items)):
+                self._enqueue(job_id, idx, priority)
+        return job_id
+
+    def _insert_job(self, job_id: str, items: List[Dict[str, Any]], metadata: Optional[Dict], priority: int):
+        now = time.time()
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, queue, status, total, priority, metadata, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, self.name, 'pending' if items else 'completed', len(items), priority,
+                 json.dumps(metadata or {}), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, status, payload, updated_at) VALUES (?, ?, 'pending', ?, ?)",
+                [(job_id, idx, json.dumps(item), now) for idx, item in enumerate(items)]
+            )
+
+    def _pending_items(self) -> List:
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT i.job_id, i.idx, j.priority FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE j.queue = ? AND i.status = 'pending' ORDER BY j.created_at, i.idx",
+                (self.name,)
+            ).fetchall()
+
+    def _expire_own_leases(self):
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_items SET lease_until = 0, attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE status = 'running' AND owner = ?",
+                (time.time(), self.owner)
+            )
+
+    def _enqueue(self, job_id: str, idx: int, priority: int):
+        self._queue.put_nowait((-priority, next(self._sequence), job_id, idx))
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._extend_leases)
+                await self._reclaim_expired()
+            except Exception as e:
+                logger.error(f"Error renewing leases for queue {self.name}: {str(e)}")
+
+    def _extend_leases(self):
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_items SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease_seconds, self.owner)
+            )
+
+    async def _reclaim_expired(self):
+        """
+        Put items whose owner stopped renewing their lease back to pending and
+        enqueue them here. Another process may enqueue the same items; the
+        claim in `_process` lets only one of them run each
+        """
+        expired = await asyncio.to_thread(self._release_expired)
+        for row in expired:
+            self._enqueue(row['job_id'], row['idx'], row['priority'])
+        if expired:
+            logger.info(f"Reclaimed {len(expired)} items with expired leases for queue {self.name}")
+
+    def _release_expired(self) -> List:
+        now = time.time()
+        with self._db_lock, self._conn:
+            expired = self._conn.execute(
+                "SELECT i.job_id, i.idx, j.priority FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE j.queue = ? AND i.status = 'running' AND (i.lease_until IS NULL OR i.lease_until < ?)",
+                (self.name, now)
+            ).fetchall()
+            for row in expired:
+                self._conn.execute(
+                    "UPDATE job_items SET status = 'pending', owner = NULL, lease_until = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND idx = ? AND status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                    (now, row['job_id'], row['idx'], now)
+                )
+        return expired
+
+    def get_job(self, job_id: str, include_results: bool = True, since: Optional[float] = None) -> Optional[Dict]:
+        """
+        Get job progress, optionally with the per-item results finished after `since`
+        """
+        with self._db_lock:
+            job = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND queue = ?", (job_id, self.name)
+            ).fetchone()
+            if not job:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            items = []
+            if include_results:
+                query = "SELECT idx, status, attempts, result, error, updated_at FROM job_items WHERE job_id = ?"
+                params: tuple = (job_id,)
+                if since is not None:
+                    query += " AND updated_at > ? AND status IN ('completed', 'failed')"
+                    params += (since,)
+                items = self._conn.execute(query + " ORDER BY idx", params).fetchall()
+
+        return {
+            "job_id": job['id'],
+            "status": job['status'],
+            "total": job['total'],
+            "priority": job['priority'],
+            "completed": counts.get('completed', 0),
+            "failed": counts.get('failed', 0),
+            "pending": counts.get('pending', 0) + counts.get('running', 0),
+            "metadata": json.loads(job['metadata'] or '{}'),
+            "created_at": job['created_at'],
+            "updated_at": job['updated_at'],
+            "items": [
+                {
+                    "index": item['idx'],
+                    "status": item['status'],
+                    "attempts": item['attempts'],
+                    "result": json.loads(item['result']) if item['result'] else None,
+                    "error": item['error'],
+                    "updated_at": item['updated_at']
+                }
+                for item in items
+            ]
+        }
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """
+        Most recent jobs without item results
+        """
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE queue = ? ORDER BY created_at DESC LIMIT ?", (self.name, limit)
+            ).fetchall()
+        return [self.get_job(row['id'], include_results=False) for row in rows]
+
+    async def watch(self, job_id: str, poll_interval: float = 15.0) -> AsyncIterator[Dict]:
+        """
+        Yield a progress snapshot with newly finished items whenever the job changes,
+        until it is done
+        """
+        since = 0.0
+        while True:
+            snapshot = await asyncio.to_thread(self.get_job, job_id, True, since)
+            if snapshot is None:
+                return
+            if snapshot['items']:
+                since = max(item['updated_at'] for item in snapshot['items'])
+            yield snapshot
+            if snapshot['status'] in ('completed', 'completed_with_errors'):
+                return
+            if self._changed is None:
+                await asyncio.sleep(poll_interval)
+                continue
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _worker(self):
+        while True:
+            _, _, job_id, idx = await self._queue.get()
+            try:
+                await self._process(job_id, idx)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error processing {job_id}/{idx}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str, idx: int):
+        row = await asyncio.to_thread(self._claim, job_id, idx)
+        if row is None:
+            return
+        attempts = row['attempts']
+
+        await self.rate_limiter.acquire()
+        try:
+            result = await self.handler(json.loads(row['payload']))
+        except TransientJobError as e:
+            if e.retry_after is not None:
+                await self._retry_later(job_id, idx, row['priority'], attempts - 1, str(e), e.retry_after)
+            elif attempts < self.max_attempts:
+                delay = self.retry_delay * (2 ** (attempts - 1))
+                await self._retry_later(job_id, idx, row['priority'], attempts, str(e), delay)
+            else:
+                await asyncio.to_thread(self._finish_item, job_id, idx, 'failed', None, str(e))
+        except Exception as e:
+            await asyncio.to_thread(self._finish_item, job_id, idx, 'failed', None, str(e))
+        else:
+            await asyncio.to_thread(self._finish_item, job_id, idx, 'completed', result)
+        await self._notify()
+
+    def _claim(self, job_id: str, idx: int):
+        """
+        Take a pending item; its payload, attempts and job priority, or None
+        if another worker got it first
+        """
+        now = time.time()
+        with self._db_lock, self._conn:
+            # Atomic across processes sharing the database: only one claim succeeds
+            claimed = self._conn.execute(
+                "UPDATE job_items SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE job_id = ? AND idx = ? AND status = 'pending'",
+                (self.owner, now + self.lease_seconds, now, job_id, idx)
+            ).rowcount
+            if not claimed:
+                return None
+            row = self._conn.execute(
+                "SELECT i.payload, i.attempts, j.priority FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.job_id = ? AND i.idx = ?", (job_id, idx)
+            ).fetchone()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'pending'",
+                (now, job_id)
+            )
+        return row
+
+    async def _retry_later(self, job_id: str, idx: int, priority: int, attempts: int, error: str, delay: float):
+        released = await asyncio.to_thread(self._release, job_id, idx, attempts, error)
+        if released:
+            asyncio.get_running_loop().call_later(delay, self._enqueue, job_id, idx, priority)
+
+    def _release(self, job_id: str, idx: int, attempts: int, error: str) -> bool:
+        with self._db_lock, self._conn:
+            return self._conn.execute(
+                "UPDATE job_items SET status = 'pending', owner = NULL, lease_until = NULL, attempts = ?, "
+                "error = ?, updated_at = ? WHERE job_id = ? AND idx = ? AND owner = ?",
+                (attempts, error, time.time(), job_id, idx, self.owner)
+            ).rowcount == 1
+
+    def _finish_item(self, job_id: str, idx: int, status: str, result: Any = None, error: Optional[str] = None):
+        now = time.time()
+        with self._db_lock, self._conn:
+            finished = self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, owner = NULL, lease_until = NULL, "
+                "updated_at = ? WHERE job_id = ? AND idx = ? AND owner = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, job_id, idx, self.owner)
+            ).rowcount
+            if not finished:
+                # The lease lapsed and another process took the item over
+                logger.warning(f"Dropping result of {job_id}/{idx}: its lease was lost")
+                return
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            if not counts.get('pending') and not counts.get('running'):
+                job_status = 'completed_with_errors' if counts.get('failed') else 'completed'
+            else:
+                job_status = 'running'
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (job_status, now, job_id)
+            )
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
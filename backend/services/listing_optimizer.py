@@ -1,7 +1,44 @@
 from typing import Dict, List, Optional
 import os
+import re
 import google.generativeai as genai
-
+from services.gemini_service import bind_local_endpoint
+from services.job_queue import is_transient_error
+from services.metrics import instrument_upstream
+from services.tracing import trace_methods
+
+# Section headers requested by create_optimization_prompt, keyed by lowercase name
+SECTION_NAMES = {
+    name.lower(): name
+    for name in (
+        'Title',
+        'Short Description',
+        'Description',
+        'Unique Selling Points',
+        'Key Features',
+        'Specifications',
+        'Item Specifics',
+        'Tags',
+        'Additional Attributes',
+        'Tone and Style',
+    )
+}
+TEXT, BULLETS, PAIRS = 'text', 'bullets', 'pairs'
+SECTION_MODES = {
+    'Unique Selling Points': BULLETS,
+    'Key Features': BULLETS,
+    'Specifications': BULLETS,
+    'Tags': BULLETS,
+    'Item Specifics': PAIRS,
+    'Additional Attributes': PAIRS,
+}
+
+MAX_HEADER_LENGTH = max(len(name) for name in SECTION_NAMES) + 12
+HEADER_MARKUP = '#*_ \t'
+BULLET_CHARS = '-*\u2022'
+NUMBERED_BULLET_RE = re.compile(r'\d{1,3}[.)]\s*')
+
+@trace_methods
 class ListingOptimizer:
     def __init__(self):
         # Configure the Gemini API
@@ -106,13 +143,15 @@ Tone and Style:
             prompt = self.create_optimization_prompt(product_data, top_listing)
             
             # Get Gemini completion
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    candidate_count=1,
+            bind_local_endpoint(self.model)
+            with instrument_upstream('gemini', 'optimize_listing'):
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.7,
+                        candidate_count=1,
+                    )
                 )
-            )
             
             # Parse the response
             optimized_content = response.text
@@ -129,39 +168,59 @@ Tone and Style:
             print(f"Error optimizing listing: {str(e)}")
             return {
                 "success": False,
-                "error": str(e)
+                "error": str(e),
+                "retryable": is_transient_error(e)
             }
     
     def parse_optimization_response(self, response: str) -> Dict:
         """
-        Parse the Gemini response into structured sections
+        Parse the Gemini response into structured sections in a single pass
+
+        Only the section headers requested in `create_optimization_prompt` start a
+        new section, so description lines ending in ':' stay in their section.
+        Bullet sections become lists and "Attribute: Value" sections become dicts.
         """
+        bodies = {}
+        body = None
+
+        for line in response.splitlines():
+            # Header check: a known section name before an early colon
+            colon = line.find(':', 0, MAX_HEADER_LENGTH)
+            if colon > 0:
+                header = SECTION_NAMES.get(line[:colon].strip(HEADER_MARKUP).lower())
+                if header:
+                    body = bodies[header] = [line[colon + 1:].strip(HEADER_MARKUP)]
+                    continue
+            if body is not None:
+                body.append(line)
+
         sections = {}
-        current_section = None
-        current_content = []
-        
-        for line in response.split('\n'):
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-                
-            # Check if this is a section header
-            if line.endswith(':'):
-                # Save previous section
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                
-                # Start new section
-                current_section = line[:-1]  # Remove the colon
-                current_content = []
+        for name, body in bodies.items():
+            lines = [line for line in map(str.strip, body) if line]
+            mode = SECTION_MODES.get(name, TEXT)
+            if mode is BULLETS:
+                items = [item for item in map(_strip_bullet, lines) if item]
+                if name == 'Tags':
+                    items = [tag.strip() for item in items for tag in item.split(',') if tag.strip()]
+                sections[name] = items
+            elif mode is PAIRS:
+                sections[name] = {
+                    key.strip(HEADER_MARKUP): value.strip(HEADER_MARKUP)
+                    for key, sep, value in (line.partition(':') for line in map(_strip_bullet, lines))
+                    if sep and key.strip(HEADER_MARKUP)
+                }
             else:
-                # Add content to current section
-                current_content.append(line)
-        
-        # Save the last section
-        if current_section:
-            sections[current_section] = '\n'.join(current_content).strip()
-            
+                sections[name] = '\n'.join(lines)
+
         return sections
+
+
+def _strip_bullet(line: str) -> str:
+    """Remove a leading "-", "*", "\u2022" or "1." bullet marker"""
+    if line[0] in BULLET_CHARS and not line.startswith('**'):
+        return line[1:].lstrip()
+    if line[0].isdigit():
+        match = NUMBERED_BULLET_RE.match(line)
+        if match:
+            return line[match.end():]
+    return line
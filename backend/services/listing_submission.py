@@ -0,0 +1,537 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from services.job_queue import RateLimiter
+from services.local_store import connect
+from services.metrics import instrument_upstream
+from services.tracing import trace_methods
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS listing_drafts (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    batch_id TEXT,
+    data TEXT NOT NULL,
+    errors TEXT,
+    item_id TEXT,
+    fees TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listing_drafts_status ON listing_drafts (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_listing_drafts_batch ON listing_drafts (batch_id, status);
+'''
+
+# Trading AddItems takes at most this many listings per call
+MAX_ITEMS_PER_CALL = 5
+MAX_TITLE_LENGTH = 80
+# Trading error for a UUID that already created a listing
+DUPLICATE_UUID_ERROR = '488'
+
+# draft -> queued -> submitting -> listed | failed; invalid drafts are never submitted
+SUBMITTABLE_STATUSES = ('draft', 'failed')
+
+
+def validate_draft(draft: Dict) -> List[str]:
+    """
+    Problems that would make eBay reject the listing outright
+    """
+    errors = []
+    title = (draft.get('title') or '').strip()
+    if not title:
+        errors.append("Title is required")
+    elif len(title) > MAX_TITLE_LENGTH:
+        errors.append(f"Title is longer than {MAX_TITLE_LENGTH} characters")
+    if not str(draft.get('category_id') or '').strip():
+        errors.append("Category is required")
+    try:
+        if float(draft.get('price') or 0) <= 0:
+            errors.append("Price must be greater than zero")
+    except (TypeError, ValueError):
+        errors.append("Price must be a number")
+    try:
+        if int(draft.get('quantity', 1)) < 1:
+            errors.append("Quantity must be at least 1")
+    except (TypeError, ValueError):
+        errors.append("Quantity must be a whole number")
+    if not draft.get('condition_id'):
+        errors.append("Condition is required")
+    if not draft.get('pictures'):
+        errors.append("At least one picture is required")
+    return errors
+
+
+@trace_methods
+class ListingSubmitter:
+    """
+    Accumulates validated listing drafts in SQLite and submits them to eBay
+    with Trading AddItems, five listings per call and several calls at once.
+    Every draft keeps its own result, so a retry only resubmits the failures.
+
+    Workers sharing the database claim queued drafts with a conditional
+    UPDATE and hold them under a lease they renew while submitting; only
+    drafts whose lease expired are taken over. Each draft's UUID makes a
+    resubmission of an already created listing come back as a duplicate,
+    which is recorded as listed.
+    """
+    def __init__(
+        self,
+        db_file: str = 'listings.db',
+        concurrency: Optional[int] = None,
+        calls_per_minute: Optional[float] = None,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+        lease_seconds: float = 120.0
+    ):
+        self.concurrency = concurrency or int(os.getenv('LISTING_SUBMIT_CONCURRENCY', '4'))
+        self.rate_limiter = RateLimiter(calls_per_minute or float(os.getenv('LISTING_CALLS_PER_MINUTE', '120')))
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        use_sandbox = os.getenv('EBAY_USE_SANDBOX', 'True').lower() == 'true'
+        self.domain = os.getenv('EBAY_TRADING_DOMAIN', 'api.sandbox.ebay.com' if use_sandbox else 'api.ebay.com')
+        # A local mock Trading server is usually plain HTTP
+        self.https = os.getenv('EBAY_TRADING_HTTPS', 'True').lower() == 'true'
+
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._leases: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        Resume batches left unfinished by a process that stopped, then keep
+        renewing this worker's leases
+        """
+        batches = self._reclaim(time.time())
+        if batches:
+            logger.info(f"Resuming {len(batches)} listing batches")
+        if self._leases is None:
+            self._leases = asyncio.get_running_loop().create_task(self._renew_leases())
+
+    async def stop(self):
+        tasks = list(self._tasks.values()) + ([self._leases] if self._leases else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+        self._leases = None
+        # Let the next worker to check take over this one's drafts right away
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE listing_drafts SET lease_until = 0 WHERE status = 'submitting' AND owner = ?", (self.owner,)
+            )
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                now = time.time()
+                with self._lock, self._conn:
+                    self._conn.execute(
+                        "UPDATE listing_drafts SET lease_until = ? WHERE status = 'submitting' AND owner = ?",
+                        (now + self.lease_seconds, self.owner)
+                    )
+                self._reclaim(now - self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Error renewing listing leases: {str(e)}")
+
+    def _reclaim(self, queued_before: float) -> List[str]:
+        """
+        Requeue drafts whose submitting worker stopped renewing its lease, and
+        start every batch with drafts queued before `queued_before`. Another
+        worker may start the same batch; the claim in `_claim` lets only one
+        of them submit each draft
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            batches = {row[0] for row in self._conn.execute(
+                "SELECT DISTINCT batch_id FROM listing_drafts WHERE (status = 'queued' AND updated_at <= ?) "
+                "OR (status = 'submitting' AND (lease_until IS NULL OR lease_until < ?))",
+                (queued_before, now)
+            ).fetchall()}
+            self._conn.execute(
+                "UPDATE listing_drafts SET status = 'queued', owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = 'submitting' AND (lease_until IS NULL OR lease_until < ?)",
+                (now, now)
+            )
+        batches = [batch_id for batch_id in batches if batch_id not in self._tasks]
+        for batch_id in batches:
+            self._start_batch(batch_id)
+        return batches
+
+    def add_drafts(self, drafts: List[Dict]) -> List[Dict]:
+        """
+        Validate and store drafts; returns each draft's id, status and errors
+        """
+        now = time.time()
+        records = []
+        for draft in drafts:
+            errors = validate_draft(draft)
+            records.append({
+                'id': uuid.uuid4().hex,
+                'status': 'invalid' if errors else 'draft',
+                'errors': errors
+            })
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO listing_drafts (id, status, data, errors, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (record['id'], record['status'], json.dumps(draft), json.dumps(record['errors']), now, now)
+                    for record, draft in zip(records, drafts)
+                ]
+            )
+        return records
+
+    def update_draft(self, draft_id: str, changes: Dict) -> Optional[Dict]:
+        """
+        Edit a draft that hasn't been listed yet and validate it again
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT * FROM listing_drafts WHERE id = ?", (draft_id,)).fetchone()
+            if not row or row['status'] not in ('draft', 'invalid', 'failed'):
+                return None
+            data = {**json.loads(row['data']), **changes}
+            errors = validate_draft(data)
+            self._conn.execute(
+                "UPDATE listing_drafts SET data = ?, status = ?, errors = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(data), 'invalid' if errors else 'draft', json.dumps(errors), time.time(), draft_id)
+            )
+        return self.get_draft(draft_id)
+
+    def submit(self, draft_ids: Optional[List[str]] = None) -> Dict:
+        """
+        Queue drafts for listing as one batch; with no ids, every draft and
+        every previously failed listing is submitted
+        """
+        batch_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            query = f"UPDATE listing_drafts SET status = 'queued', batch_id = ?, updated_at = ? " \
+                    f"WHERE status IN ({', '.join('?' for _ in SUBMITTABLE_STATUSES)})"
+            params: list = [batch_id, time.time(), *SUBMITTABLE_STATUSES]
+            if draft_ids is not None:
+                query += f" AND id IN ({', '.join('?' for _ in draft_ids)})"
+                params.extend(draft_ids)
+            queued = self._conn.execute(query, params).rowcount
+
+        if queued:
+            self._start_batch(batch_id)
+        return {'batch_id': batch_id, 'queued': queued}
+
+    def retry_failed(self, batch_id: str) -> Dict:
+        """
+        Resubmit only the listings of a batch that failed
+        """
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM listing_drafts WHERE batch_id = ? AND status = 'failed'", (batch_id,)
+            ).fetchall()]
+        if not ids:
+            return {'batch_id': None, 'queued': 0}
+        return self.submit(ids)
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """
+        Progress of a batch with each listing's result
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM listing_drafts WHERE batch_id = ? ORDER BY created_at", (batch_id,)
+            ).fetchall()
+        if not rows:
+            return None
+        items = [self._row_to_draft(row, include_data=False) for row in rows]
+        counts: Dict[str, int] = {}
+        for item in items:
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        in_progress = counts.get('queued', 0) + counts.get('submitting', 0)
+        return {
+            'batch_id': batch_id,
+            'status': 'running' if in_progress else ('completed_with_errors' if counts.get('failed') else 'completed'),
+            'total': len(items),
+            'listed': counts.get('listed', 0),
+            'failed': counts.get('failed', 0),
+            'pending': in_progress,
+            'items': items
+        }
+
+    def get_draft(self, draft_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM listing_drafts WHERE id = ?", (draft_id,)).fetchone()
+        return self._row_to_draft(row) if row else None
+
+    def list_drafts(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        query = "SELECT * FROM listing_drafts"
+        params: list = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_draft(row) for row in rows]
+
+    def _row_to_draft(self, row, include_data: bool = True) -> Dict:
+        draft = {
+            'id': row['id'],
+            'status': row['status'],
+            'batch_id': row['batch_id'],
+            'errors': json.loads(row['errors'] or '[]'),
+            'item_id': row['item_id'],
+            'fees': json.loads(row['fees']) if row['fees'] else None,
+            'attempts': row['attempts'],
+            'updated_at': row['updated_at']
+        }
+        if include_data:
+            draft['data'] = json.loads(row['data'])
+        return draft
+
+    def _start_batch(self, batch_id: str):
+        if batch_id not in self._tasks:
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch_id))
+            self._tasks[batch_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+
+    async def _run_batch(self, batch_id: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data, attempts FROM listing_drafts WHERE batch_id = ? AND status = 'queued' "
+                "ORDER BY created_at", (batch_id,)
+            ).fetchall()
+        drafts = [(row['id'], json.loads(row['data']), row['attempts']) for row in rows]
+        chunks = [drafts[i:i + MAX_ITEMS_PER_CALL] for i in range(0, len(drafts), MAX_ITEMS_PER_CALL)]
+        await asyncio.gather(*(self._submit_chunk(chunk) for chunk in chunks))
+
+    async def _submit_chunk(self, chunk: List[tuple]):
+        async with self._semaphore:
+            chunk = self._claim(chunk)
+        if not chunk:
+            return
+        ids = [draft_id for draft_id, _, _ in chunk]
+        attempts = max(attempts for _, _, attempts in chunk)
+        while True:
+            attempts += 1
+            self._set_attempts(ids, attempts)
+            async with self._semaphore:
+                await self.rate_limiter.acquire()
+                try:
+                    containers = await asyncio.to_thread(self._add_items, chunk)
+                except Exception as e:
+                    # The call itself failed (network, throttling): the whole chunk is retried.
+                    # Listings it did create come back as duplicate UUIDs
+                    if attempts < self.max_attempts:
+                        logger.warning(f"AddItems failed, retrying: {str(e)}")
+                        error = None
+                    else:
+                        error = str(e)
+                else:
+                    self._record_results(ids, containers)
+                    return
+            if error:
+                self._fail(ids, [error])
+                return
+            await asyncio.sleep(self.retry_delay * (2 ** (attempts - 1)))
+
+    def _claim(self, chunk: List[tuple]) -> List[tuple]:
+        """
+        Take the chunk's still-queued drafts for this worker; returns those it got
+        """
+        ids = [draft_id for draft_id, _, _ in chunk]
+        now = time.time()
+        placeholders = ', '.join('?' for _ in ids)
+        with self._lock, self._conn:
+            # Atomic across workers sharing the database: a draft goes to one of them
+            self._conn.execute(
+                f"UPDATE listing_drafts SET status = 'submitting', owner = ?, lease_until = ?, updated_at = ? "
+                f"WHERE status = 'queued' AND id IN ({placeholders})",
+                (self.owner, now + self.lease_seconds, now, *ids)
+            )
+            claimed = {row[0] for row in self._conn.execute(
+                f"SELECT id FROM listing_drafts WHERE status = 'submitting' AND owner = ? AND id IN ({placeholders})",
+                (self.owner, *ids)
+            ).fetchall()}
+        return [draft for draft in chunk if draft[0] in claimed]
+
+    def _add_items(self, chunk: List[tuple]) -> List[Dict]:
+        from ebaysdk.trading import Connection as Trading
+
+        # ebaysdk connections keep per-call state, so each call gets its own
+        api = Trading(
+            domain=self.domain,
+            appid=os.getenv('EBAY_APP_ID'),
+            devid=os.getenv('EBAY_DEV_ID'),
+            certid=os.getenv('EBAY_CERT_ID'),
+            token=os.getenv('EBAY_AUTH_TOKEN'),
+            config_file=None,
+            errors=False
+        )
+        api.config.set('https', self.https, force=True)
+        with instrument_upstream('ebay_trading', 'AddItems'):
+            response = api.execute('AddItems', {
+                'AddItemRequestContainer': [
+                    {'MessageID': draft_id, 'Item': self._build_item(draft_id, data)}
+                    for draft_id, data, _ in chunk
+                ]
+            })
+        containers = response.dict().get('AddItemResponseContainer') or []
+        if isinstance(containers, dict):
+            containers = [containers]
+        if not containers:
+            raise RuntimeError(f"AddItems returned no results: {response.dict().get('Errors')}")
+        return containers
+
+    def _build_item(self, draft_id: str, data: Dict) -> Dict:
+        item = {
+            'Title': data['title'].strip(),
+            'Description': data.get('html') or data.get('description') or data['title'],
+            'PrimaryCategory': {'CategoryID': str(data['category_id'])},
+            'StartPrice': str(data['price']),
+            'Quantity': str(data.get('quantity', 1)),
+            'ConditionID': str(data['condition_id']),
+            'ListingType': 'FixedPriceItem',
+            'ListingDuration': data.get('duration') or 'GTC',
+            'Country': data.get('country') or os.getenv('EBAY_COUNTRY', 'US'),
+            'Currency': data.get('currency') or os.getenv('EBAY_CURRENCY', 'USD'),
+            'PostalCode': data.get('postal_code') or os.getenv('EBAY_POSTAL_CODE', ''),
+            'DispatchTimeMax': str(data.get('dispatch_time_max', 3)),
+            'PictureDetails': {'PictureURL': data['pictures']},
+            # Lets eBay reject a duplicate if a timed-out call did list the item
+            'UUID': draft_id.upper()
+        }
+        if data.get('condition_description'):
+            item['ConditionDescription'] = data['condition_description']
+        if data.get('item_specifics'):
+            item['ItemSpecifics'] = {'NameValueList': [
+                {'Name': name, 'Value': value} for name, value in data['item_specifics'].items() if value
+            ]}
+
+        profiles = {
+            'SellerShippingProfile': ('ShippingProfileID', data.get('shipping_profile_id') or os.getenv('EBAY_SHIPPING_PROFILE_ID')),
+            'SellerReturnProfile': ('ReturnProfileID', data.get('return_profile_id') or os.getenv('EBAY_RETURN_PROFILE_ID')),
+            'SellerPaymentProfile': ('PaymentProfileID', data.get('payment_profile_id') or os.getenv('EBAY_PAYMENT_PROFILE_ID')),
+        }
+        seller_profiles = {name: {key: value} for name, (key, value) in profiles.items() if value}
+        if seller_profiles:
+            item['SellerProfiles'] = seller_profiles
+        return item
+
+    def _record_results(self, ids: List[str], containers: List[Dict]):
+        by_id = {str(container.get('CorrelationID')): container for container in containers}
+        now = time.time()
+        with self._lock, self._conn:
+            for draft_id in ids:
+                container = by_id.get(draft_id)
+                fees = None
+                if container is None:
+                    status, item_id, errors = 'failed', None, ["No result returned for this listing"]
+                elif container.get('ItemID'):
+                    status, item_id, errors = 'listed', container['ItemID'], self._errors(container)
+                    fees = self._fees(container)
+                elif self._is_duplicate(container):
+                    # An earlier call that timed out or was retried already created this listing
+                    status, item_id = 'listed', self._duplicate_item_id(container)
+                    errors = [] if item_id else ["Already listed by an earlier submission; item id not returned"]
+                else:
+                    status, item_id, errors = 'failed', None, self._errors(container)
+                self._conn.execute(
+                    "UPDATE listing_drafts SET status = ?, item_id = ?, errors = ?, fees = ?, owner = NULL, "
+                    "lease_until = NULL, updated_at = ? WHERE id = ?",
+                    (status, item_id, json.dumps(errors), json.dumps(fees) if fees else None, now, draft_id)
+                )
+
+    def _error_list(self, container: Dict) -> List[Dict]:
+        errors = container.get('Errors') or []
+        return [errors] if isinstance(errors, dict) else errors
+
+    def _errors(self, container: Dict) -> List[str]:
+        return [
+            f"{error.get('SeverityCode', 'Error')}: {error.get('LongMessage') or error.get('ShortMessage', '')}"
+            for error in self._error_list(container)
+        ]
+
+    def _is_duplicate(self, container: Dict) -> bool:
+        return bool(container.get('DuplicateInvocationDetails')) or any(
+            str(error.get('ErrorCode')) == DUPLICATE_UUID_ERROR for error in self._error_list(container)
+        )
+
+    def _duplicate_item_id(self, container: Dict) -> Optional[str]:
+        """
+        ItemID of the listing a duplicate UUID already created: eBay returns it
+        as the invocation tracking id, or as a numeric error parameter
+        """
+        details = container.get('DuplicateInvocationDetails') or {}
+        if details.get('InvocationTrackingID'):
+            return str(details['InvocationTrackingID'])
+        for error in self._error_list(container):
+            if str(error.get('ErrorCode')) != DUPLICATE_UUID_ERROR:
+                continue
+            parameters = error.get('ErrorParameters') or []
+            if isinstance(parameters, dict):
+                parameters = [parameters]
+            for parameter in parameters:
+                value = str(parameter.get('Value') or '')
+                if value.isdigit():
+                    return value
+        return None
+
+    def _fees(self, container: Dict) -> Dict[str, Any]:
+        fees = (container.get('Fees') or {}).get('Fee') or []
+        if isinstance(fees, dict):
+            fees = [fees]
+        return {
+            fee['Name']: fee.get('Fee', {}).get('value')
+            for fee in fees if fee.get('Name') and float(fee.get('Fee', {}).get('value') or 0) > 0
+        }
+
+    def _set_attempts(self, ids: List[str], attempts: int):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE listing_drafts SET attempts = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                [(attempts, time.time(), draft_id, self.owner) for draft_id in ids]
+            )
+
+    def _fail(self, ids: List[str], errors: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE listing_drafts SET status = 'failed', errors = ?, owner = NULL, lease_until = NULL, "
+                "updated_at = ? WHERE id = ?",
+                [(json.dumps(errors), time.time(), draft_id) for draft_id in ids]
+            )
+
+
+_submitter: Optional[ListingSubmitter] = None
+_submitter_lock = threading.Lock()
+
+
+def get_listing_submitter() -> ListingSubmitter:
+    """
+    The process-wide listing submitter
+    """
+    global _submitter
+    if _submitter is None:
+        with _submitter_lock:
+            if _submitter is None:
+                _submitter = ListingSubmitter()
+    return _submitter
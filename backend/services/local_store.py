@@ -0,0 +1,32 @@
+import os
+import sqlite3
+from typing import Optional
+
+
+def data_dir() -> str:
+    """
+    Directory for locally persisted state (job queues, caches, catalogs)
+    """
+    path = os.getenv('AIMAGIC_DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_path(filename: str) -> str:
+    """
+    Absolute path of a file inside the local data directory
+    """
+    return os.path.join(data_dir(), filename)
+
+
+def connect(filename: str, path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open a SQLite database in the data directory tuned for concurrent
+    readers and a single writer
+    """
+    conn = sqlite3.connect(path or data_path(filename), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds; resolves sub-millisecond jitter up to multi-second stalls
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LOOP_LAG = REGISTRY.histogram(
+    'event_loop_lag_seconds', 'Delay of the event-loop heartbeat past its scheduled time', buckets=LAG_BUCKETS)
+LOOP_BLOCKS = REGISTRY.counter(
+    'event_loop_blocks_total', 'Callbacks that held the event loop past the block threshold, by code site',
+    ('site',))
+LOOP_BLOCK_DURATION = REGISTRY.histogram(
+    'event_loop_block_duration_seconds', 'How long the event loop stayed blocked', buckets=LAG_BUCKETS)
+
+
+def blocking_site(frame) -> str:
+    """
+    The innermost frame in this codebase, e.g. "services/ebay_service.py:get_category_aspects",
+    so the metric label points at our call rather than the library that blocked
+    """
+    leaf = frame
+    while frame is not None:
+        # Frozen and generated code ("<frozen importlib._bootstrap>") has no real path
+        filename = frame.f_code.co_filename
+        if not filename.startswith('<'):
+            filename = os.path.abspath(filename)
+        if filename.startswith(BACKEND_DIR + os.sep) and filename != os.path.abspath(__file__) \
+                and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, BACKEND_DIR)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return f"{os.path.basename(leaf.f_code.co_filename)}:{leaf.f_code.co_name}"
+
+
+class LoopWatchdog:
+    """
+    Detects blocking calls on the event loop. A heartbeat coroutine ticks
+    every `interval` seconds and records how late each tick ran; a watcher
+    thread notices when the heartbeat stops for longer than `threshold` and
+    logs the loop thread's stack at that moment, which is the blocking call.
+    """
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, history: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.recent: Deque[Dict] = deque(maxlen=history)
+
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._blocked: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start watching the running loop"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread is not None:
+            # The watcher wakes every half interval, so this is short
+            self._thread.join(self.interval * 4)
+
+    async def _heartbeat(self):
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - scheduled - self.interval)
+            self._beat = now
+            LOOP_LAG.observe(value=lag)
+
+            blocked, self._blocked = self._blocked, None
+            if blocked is not None:
+                blocked['duration_ms'] = round(lag * 1000, 1)
+                LOOP_BLOCK_DURATION.observe(value=lag)
+                logger.warning(f"Event loop was blocked for {blocked['duration_ms']} ms in {blocked['site']}")
+
+    def _watch(self):
+        while not self._stopping.wait(self.interval / 2):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled < self.threshold or self._blocked is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            site = blocking_site(frame)
+            stack = ''.join(traceback.format_stack(frame))
+            del frame
+            self._blocked = {'site': site, 'detected_at': time.time(), 'duration_ms': None, 'stack': stack}
+            self.recent.append(self._blocked)
+            LOOP_BLOCKS.inc(site)
+            logger.warning(f"Event loop blocked for over {stalled * 1000:.0f} ms in {site}:\n{stack}")
+
+    def recent_blocks(self) -> List[Dict]:
+        """Latest blocks, newest first"""
+        return list(reversed(self.recent))
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog() -> Optional[LoopWatchdog]:
+    """
+    Start the watchdog on the running loop unless LOOP_WATCHDOG=false.
+    LOOP_BLOCK_THRESHOLD_MS sets how long a callback may hold the loop
+    """
+    global _watchdog
+    if os.getenv('LOOP_WATCHDOG', 'true').lower() == 'false':
+        return None
+    _watchdog = LoopWatchdog(threshold=float(os.getenv('LOOP_BLOCK_THRESHOLD_MS', '100')) / 1000)
+    _watchdog.start()
+    return _watchdog
+
+
+def get_loop_watchdog() -> Optional[LoopWatchdog]:
+    return _watchdog
+
+
+async def stop_loop_watchdog():
+    global _watchdog
+    watchdog, _watchdog = _watchdog, None
+    if watchdog is not None:
+        await watchdog.stop()
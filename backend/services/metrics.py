@@ -0,0 +1,334 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.cache import cache_stats
+from services.tracing import span
+
+# Seconds; spans fast cache-backed routes up to slow Gemini and Trading calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base for a labelled metric family; values are kept per label tuple
+    """
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, *labels, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = self.header()
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metric families plus collectors that are only evaluated at scrape time
+    """
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labels: Tuple[str, ...], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        """
+        Add a function returning exposition lines, called on every scrape
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        for collector in collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total', 'HTTP requests by route, method and status code', ('route', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method'))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served, by route', ('route', 'method'))
+
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    'upstream_request_duration_seconds', 'Latency of calls to external services', ('upstream', 'operation'))
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    'upstream_requests_in_flight', 'Calls to external services currently outstanding', ('upstream',))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'upstream_errors_total', 'Failed calls to external services', ('upstream', 'operation'))
+
+
+def _collect_cache_metrics() -> List[str]:
+    stats = cache_stats()
+    lookups = ['# HELP cache_lookups_total Cache lookups by namespace and result',
+               '# TYPE cache_lookups_total counter']
+    evictions = ['# HELP cache_evictions_total Entries evicted from the in-process cache tier',
+                 '# TYPE cache_evictions_total counter']
+    ratios = ['# HELP cache_hit_ratio Share of lookups served from either cache tier',
+              '# TYPE cache_hit_ratio gauge']
+    for namespace, values in stats.items():
+        ns = _escape(namespace)
+        for result in ('hits', 'shared_hits', 'misses'):
+            lookups.append(f'cache_lookups_total{{namespace="{ns}",result="{result}"}} {values[result]}')
+        evictions.append(f'cache_evictions_total{{namespace="{ns}"}} {values["evictions"]}')
+        ratios.append(f'cache_hit_ratio{{namespace="{ns}"}} {values["hit_ratio"]}')
+    return lookups + evictions + ratios
+
+
+REGISTRY.register_collector(_collect_cache_metrics)
+
+
+class UpstreamCall:
+    """
+    Times one call to an external service, also as a trace span. Exceptions
+    count as errors; calls that report failure in their result can use mark_error()
+    """
+    __slots__ = ('upstream', 'operation', 'failed', '_started', '_span')
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+        self.failed = False
+
+    def mark_error(self):
+        self.failed = True
+        self._span.set_attribute('error', True)
+
+    def __enter__(self):
+        UPSTREAM_IN_FLIGHT.inc(self.upstream)
+        self._span = span(f"{self.upstream}.{self.operation}", upstream=self.upstream).__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.__exit__(exc_type, exc, tb)
+        UPSTREAM_LATENCY.observe(self.upstream, self.operation, value=time.perf_counter() - self._started)
+        UPSTREAM_IN_FLIGHT.dec(self.upstream)
+        if exc_type is not None or self.failed:
+            UPSTREAM_ERRORS.inc(self.upstream, self.operation)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def instrument_upstream(upstream: str, operation: Optional[str] = None):
+    """
+    Record latency, in-flight count and errors of calls to an external service.
+
+    Use as a decorator on sync or async functions (the operation defaults to
+    the function name), or as a context manager around a single call.
+    """
+    if operation is not None:
+        return UpstreamCall(upstream, operation)
+
+    def decorator(func):
+        name = func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with UpstreamCall(upstream, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with UpstreamCall(upstream, name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def _flatten_routes(routes) -> List:
+    flat = []
+    for route in routes:
+        # Newer FastAPI keeps included routers as lazy wrappers around the original router
+        nested = getattr(route, 'original_router', None)
+        flat.extend(_flatten_routes(nested.routes) if nested is not None else [route])
+    return flat
+
+
+def route_template(scope, routes: List) -> str:
+    """
+    Path template of the route a request will reach. The router only sets
+    scope['route'] once it dispatches, so in-flight counting matches the
+    app's routes up front the same way
+    """
+    from starlette.routing import Match
+
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', 'unmatched')
+        if match == Match.PARTIAL and partial is None:
+            # Right path, wrong method: the router answers 405 from this route
+            partial = getattr(route, 'path', None)
+    return partial or 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route request counts, latency and
+    requests in flight. Routes are labelled by their path template so ids
+    don't explode cardinality
+    """
+    def __init__(self, app):
+        self.app = app
+        self._routes: List = []
+        self._routes_of: Optional[Tuple] = None
+
+    def _app_routes(self, scope) -> List:
+        routes = getattr(getattr(scope.get('app'), 'router', None), 'routes', [])
+        # Rebuilt only when routes are added
+        if self._routes_of != (id(routes), len(routes)):
+            self._routes = _flatten_routes(routes)
+            self._routes_of = (id(routes), len(routes))
+        return self._routes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        in_flight_route = route_template(scope, self._app_routes(scope))
+        HTTP_IN_FLIGHT.inc(in_flight_route, method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(in_flight_route, method)
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            HTTP_LATENCY.observe(path, method, value=time.perf_counter() - started)
+            HTTP_REQUESTS.inc(path, method, str(status))
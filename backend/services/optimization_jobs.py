@@ -0,0 +1,32 @@
+import os
+from typing import Any, Dict
+
+from services.job_queue import JobQueue, TransientJobError
+
+def create_optimization_queue() -> JobQueue:
+    """
+    Build the bulk listing optimization queue around the shared ListingOptimizer
+    """
+    # The optimizer and item fetcher are only built once a job item actually runs
+    from services.registry import get_item_fetcher, get_listing_optimizer
+
+    async def optimize_item(payload: Dict[str, Any]) -> Dict:
+        top_listing = {}
+        if payload.get('listing_id'):
+            # Lookups from concurrent workers share Browse getItems batches
+            top_listing = await get_item_fetcher().get_item(payload['listing_id']) or {}
+
+        result = await get_listing_optimizer().optimize_listing(payload.get('product_data', {}), top_listing)
+        if not result["success"]:
+            if result.get("retryable"):
+                raise TransientJobError(result["error"])
+            raise ValueError(result["error"])
+        return result["optimized_listing"]
+
+    return JobQueue(
+        'listing_optimization',
+        optimize_item,
+        concurrency=int(os.getenv('OPTIMIZER_CONCURRENCY', '4')),
+        requests_per_minute=float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60')),
+        max_attempts=int(os.getenv('OPTIMIZER_MAX_ATTEMPTS', '3'))
+    )
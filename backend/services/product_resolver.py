@@ -0,0 +1,250 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from services.tracing import trace_methods
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+BARCODE_RE = re.compile(r'\b\d{12,14}\b')
+POP_NUMBER_RE = re.compile(r'(?:#|\bno\.?\s*|\bnumber\s*)(\d{1,4})\b', re.IGNORECASE)
+MODEL_RE = re.compile(r'\b(?=[A-Z0-9-]*\d)(?=[A-Z0-9-]*[A-Z])[A-Z0-9][A-Z0-9-]{3,}\b')
+
+# Product fields that are indexed as text, with their weight in the score
+TEXT_FIELDS = {'title': 1.0, 'brand': 1.5, 'series': 2.0, 'character': 2.0, 'model': 2.0}
+# Weight of an exact identifier match (barcode, pop number, model number)
+CODE_WEIGHTS = {'upc': 100.0, 'ean': 100.0, 'pop': 6.0, 'model': 12.0}
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'of', 'in', 'on', 'for', 'with', 'pop', 'vinyl', 'figure', 'new'}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def extract_codes(text: str) -> Dict[str, Set[str]]:
+    """
+    Identifiers printed on packaging: barcodes, pop numbers and model numbers
+    """
+    return {
+        'barcode': set(BARCODE_RE.findall(text)),
+        'pop': {number.lstrip('0') or '0' for number in POP_NUMBER_RE.findall(text)},
+        'model': {model for model in MODEL_RE.findall(text.upper()) if not model.isdigit()},
+    }
+
+
+@trace_methods
+class ProductIndex:
+    """
+    In-memory inverted index over known products for resolving OCR text to
+    a product identity. Words are matched exactly and by character trigrams
+    (to survive OCR misreads), identifiers are matched exactly, and aspect
+    values (series, character names) of the product's category are
+    recognised as phrases.
+    """
+    def __init__(self):
+        self.products: List[Dict] = []
+        self._by_key: Dict[str, int] = {}
+        self._tokens: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._codes: Dict[tuple, Set[int]] = defaultdict(set)
+        # Posting keys per document, so re-adding a product touches only its own
+        self._doc_tokens: Dict[int, Set[str]] = defaultdict(set)
+        self._doc_codes: Dict[int, Set[tuple]] = defaultdict(set)
+        # category id -> phrase -> {aspect name: value}
+        self._aspect_values: Dict[str, Dict[str, Dict[str, str]]] = defaultdict(lambda: defaultdict(dict))
+        self._brands: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, product: Dict) -> Optional[int]:
+        """
+        Add or update a product; returns its document id
+        """
+        with self._lock:
+            return self._add(product)
+
+    def has_aspect_values(self, category_id: str) -> bool:
+        return category_id in self._aspect_values
+
+    def add_aspect_values(self, category_id: str, aspect_name: str, values: Iterable[str]):
+        """
+        Register known values of a category's aspect (e.g. Character, Franchise) as phrases
+        """
+        with self._lock:
+            phrases = self._aspect_values[category_id]
+            for value in values:
+                phrase = ' '.join(tokenize(value))
+                if phrase:
+                    phrases[phrase][aspect_name] = value
+
+    def _add(self, product: Dict) -> Optional[int]:
+        key = product.get('upc') or product.get('ean') or product.get('title', '').lower()
+        if not key:
+            return None
+        doc_id = self._by_key.get(key)
+        if doc_id is None:
+            doc_id = len(self.products)
+            self.products.append(product)
+            self._by_key[key] = doc_id
+        else:
+            self._remove_postings(doc_id)
+            self.products[doc_id] = product
+
+        for field, weight in TEXT_FIELDS.items():
+            for token in tokenize(str(product.get(field) or '')):
+                postings = self._tokens[token]
+                postings[doc_id] = max(postings.get(doc_id, 0.0), weight)
+                self._doc_tokens[doc_id].add(token)
+                if len(token) >= 4:
+                    for gram in trigrams(token):
+                        self._trigrams[gram].add(token)
+        brand = ' '.join(tokenize(str(product.get('brand') or '')))
+        if brand:
+            self._brands.add(brand)
+
+        keys = {('barcode', str(product[field]).lstrip('0')) for field in ('upc', 'ean') if product.get(field)}
+        codes = extract_codes(f"{product.get('title', '')} #{product.get('pop_number') or ''}")
+        keys |= {('pop', number) for number in codes['pop']}
+        keys |= {('model', model) for model in codes['model']}
+        if product.get('model'):
+            keys.add(('model', str(product['model']).upper()))
+        for key in keys:
+            self._codes[key].add(doc_id)
+        self._doc_codes[doc_id] = keys
+        return doc_id
+
+    def _remove_postings(self, doc_id: int):
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._tokens.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+        for key in self._doc_codes.pop(doc_id, ()):
+            self._codes[key].discard(doc_id)
+
+    def resolve(self, text: str, limit: int = 5, category_id: Optional[str] = None) -> Dict:
+        """
+        Rank indexed products against OCR text.
+        Returns the ranked candidates and the aspect values recognised for
+        `category_id` (by default the top candidate's category). These are
+        hints for the model, not values to list as-is
+        """
+        tokens = set(tokenize(text))
+        codes = extract_codes(text)
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, List[str]] = defaultdict(list)
+        total = max(len(self.products), 1)
+
+        with self._lock:
+            for kind, values in codes.items():
+                for value in values:
+                    key_value = value.lstrip('0') if kind == 'barcode' else value
+                    weight = CODE_WEIGHTS['upc' if kind == 'barcode' else kind]
+                    for doc_id in self._codes.get((kind, key_value), ()):
+                        scores[doc_id] += weight
+                        matched[doc_id].append(f"{kind}:{value}")
+
+            for token in tokens:
+                postings = self._tokens.get(token)
+                weight_factor = 1.0
+                if not postings and len(token) >= 4:
+                    # OCR misread: fall back to the closest indexed word by trigram overlap
+                    token, weight_factor = self._closest_token(token)
+                    postings = self._tokens.get(token) if token else None
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for doc_id, field_weight in postings.items():
+                    scores[doc_id] += idf * field_weight * weight_factor
+                    matched[doc_id].append(token)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            candidates = [
+                {
+                    'product': self.products[doc_id],
+                    'score': round(score, 3),
+                    'matched': matched[doc_id]
+                }
+                for doc_id, score in ranked
+            ]
+            if category_id is None and candidates:
+                category_id = candidates[0]['product'].get('category_id')
+            attributes = self._match_aspect_values(text, category_id) if category_id else {}
+
+        return {
+            'candidates': candidates,
+            'confidence': self._confidence(candidates),
+            'attributes': attributes,
+            'codes': {kind: sorted(values) for kind, values in codes.items() if values}
+        }
+
+    def _confidence(self, candidates: List[Dict]) -> float:
+        """
+        Share of the top product's title words seen in the text (1.0 on a
+        barcode match), scaled by its margin over the runner-up
+        """
+        if not candidates:
+            return 0.0
+        top = candidates[0]
+        if any(match.startswith('barcode:') for match in top['matched']):
+            coverage = 1.0
+        else:
+            title_tokens = set(tokenize(top['product'].get('title', '')))
+            coverage = len(title_tokens & set(top['matched'])) / len(title_tokens) if title_tokens else 0.0
+        runner_up = candidates[1]['score'] if len(candidates) > 1 else 0.0
+        return round(coverage * (1 - (runner_up / top['score']) ** 2), 3)
+
+    def _closest_token(self, token: str):
+        grams = trigrams(token)
+        overlap: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                overlap[candidate] += 1
+        if not overlap:
+            return None, 0.0
+        candidate, count = max(overlap.items(), key=lambda item: item[1])
+        similarity = count / len(grams | trigrams(candidate))
+        return (candidate, similarity) if similarity >= 0.4 else (None, 0.0)
+
+    def _match_aspect_values(self, text: str, category_id: str) -> Dict[str, str]:
+        phrases = self._aspect_values.get(category_id)
+        if not phrases:
+            return {}
+        words = tokenize(text)
+        attributes = {}
+        for size in (3, 2, 1):
+            for i in range(len(words) - size + 1):
+                phrase = ' '.join(words[i:i + size])
+                aspects = phrases.get(phrase)
+                if not aspects:
+                    continue
+                for aspect_name, value in aspects.items():
+                    # A lone common word ("Sharp", "Star") is only trusted as a brand the catalog knows
+                    if size == 1 and not (aspect_name == 'Brand' and phrase in self._brands):
+                        continue
+                    attributes.setdefault(aspect_name, value)
+        return attributes
+
+
+_index: Optional[ProductIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_product_index() -> ProductIndex:
+    """
+    The process-wide product index, built from the local catalog on first use
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from services.catalog_service import get_catalog
+                index = ProductIndex()
+                for product in get_catalog().all_products():
+                    index.add(product)
+                _index = index
+    return _index
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Longest profile an admin can request, so a stray call can't leave the sampler running
+MAX_PROFILE_SECONDS = 120.0
+# Where an idle event-loop thread sits: the selector, or (uvloop, whose loop is
+# native code) the frame that started the loop. Samples elsewhere mean it is busy
+IDLE_FRAMES = {('selectors.py', 'select'), ('selectors.py', '_select'), ('runners.py', 'run')}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def _collapse(frame) -> List[str]:
+    """Root-first frame labels of a thread's stack"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _await_chain(coro) -> List:
+    """Frames of a suspended coroutine and everything it is awaiting, outermost first"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None) or getattr(coro, 'ag_frame', None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None) or getattr(coro, 'ag_await', None)
+    return frames
+
+
+def task_route(frames: List) -> Optional[str]:
+    """
+    The route a request task is serving: the router records the matched
+    route in the ASGI scope, which the middleware frames hold as a local
+    """
+    for frame in frames:
+        scope = frame.f_locals.get('scope')
+        if isinstance(scope, dict) and scope.get('type') == 'http':
+            route = scope.get('route')
+            if route is not None and getattr(route, 'path', None):
+                return f"{scope.get('method', '')} {route.path}"
+            return f"{scope.get('method', '')} unmatched"
+    return None
+
+
+def executor_depth(loop: asyncio.AbstractEventLoop) -> Dict[str, int]:
+    """
+    Backlog of the loop's default executor, where asyncio.to_thread sends
+    blocking work such as ebaysdk Trading and Finding calls. Safe to call
+    from any thread
+    """
+    executor = getattr(loop, '_default_executor', None)
+    if executor is None:
+        return {'default_queued': 0, 'default_threads': 0}
+    return {'default_queued': executor._work_queue.qsize(), 'default_threads': len(executor._threads)}
+
+
+def threadpool_depth() -> Dict[str, int]:
+    """
+    Usage of AnyIO's thread pool, which runs sync routes and dependencies.
+    Must be called on the event loop
+    """
+    from anyio import to_thread
+    stats = to_thread.current_default_thread_limiter().statistics()
+    return {'anyio_busy': stats.borrowed_tokens, 'anyio_waiting': stats.tasks_waiting}
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {'samples': 0}
+    ordered = sorted(values)
+    return {
+        'samples': len(ordered),
+        'mean': round(statistics.fmean(ordered), 3),
+        'p50': round(ordered[len(ordered) // 2], 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3)
+    }
+
+
+class SamplingProfiler:
+    """
+    Time-bounded profile of the running worker. A background thread samples
+    every thread's stack into collapsed (flamegraph) stacks and the executor
+    backlog; a coroutine on the event loop measures its scheduling lag and
+    which routes' tasks are alive and what they are awaiting.
+    """
+    def __init__(self, duration: float, interval: float = 0.005, task_interval: float = 0.05):
+        self.duration = min(duration, MAX_PROFILE_SECONDS)
+        self.interval = interval
+        self.task_interval = max(task_interval, interval)
+
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.loop_busy_samples = 0
+        self.lag_ms: List[float] = []
+        self.task_samples = 0
+        self.route_tasks: Counter = Counter()
+        self.route_awaiting: Dict[str, Counter] = {}
+        self.executor_samples: Dict[str, List[int]] = {}
+
+    async def run(self) -> Dict:
+        """Profile for the configured duration and return the report"""
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        done = loop.create_future()
+        deadline = time.monotonic() + self.duration
+
+        def finished():
+            if not done.done():
+                done.set_result(None)
+
+        sampler = threading.Thread(
+            target=self._sample_threads, args=(loop, loop_thread, deadline, finished),
+            name='profiler-sampler', daemon=True
+        )
+        started = time.perf_counter()
+        sampler.start()
+        await self._watch_loop(deadline)
+        await done
+        return self.report(time.perf_counter() - started)
+
+    def _sample_threads(self, loop, loop_thread: int, deadline: float, finished):
+        own = threading.get_ident()
+        try:
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    labels = _collapse(frame)
+                    if ident == loop_thread:
+                        root = 'event-loop'
+                        code = frame.f_code
+                        if (os.path.basename(code.co_filename), code.co_name) not in IDLE_FRAMES:
+                            self.loop_busy_samples += 1
+                    else:
+                        root = names.get(ident, f"thread-{ident}")
+                    self.stacks[';'.join([root] + labels)] += 1
+                self.samples += 1
+                for key, value in executor_depth(loop).items():
+                    self.executor_samples.setdefault(key, []).append(value)
+                time.sleep(self.interval)
+        finally:
+            loop.call_soon_threadsafe(finished)
+
+    async def _watch_loop(self, deadline: float):
+        current = asyncio.current_task()
+        next_task_sample = 0.0
+        while time.monotonic() < deadline:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag_ms.append(max(0.0, (time.perf_counter() - scheduled - self.interval) * 1000))
+
+            if time.monotonic() >= next_task_sample:
+                next_task_sample = time.monotonic() + self.task_interval
+                self._sample_tasks(current)
+
+    def _sample_tasks(self, current: asyncio.Task):
+        self.task_samples += 1
+        for key, value in threadpool_depth().items():
+            self.executor_samples.setdefault(key, []).append(value)
+        for task in asyncio.all_tasks():
+            if task is current or task.done():
+                continue
+            frames = _await_chain(task.get_coro())
+            route = task_route(frames)
+            if route is None:
+                coro = task.get_coro()
+                route = f"task {getattr(coro, '__qualname__', type(coro).__name__)}"
+            self.route_tasks[route] += 1
+            if frames:
+                self.route_awaiting.setdefault(route, Counter())[_frame_label(frames[-1])] += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the folded format read by flamegraph.pl, speedscope and inferno"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def report(self, elapsed: float) -> Dict:
+        tasks = {}
+        for route, count in self.route_tasks.most_common():
+            tasks[route] = {
+                'mean_tasks': round(count / max(self.task_samples, 1), 2),
+                'awaiting': dict(self.route_awaiting.get(route, Counter()).most_common(5))
+            }
+        return {
+            'duration_seconds': round(elapsed, 3),
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'loop_busy_ratio': round(self.loop_busy_samples / self.samples, 3) if self.samples else 0.0,
+            'loop_lag_ms': _summary(self.lag_ms),
+            'tasks': tasks,
+            'executor': {key: {'mean': round(statistics.fmean(values), 2), 'max': max(values)}
+                         for key, values in self.executor_samples.items()},
+            'collapsed': self.collapsed()
+        }
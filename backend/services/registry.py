@@ -0,0 +1,126 @@
+"""
+Process-wide service registry.
+
+Services are built once, on first use, instead of at router import time.
+Modules that pull in heavy client libraries (google-generativeai,
+google-cloud-vision, ebaysdk) are only imported by the factories below, so a
+worker that never serves a route needing them never loads them.
+"""
+import functools
+import logging
+import threading
+from typing import Any, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_instances: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def service(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Turn a factory into a getter that builds its service once, on first call
+    """
+    name = factory.__name__
+
+    @functools.wraps(factory)
+    def getter() -> T:
+        instance = _instances.get(name)
+        if instance is None:
+            with _lock:
+                instance = _instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    _instances[name] = instance
+                    logger.debug(f"Built service {name}")
+        return instance
+
+    return getter
+
+
+def built_services() -> Dict[str, Any]:
+    """
+    Services constructed so far, by getter name
+    """
+    return dict(_instances)
+
+
+def close_services():
+    """
+    Release resources held by the services that were built
+    """
+    for name, instance in built_services().items():
+        close = getattr(instance, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.error(f"Error closing {name}: {str(e)}")
+
+
+@service
+def get_ebay_service():
+    from services.ebay_service import EbayService
+    return EbayService()
+
+
+@service
+def get_item_fetcher():
+    from services.bulk_item_fetcher import BulkItemFetcher
+    return BulkItemFetcher()
+
+
+@service
+def get_ebay_listing_service():
+    from services.ebay_listing_service import EbayListingService
+    return EbayListingService()
+
+
+@service
+def get_gemini_service():
+    from services.gemini_service import GeminiService
+    return GeminiService()
+
+
+@service
+def get_listing_optimizer():
+    from services.listing_optimizer import ListingOptimizer
+    return ListingOptimizer()
+
+
+@service
+def get_vision_service():
+    from services.vision_service import VisionService
+    return VisionService()
+
+
+@service
+def get_template_service():
+    from services.template_service import TemplateService
+    return TemplateService()
+
+
+@service
+def get_upc_service():
+    from services.upc_lookup import UPCLookupService
+    return UPCLookupService()
+
+
+@service
+def get_optimization_jobs():
+    from services.optimization_jobs import create_optimization_queue
+    return create_optimization_queue()
+
+
+@service
+def get_research_jobs():
+    from services.research_jobs import create_research_queue
+    return create_research_queue()
+
+
+@service
+def get_sell_similar_pipeline():
+    from services.sell_similar import SellSimilarPipeline
+    return SellSimilarPipeline(get_ebay_listing_service(), get_gemini_service(), get_template_service())
@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from services.comps_store import get_comps_store, seconds_until_utc_midnight
+from services.job_queue import JobQueue, RateLimiter, TransientJobError, is_transient_error
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_API = 'ebay_analytics'
+# fetch_terapeak_data makes one Marketplace Insights call; its Browse search
+# counts against the Browse limit instead
+ANALYTICS_CALLS_PER_ITEM = 1
+TERAPEAK_DAY_WINDOWS = (30, 90, 365)
+# Ad-hoc research submitted at the default priority 0 runs ahead of the nightly refresh
+NIGHTLY_PRIORITY = -10
+NIGHTLY_RUN = 'nightly_comps'
+
+
+def analytics_daily_limit() -> int:
+    return int(os.getenv('ANALYTICS_DAILY_CALL_LIMIT', '5000'))
+
+
+def research_items(upcs: List[str], keywords: List[str], days: List[int],
+                   category_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    One job item per query and day window, UPCs first
+    """
+    queries = [(upc.strip(), 'upc') for upc in upcs if upc.strip()] + \
+        [(keyword.strip(), 'keywords') for keyword in keywords if keyword.strip()]
+    items = []
+    for query, query_type in dict.fromkeys(queries):
+        for window in sorted(set(days)):
+            item = {'query': query, 'query_type': query_type, 'days': window}
+            if category_id:
+                item['category_id'] = category_id
+            items.append(item)
+    return items
+
+
+def create_research_queue() -> JobQueue:
+    """
+    Build the Terapeak research queue. Items are spaced out per minute and
+    counted against the Analytics daily call limit, shared by all workers;
+    once it is used up, items wait for the next UTC day
+    """
+    # ebaysdk is only imported once a job item actually runs
+    from services.registry import get_ebay_service
+
+    # Spaced here rather than by the queue, so items over the daily limit
+    # are turned away before they take a slot
+    rate_limiter = RateLimiter(
+        float(os.getenv('ANALYTICS_REQUESTS_PER_MINUTE', '30')) / ANALYTICS_CALLS_PER_ITEM
+    )
+
+    async def research_item(payload: Dict[str, Any]) -> Dict:
+        store = get_comps_store()
+        if not store.consume_quota(ANALYTICS_API, ANALYTICS_CALLS_PER_ITEM, analytics_daily_limit()):
+            raise TransientJobError(
+                "Analytics daily call limit reached", retry_after=seconds_until_utc_midnight() + 60
+            )
+
+        try:
+            ebay_service = get_ebay_service()
+            await rate_limiter.acquire()
+        except BaseException:
+            # Nothing reached eBay (the service couldn't be built, or we were stopped): hand the calls back
+            store.release_quota(ANALYTICS_API, ANALYTICS_CALLS_PER_ITEM)
+            raise
+        args = (payload['query'], payload['days'])
+        if payload.get('category_id'):
+            args += (payload['category_id'],)
+        try:
+            data = await ebay_service.fetch_terapeak_data(*args, query_type=payload['query_type'])
+        except Exception as e:
+            if is_transient_error(e):
+                raise TransientJobError(str(e))
+            raise
+
+        store.record(payload['query'], payload['days'], payload['query_type'], data)
+        return {'query': payload['query'], 'days': payload['days'], **data}
+
+    return JobQueue(
+        'terapeak_research',
+        research_item,
+        concurrency=int(os.getenv('RESEARCH_CONCURRENCY', '2')),
+        # research_item spaces its own calls
+        requests_per_minute=0,
+        max_attempts=int(os.getenv('RESEARCH_MAX_ATTEMPTS', '3'))
+    )
+
+
+def nightly_upcs() -> List[str]:
+    """
+    UPCs refreshed every night: inventory first, then the rest of the catalog
+    """
+    from services.catalog_service import get_catalog
+    from services.inventory_service import get_inventory
+
+    upcs = get_inventory().upcs()
+    upcs += [str(product['upc']) for product in get_catalog().all_products() if product.get('upc')]
+    return list(dict.fromkeys(upcs))
+
+
+class ResearchScheduler:
+    """
+    Submits the nightly comps refresh for the whole catalog at RESEARCH_NIGHTLY_AT
+    (UTC, "HH:MM"). Each night's run is claimed in the comps store, so with
+    several workers only one submits it, and a worker started after the hour
+    catches up on a run that hasn't happened yet
+    """
+    def __init__(self, queue: JobQueue, run_at: str, days: List[int]):
+        hour, _, minute = run_at.partition(':')
+        self.run_at = datetime.time(int(hour), int(minute or 0))
+        self.days = days
+        self.queue = queue
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name='research-scheduler')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _next_run(self, now: datetime.datetime) -> datetime.datetime:
+        today = datetime.datetime.combine(now.date(), self.run_at, tzinfo=datetime.timezone.utc)
+        return today if now < today else today + datetime.timedelta(days=1)
+
+    async def _run(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if now.time() >= self.run_at:
+            await self._run_once(now.date())
+        while True:
+            next_run = self._next_run(datetime.datetime.now(datetime.timezone.utc))
+            await asyncio.sleep((next_run - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+            await self._run_once(next_run.date())
+
+    async def _run_once(self, run_date: datetime.date) -> Optional[str]:
+        store = get_comps_store()
+        if not store.claim_run(NIGHTLY_RUN, run_date.isoformat()):
+            return None
+        try:
+            upcs = await asyncio.to_thread(nightly_upcs)
+            job_id = await self.queue.submit(
+                research_items(upcs, [], self.days),
+                metadata={'source': 'nightly', 'run_date': run_date.isoformat()},
+                priority=NIGHTLY_PRIORITY
+            )
+            store.set_run_job(NIGHTLY_RUN, run_date.isoformat(), job_id)
+            logger.info(f"Submitted nightly comps refresh {job_id} for {len(upcs)} UPCs")
+            return job_id
+        except Exception as e:
+            logger.error(f"Error submitting nightly comps refresh: {str(e)}")
+            return None
+
+
+def create_research_scheduler(queue: JobQueue) -> Optional[ResearchScheduler]:
+    """
+    The nightly scheduler, unless RESEARCH_NIGHTLY_AT is empty
+    """
+    run_at = os.getenv('RESEARCH_NIGHTLY_AT', '03:00').strip()
+    if not run_at:
+        return None
+    days = [int(d) for d in os.getenv('RESEARCH_NIGHTLY_DAYS', '30,90').split(',') if d.strip()]
+    return ResearchScheduler(queue, run_at, days)
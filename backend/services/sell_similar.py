@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from services.template_renderer import build_replacements
+from services.tracing import trace_methods, traced
+
+if TYPE_CHECKING:
+    # Type hints only: importing these would load the eBay and Gemini SDKs
+    from services.ebay_listing_service import EbayListingService
+    from services.gemini_service import GeminiService
+    from services.template_service import TemplateService
+
+ASPECT_GROUPS = ('required', 'recommended', 'upcoming_required')
+
+
+@traced()
+async def suggest_item_specifics(gemini_service: 'GeminiService', aspects: Dict, context: Dict) -> Dict[str, str]:
+    """
+    Validated values for every aspect of a category; values already known in
+    `context['item_specifics']` are kept and only the rest are asked of Gemini.
+    Unverified values in `context['item_specific_hints']` (e.g. read from
+    photo text) only go into the prompt
+    """
+    all_aspects = [aspect for group in ASPECT_GROUPS for aspect in aspects.get(group, [])]
+    known_values = context.get("item_specifics") or {}
+    pending_aspects = [aspect for aspect in all_aspects if not known_values.get(aspect["name"])]
+
+    suggestions = {}
+    if pending_aspects:
+        suggestions = await gemini_service.get_multiple_item_specifics(pending_aspects, context)
+
+    validated = {}
+    for aspect in all_aspects:
+        value = known_values.get(aspect["name"]) or suggestions.get(aspect["name"], "")
+        if isinstance(value, dict):
+            value = value.get("value", "")
+        if gemini_service.validate_aspect_value(value, aspect):
+            validated[aspect["name"]] = value
+    return validated
+
+
+@trace_methods
+class SellSimilarPipeline:
+    """
+    Builds a "sell similar" draft from an existing listing in one call.
+
+    The stages run as a small dependency graph rather than in sequence:
+
+        GetItem ──> aspects ──> AI item specifics ──┐
+        template fetch ─────────────────────────────┴──> fill
+
+    so the total time is close to the GetItem -> aspects -> AI chain alone.
+    """
+    def __init__(self, listing_service: 'EbayListingService', gemini_service: 'GeminiService',
+                 template_service: 'TemplateService'):
+        self.listing_service = listing_service
+        self.gemini_service = gemini_service
+        self.template_service = template_service
+
+    async def build_draft(self, item_id: str, template: str = 'collectibles',
+                          marketplace_id: str = 'EBAY_US', overrides: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Assemble a draft listing from `item_id`; returns None if the item can't be fetched
+        """
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        async def timed(stage: str, coroutine):
+            stage_start = time.perf_counter()
+            try:
+                return await coroutine
+            finally:
+                timings[stage] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+        # Nothing else depends on the template, so it is fetched from the start
+        template_task = asyncio.create_task(timed('template', self.template_service.get_render_plan(template)))
+        try:
+            item = await timed('item', self.listing_service.get_item_details(item_id))
+            if not item:
+                return None
+            item = {**item, **(overrides or {})}
+
+            aspects = await timed('aspects', self.listing_service.fetch_item_aspects(item['category_id'], marketplace_id))
+            item_specifics = dict(item.get('item_specifics') or {})
+            if aspects:
+                suggested = await timed('item_specifics', suggest_item_specifics(
+                    self.gemini_service, aspects, self._ai_context(item)
+                ))
+                item_specifics.update(suggested)
+
+            plan = await template_task
+        finally:
+            if not template_task.done():
+                template_task.cancel()
+
+        draft = {
+            'source_item_id': item_id,
+            'title': item.get('title', ''),
+            'description': item.get('description', ''),
+            'category_id': item.get('category_id', ''),
+            'condition_id': item.get('condition_id', ''),
+            'condition_description': item.get('condition_description', ''),
+            'price': item.get('price', ''),
+            'quantity': item.get('quantity', 1),
+            'duration': item.get('duration', ''),
+            'listing_type': item.get('listing_type', ''),
+            'return_policy': item.get('return_policy', {}),
+            'shipping_details': item.get('shipping_details', {}),
+            'pictures': item.get('pictures', []),
+            'item_specifics': item_specifics,
+            'aspects': aspects or {},
+            'template': template,
+            'html': None
+        }
+        if plan is not None:
+            fill_start = time.perf_counter()
+            draft['html'] = plan.render(build_replacements(self._template_data(draft), plan.is_funko))
+            timings['fill'] = round((time.perf_counter() - fill_start) * 1000, 1)
+
+        timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        draft['timings'] = timings
+        return draft
+
+    def _ai_context(self, item: Dict) -> Dict:
+        return {
+            'title': item.get('title', ''),
+            'description': item.get('description', ''),
+            'category_id': item.get('category_id', ''),
+            'item_specifics': item.get('item_specifics') or {}
+        }
+
+    def _template_data(self, draft: Dict) -> Dict:
+        specifics = draft['item_specifics']
+        return {
+            'title': draft['title'],
+            'description': draft['description'],
+            'condition': draft['condition_description'],
+            'brand': specifics.get('Brand', ''),
+            'model': specifics.get('Model') or specifics.get('MPN', ''),
+            'series': specifics.get('Franchise') or specifics.get('Series', ''),
+            'character': specifics.get('Character', ''),
+            'popNumber': specifics.get('Pop Number') or specifics.get('Item Number', ''),
+            'exclusiveRelease': specifics.get('Exclusive Event/Retailer', ''),
+            'images': draft['pictures']
+        }
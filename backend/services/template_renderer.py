@@ -0,0 +1,144 @@
+import re
+from functools import lru_cache
+from html import escape
+from typing import Dict, List, Optional, Tuple, Union
+
+PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+DIV_TAG_RE = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+CLASS_ATTR_RE = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+
+# Slot holding the contents of the first <div class="gallery">
+GALLERY_SLOT = '__gallery__'
+
+
+class RenderPlan:
+    """
+    A template compiled once into static segments and placeholder slots,
+    so filling it is a single join instead of a replace pass per placeholder
+    """
+    __slots__ = ('segments', 'slots', 'is_funko')
+
+    def __init__(self, template: str):
+        self.segments: List[str] = []
+        self.slots: List[Tuple[int, str, Union[str, 'RenderPlan']]] = []
+
+        # The gallery contents become one slot whose default is the original markup
+        gallery = _find_gallery(template)
+        if gallery:
+            start, end = gallery
+            self._add_text(template[:start])
+            self.slots.append((len(self.segments), GALLERY_SLOT, RenderPlan(template[start:end])))
+            self.segments.append('')
+            self._add_text(template[end:])
+        else:
+            self._add_text(template)
+
+        self.is_funko = 'funko' in template.lower()
+
+    def _add_text(self, text: str):
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            self.segments.append(text[position:match.start()])
+            self.slots.append((len(self.segments), match.group(1), match.group(0)))
+            self.segments.append(match.group(0))
+            position = match.end()
+        self.segments.append(text[position:])
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        Join the segments with slot values; unknown placeholders are left as-is
+        """
+        parts = self.segments.copy()
+        for index, name, default in self.slots:
+            value = values.get(name)
+            if value is None:
+                value = default.render(values) if name == GALLERY_SLOT else default
+            parts[index] = value
+        return ''.join(parts)
+
+
+def _find_gallery(template: str) -> Optional[Tuple[int, int]]:
+    """
+    Span of the contents of the first <div> whose class list includes "gallery"
+    """
+    depth = 0
+    start = None
+    for match in DIV_TAG_RE.finditer(template):
+        if start is None:
+            if match.group(1):
+                continue
+            class_attr = CLASS_ATTR_RE.search(match.group(0))
+            if class_attr and 'gallery' in ''.join(g or '' for g in class_attr.groups()).split():
+                start = match.end()
+                depth = 1
+        elif match.group(1):
+            depth -= 1
+            if depth == 0:
+                return start, match.start()
+        else:
+            depth += 1
+    return None
+
+
+@lru_cache(maxsize=64)
+def compile_template(template: str) -> RenderPlan:
+    """
+    Compile (and memoize) the render plan for a template string
+    """
+    return RenderPlan(template)
+
+
+def build_replacements(data: Dict, is_funko: bool = False) -> Dict[str, str]:
+    """
+    Placeholder values for a product, keyed by placeholder name
+    """
+    replacements = {
+        'title': data.get('title', ''),
+        'condition': data.get('condition', ''),
+        'description': data.get('description', ''),
+        'brand': data.get('brand', ''),
+        'model': data.get('model', ''),
+        'features': data.get('features', []),
+        'shipping': data.get('shipping', {}),
+        'returns': data.get('returns', {}),
+        'payment': data.get('payment', {}),
+    }
+
+    # Special handling for Funko Pop templates
+    if is_funko:
+        replacements.update({
+            'pop_number': data.get('popNumber', ''),
+            'series': data.get('series', ''),
+            'character': data.get('character', ''),
+            'exclusive': data.get('exclusiveRelease', ''),
+            'box_condition': data.get('boxCondition', ''),
+            'box_damage': ', '.join(data.get('boxDamage', [])) if data.get('boxDamage') else 'None',
+            'features': ', '.join(data.get('features', [])),
+            'year_released': data.get('yearReleased', ''),
+            'vaulted': 'Yes' if data.get('vaulted') else 'No'
+        })
+
+    values = {key: str(value) for key, value in replacements.items()}
+
+    # Image gallery
+    if data.get('images'):
+        values[GALLERY_SLOT] = ''.join(f'<img src="{escape(str(url))}"/>' for url in data['images'])
+
+    return values
+
+
+def render_template(template: str, data: Dict) -> str:
+    """
+    Fill a template string with product data, placeholders and gallery
+    images in one pass over the precompiled plan
+    """
+    plan = compile_template(template)
+    return plan.render(build_replacements(data, plan.is_funko))
+
+
+def render_batch(template: str, items: List[Dict]) -> List[str]:
+    """
+    Fill one template for many products; runs in worker processes for batch renders
+    """
+    plan = compile_template(template)
+    return [plan.render(build_replacements(data, plan.is_funko)) for data in items]
@@ -1,11 +1,35 @@
+import asyncio
+import multiprocessing
 import os
-from typing import Dict, List, Optional
-import httpx
-from bs4 import BeautifulSoup
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+from services.http_client import http_client
+from services.local_store import data_path
+from services.metrics import instrument_upstream
+from services.template_renderer import RenderPlan, compile_template, render_batch, render_template
+from services.tracing import trace_methods
 
+# Products per task sent to the render process pool
+RENDER_CHUNK_SIZE = 25
+SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9._-]+')
+
+class CachedTemplate:
+    """A template held in memory with its validator and compiled render plan"""
+    __slots__ = ('html', 'etag', 'checked_at', 'local', 'plan')
+
+    def __init__(self, html: str, etag: Optional[str] = None, local: bool = False):
+        self.html = html
+        self.etag = etag
+        self.checked_at = time.monotonic()
+        self.local = local
+        self.plan = compile_template(html)
+
+@trace_methods
 class TemplateService:
     def __init__(self):
-        self.template_base_url = "ebay.by1.net/templates/"
+        self.template_base_url = os.getenv('TEMPLATE_BASE_URL', 'https://ebay.by1.net/templates').rstrip('/')
         self.templates = {
             'art': 'art-ebay-template.html',
             'auto': 'auto-ebay-template.html',
@@ -26,73 +50,245 @@ class TemplateService:
             'vintage': 'vintage-ebay-template.html'
         }
 
+        # Seconds before a cached remote template is revalidated with its ETag
+        self.cache_ttl = float(os.getenv('TEMPLATE_CACHE_TTL', '3600'))
+        self.cache_dir = data_path('templates')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._cache: Dict[str, CachedTemplate] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        self.render_workers = int(os.getenv('TEMPLATE_RENDER_WORKERS', str(os.cpu_count() or 1)))
+        self.output_root = os.getenv('TEMPLATE_OUTPUT_DIR', data_path('rendered'))
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        if os.getenv('TEMPLATE_DIR'):
+            self.preload_directory(os.getenv('TEMPLATE_DIR'))
+
+    def preload_directory(self, directory: str) -> List[str]:
+        """
+        Load templates from a local directory; these are never refetched
+        """
+        loaded = []
+        for category, filename in self.templates.items():
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self._cache[category] = CachedTemplate(f.read(), local=True)
+                loaded.append(category)
+        return loaded
+
     async def get_template(self, category: str) -> Optional[str]:
         """
         Fetch the HTML template for a given category
         """
+        cached = await self._get_cached(category)
+        return cached.html if cached else None
+
+    async def get_render_plan(self, category: str) -> Optional[RenderPlan]:
+        """
+        Get the compiled render plan for a given category
+        """
+        cached = await self._get_cached(category)
+        return cached.plan if cached else None
+
+    async def _get_cached(self, category: str) -> Optional[CachedTemplate]:
         if category not in self.templates:
             return None
 
+        cached = self._cache.get(category)
+        if cached and (cached.local or time.monotonic() - cached.checked_at < self.cache_ttl):
+            return cached
+
+        # One fetch per category at a time; waiters reuse its result
+        lock = self._locks.setdefault(category, asyncio.Lock())
+        async with lock:
+            cached = self._cache.get(category) or self._load_from_disk(category)
+            if cached and (cached.local or time.monotonic() - cached.checked_at < self.cache_ttl):
+                self._cache[category] = cached
+                return cached
+
+            fetched = await self._fetch(category, cached)
+            if fetched:
+                self._cache[category] = fetched
+            return fetched
+
+    async def _fetch(self, category: str, cached: Optional[CachedTemplate]) -> Optional[CachedTemplate]:
         template_url = f"{self.template_base_url}/{self.templates[category]}"
-        
+        headers = {"If-None-Match": cached.etag} if cached and cached.etag else {}
+
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(template_url)
+            async with http_client() as client:
+                with instrument_upstream('template_host', 'fetch_template') as call:
+                    response = await client.get(template_url, headers=headers)
+                    if response.status_code >= 400:
+                        call.mark_error()
+                if response.status_code == 304 and cached:
+                    cached.checked_at = time.monotonic()
+                    return cached
                 response.raise_for_status()
-                return response.text
         except Exception as e:
             print(f"Error fetching template: {str(e)}")
+            # Serve the stale copy rather than nothing, and back off until the next revalidation
+            if cached:
+                cached.checked_at = time.monotonic()
+            return cached
+
+        fetched = CachedTemplate(response.text, etag=response.headers.get('ETag'))
+        self._save_to_disk(category, fetched)
+        return fetched
+
+    def _cache_file(self, category: str) -> str:
+        return os.path.join(self.cache_dir, self.templates[category])
+
+    def _load_from_disk(self, category: str) -> Optional[CachedTemplate]:
+        path = self._cache_file(category)
+        if not os.path.exists(path):
             return None
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        etag = None
+        if os.path.exists(path + '.etag'):
+            with open(path + '.etag', encoding='utf-8') as f:
+                etag = f.read().strip() or None
+        cached = CachedTemplate(html, etag=etag)
+        # Revalidate disk copies on first use
+        cached.checked_at = float('-inf')
+        return cached
+
+    def _save_to_disk(self, category: str, cached: CachedTemplate):
+        path = self._cache_file(category)
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(cached.html)
+            os.replace(path + '.tmp', path)
+            if cached.etag:
+                with open(path + '.etag', 'w', encoding='utf-8') as f:
+                    f.write(cached.etag)
+            elif os.path.exists(path + '.etag'):
+                os.remove(path + '.etag')
+        except OSError as e:
+            print(f"Error caching template: {str(e)}")
 
     def fill_template(self, template: str, data: Dict) -> str:
         """
         Fill the template with product data
         """
-        soup = BeautifulSoup(template, 'html.parser')
-
-        # Replace common placeholders
-        replacements = {
-            '{{title}}': data.get('title', ''),
-            '{{condition}}': data.get('condition', ''),
-            '{{description}}': data.get('description', ''),
-            '{{brand}}': data.get('brand', ''),
-            '{{model}}': data.get('model', ''),
-            '{{features}}': data.get('features', []),
-            '{{shipping}}': data.get('shipping', {}),
-            '{{returns}}': data.get('returns', {}),
-            '{{payment}}': data.get('payment', {}),
-        }
+        return render_template(template, data)
+
+    async def render_many(self, items: List[Dict], output_dir: Optional[str] = None,
+                          include_html: bool = True) -> AsyncIterator[Dict]:
+        """
+        Render many products across categories, yielding each result as soon as
+        its chunk finishes. Products are grouped by template so every template is
+        fetched once, and chunks are rendered in parallel in a process pool.
+        When `output_dir` is given each listing is also written to
+        `<TEMPLATE_OUTPUT_DIR>/<output_dir>/`.
+        """
+        groups: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(item.get('category', ''), []).append(index)
+
+        templates = dict(zip(groups, await asyncio.gather(*(self.get_template(c) for c in groups))))
+        target_dir = self._output_dir(output_dir) if output_dir else None
+        filenames = self._output_filenames(items) if target_dir else {}
+
+        # Small batches render inline: shipping them to the pool costs more than rendering them
+        executor = self._get_executor() if len(items) > RENDER_CHUNK_SIZE else None
+        tasks = []
+        for category, indexes in groups.items():
+            if templates[category] is None:
+                for index in indexes:
+                    yield {
+                        "index": index,
+                        "category": category,
+                        "success": False,
+                        "error": f"Template not found for category: {category}"
+                    }
+                continue
+
+            for start in range(0, len(indexes), RENDER_CHUNK_SIZE):
+                chunk = indexes[start:start + RENDER_CHUNK_SIZE]
+                tasks.append(asyncio.ensure_future(self._render_chunk(
+                    executor, templates[category], category, chunk, items, target_dir, filenames
+                )))
+
+        for task in asyncio.as_completed(tasks):
+            for result in await task:
+                if not include_html:
+                    result.pop("html", None)
+                yield result
+
+    async def _render_chunk(self, executor: Optional[ProcessPoolExecutor], template: str, category: str,
+                            indexes: List[int], items: List[Dict], target_dir: Optional[str],
+                            filenames: Dict[int, str]) -> List[Dict]:
+        data = [items[i].get('data', {}) for i in indexes]
+        try:
+            if executor is None:
+                rendered = render_batch(template, data)
+            else:
+                rendered = await asyncio.get_running_loop().run_in_executor(executor, render_batch, template, data)
+        except Exception as e:
+            print(f"Error rendering templates: {str(e)}")
+            return [{"index": i, "category": category, "success": False, "error": str(e)} for i in indexes]
 
-        # Special handling for Funko Pop templates
-        if 'funko' in template.lower():
-            funko_replacements = {
-                '{{pop_number}}': data.get('popNumber', ''),
-                '{{series}}': data.get('series', ''),
-                '{{character}}': data.get('character', ''),
-                '{{exclusive}}': data.get('exclusiveRelease', ''),
-                '{{box_condition}}': data.get('boxCondition', ''),
-                '{{box_damage}}': ', '.join(data.get('boxDamage', [])) if data.get('boxDamage') else 'None',
-                '{{features}}': ', '.join(data.get('features', [])),
-                '{{year_released}}': data.get('yearReleased', ''),
-                '{{vaulted}}': 'Yes' if data.get('vaulted') else 'No'
-            }
-            replacements.update(funko_replacements)
-
-        # Replace all placeholders in the template
-        html = template
-        for key, value in replacements.items():
-            html = html.replace(key, str(value))
-
-        # Handle image gallery
-        if data.get('images'):
-            gallery_div = soup.find('div', {'class': 'gallery'})
-            if gallery_div:
-                gallery_div.clear()
-                for img_url in data['images']:
-                    img_tag = soup.new_tag('img', src=img_url)
-                    gallery_div.append(img_tag)
-
-        return str(soup)
+        results = []
+        for index, html in zip(indexes, rendered):
+            result = {"index": index, "category": category, "success": True, "html": html}
+            if target_dir:
+                result["file"] = await asyncio.to_thread(self._write_output, target_dir, filenames[index], html)
+            results.append(result)
+        return results
+
+    def _output_dir(self, name: str) -> str:
+        path = os.path.join(self.output_root, SAFE_NAME_RE.sub('_', name).strip('._') or 'batch')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _output_filename(self, item: Dict, index: int, category: str) -> str:
+        name = item.get('filename') or item.get('data', {}).get('sku') or f"{index:05d}-{category}"
+        name = SAFE_NAME_RE.sub('_', str(name)).strip('._') or f"{index:05d}-{category}"
+        return name if name.endswith('.html') else f"{name}.html"
+
+    def _output_filenames(self, items: List[Dict]) -> Dict[int, str]:
+        """
+        Output file per item. Items sharing a filename or SKU get numbered
+        suffixes in batch order so none overwrites another
+        """
+        filenames: Dict[int, str] = {}
+        taken = set()
+        for index, item in enumerate(items):
+            name = self._output_filename(item, index, item.get('category', ''))
+            stem, number = name[:-len('.html')], 1
+            # Case-insensitive, for filesystems that are
+            while name.lower() in taken:
+                number += 1
+                name = f"{stem}-{number}.html"
+            taken.add(name.lower())
+            filenames[index] = name
+        return filenames
+
+    def _write_output(self, directory: str, filename: str, html: str) -> str:
+        path = os.path.join(directory, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        return path
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that already runs gRPC channels and exporter threads can
+            # deadlock the children, so they start fresh
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.render_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def close(self):
+        """
+        Shut down the render process pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     def get_available_templates(self) -> List[str]:
         """
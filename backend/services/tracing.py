@@ -0,0 +1,384 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from services.local_store import data_path
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'aimagic-backend')
+# Server-Timing entries beyond this are dropped to keep the header small
+MAX_SERVER_TIMING_SPANS = 40
+
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Trace:
+    """
+    Spans recorded for one request
+    """
+    __slots__ = ('trace_id', 'remote_parent_id', 'spans', 'started_ns')
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None):
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.remote_parent_id = remote_parent_id
+        self.spans: List['Span'] = []
+        self.started_ns = time.time_ns()
+
+
+class Span:
+    """
+    One timed operation; use as a context manager (sync or async code)
+    """
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'duration',
+                 'error', '_started', '_token')
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Optional[Dict] = None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_ns = 0
+        self.duration = None
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.trace.spans.append(self)
+        return False
+
+    def as_dict(self) -> Dict:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start_ns - self.trace.started_ns) / 1e6, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """
+    Stands in for a span when the current request isn't traced
+    """
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def span(name: str, **attributes):
+    """
+    Context manager timing `name` as a child of the current span; a no-op
+    outside a traced request
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    return Span(trace, name, parent.span_id if parent else trace.remote_parent_id, attributes)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Record every call of a sync or async function as a span
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_trace.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def trace_methods(cls):
+    """
+    Class decorator tracing each public method as "Class.method".
+    Generators are left alone, since their work happens after the call returns
+    """
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_') or not inspect.isfunction(value):
+            continue
+        if inspect.isgeneratorfunction(value) or inspect.isasyncgenfunction(value):
+            continue
+        setattr(cls, attr, traced(f"{cls.__name__}.{attr}")(value))
+    return cls
+
+
+class TraceExporter:
+    """
+    Ships finished traces from a background thread so requests never wait
+    on disk or network. Traces are dropped if the exporter falls behind
+    """
+    def __init__(self, file_path: Optional[str] = None, otlp_endpoint: Optional[str] = None,
+                 max_queue: int = 1000, batch_size: int = 100):
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        client = None
+        if self.otlp_endpoint:
+            import httpx
+            client = httpx.Client(timeout=2.0)
+
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [trace for trace in batch if trace is not None]
+            if not batch:
+                continue
+            try:
+                if self.file_path:
+                    self._write_file(batch)
+                if client is not None:
+                    client.post(self.otlp_endpoint, json=otlp_payload(batch)).raise_for_status()
+            except Exception as e:
+                logger.warning(f"Error exporting {len(batch)} traces: {str(e)}")
+
+        if client is not None:
+            client.close()
+
+    def _write_file(self, batch: List[Trace]):
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            for trace in batch:
+                f.write(json.dumps(trace_record(trace), default=str) + '\n')
+
+
+def trace_record(trace: Trace) -> Dict:
+    """
+    A trace as one JSON-lines record: spans ordered by start, offsets from the
+    start of the request, so the waterfall can be read directly
+    """
+    spans = sorted(trace.spans, key=lambda s: s.start_ns)
+    root = spans[0] if spans else None
+    return {
+        'trace_id': trace.trace_id,
+        'name': root.name if root else '',
+        'timestamp': trace.started_ns / 1e9,
+        'duration_ms': round(root.duration * 1000, 3) if root else 0,
+        'spans': [s.as_dict() for s in spans]
+    }
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _span_kind(trace: Trace, s: Span) -> int:
+    if s.parent_id is None or s.parent_id == trace.remote_parent_id:
+        return 2  # SERVER: the request itself
+    if 'upstream' in s.attributes:
+        return 3  # CLIENT: a call to an external service
+    return 1  # INTERNAL
+
+
+def otlp_payload(batch: List[Trace]) -> Dict:
+    """
+    Traces in the OTLP/HTTP JSON encoding
+    """
+    spans = []
+    for trace in batch:
+        for s in trace.spans:
+            otlp_span = {
+                'traceId': trace.trace_id,
+                'spanId': s.span_id,
+                'name': s.name,
+                'kind': _span_kind(trace, s),
+                'startTimeUnixNano': str(s.start_ns),
+                'endTimeUnixNano': str(s.start_ns + int(s.duration * 1e9)),
+                'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items()],
+                'status': {'code': 2, 'message': s.error} if s.error else {'code': 1}
+            }
+            if s.parent_id:
+                otlp_span['parentSpanId'] = s.parent_id
+            spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': 'aimagic.tracing'}, 'spans': spans}]
+        }]
+    }
+
+
+_exporter: Optional[TraceExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> Optional[TraceExporter]:
+    """
+    The exporter chosen by TRACE_EXPORTER (comma-separated: file, otlp), if any
+    """
+    global _exporter
+    if _exporter is None:
+        targets = {name.strip() for name in os.getenv('TRACE_EXPORTER', '').lower().split(',') if name.strip()}
+        if not targets:
+            return None
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = TraceExporter(
+                    file_path=(os.getenv('TRACE_FILE') or data_path('traces.jsonl')) if 'file' in targets else None,
+                    otlp_endpoint=os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+                    if 'otlp' in targets else None
+                )
+    return _exporter
+
+
+def close_tracing():
+    """
+    Flush and stop the exporter
+    """
+    global _exporter
+    with _exporter_lock:
+        exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.close()
+
+
+def _server_timing(trace: Trace) -> str:
+    entries = []
+    for s in sorted(trace.spans, key=lambda s: s.start_ns)[:MAX_SERVER_TIMING_SPANS]:
+        token = re.sub(r'[^A-Za-z0-9_.-]', '_', s.name)
+        entries.append(f'{token};dur={s.duration * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware starting a trace per sampled request. Honours an incoming
+    W3C traceparent header, returns the trace id in X-Trace-Id and, when
+    server_timing is set, the span waterfall in a Server-Timing header
+    """
+    def __init__(self, app, sample_rate: float = 1.0, server_timing: bool = False):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        exporter = get_exporter()
+        trace_id = remote_parent_id = None
+        sampled = random.random() < self.sample_rate
+        for name, value in scope['headers']:
+            if name == b'traceparent':
+                match = _TRACEPARENT.match(value.decode('latin-1'))
+                if match:
+                    trace_id, remote_parent_id = match.group(1), match.group(2)
+                    sampled = bool(int(match.group(3), 16) & 1)
+                break
+        if not sampled or (exporter is None and not self.server_timing):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(trace_id, remote_parent_id)
+        trace_token = _current_trace.set(trace)
+        root = Span(trace, f"{scope['method']} {scope['path']}", remote_parent_id)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'x-trace-id', trace.trace_id.encode()))
+                if self.server_timing:
+                    # Spans still open (streamed bodies) finish after the headers and are left out
+                    entries = _server_timing(trace)
+                    total = f"total;dur={(time.perf_counter() - root._started) * 1000:.1f}"
+                    headers.append((b'server-timing', (f"{total}, {entries}" if entries else total).encode()))
+                message = {**message, 'headers': headers}
+                root.set_attribute('http.status_code', message['status'])
+            await send(message)
+
+        try:
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(trace_token)
+            route = scope.get('route')
+            if route is not None and getattr(route, 'path', None):
+                root.name = f"{scope['method']} {route.path}"
+            if exporter is not None:
+                exporter.export(trace)
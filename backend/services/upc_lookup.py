@@ -1,30 +1,40 @@
-import httpx
 from typing import Dict, Any, Optional
+import asyncio
 import os
 import logging
+from services.cache import cached
+from services.catalog_service import get_catalog
+from services.http_client import http_client
+from services.metrics import instrument_upstream
+from services.tracing import trace_methods
 
 logger = logging.getLogger(__name__)
 
+@trace_methods
 class UPCLookupService:
     def __init__(self):
-        self.base_url = "https://api.upcitemdb.com/prod/trial/lookup"
+        self.base_url = os.getenv('UPCITEMDB_URL', "https://api.upcitemdb.com/prod/trial/lookup")
         self.headers = {
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
 
+    @cached('upc', ttl=86400, max_entries=10000, cache_if=lambda result: result.get("success"))
     async def lookup_upc(self, upc: str) -> Dict[str, Any]:
         """
         Look up product information using UPC code
         """
         try:
             logger.debug(f"Looking up UPC: {upc}")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}?upc={upc}",
-                    headers=self.headers,
-                    timeout=10.0  # Reduced timeout
-                )
+            async with http_client() as client:
+                with instrument_upstream('upcitemdb', 'lookup') as call:
+                    response = await client.get(
+                        f"{self.base_url}?upc={upc}",
+                        headers=self.headers,
+                        timeout=10.0  # Reduced timeout
+                    )
+                    if response.status_code != 200:
+                        call.mark_error()
                 
                 logger.debug(f"UPC lookup response status: {response.status_code}")
                 
@@ -34,26 +44,31 @@ class UPCLookupService:
                     
                     if data.get("items"):
                         item = data["items"][0]
+                        product = {
+                            "title": item.get("title", ""),
+                            "description": item.get("description", ""),
+                            "brand": item.get("brand", ""),
+                            "category": item.get("category", ""),
+                            "upc": item.get("upc", ""),
+                            "ean": item.get("ean", ""),
+                            "model": item.get("model", ""),
+                            "color": item.get("color", ""),
+                            "size": item.get("size", ""),
+                            "dimension": item.get("dimension", ""),
+                            "weight": item.get("weight", ""),
+                            "images": item.get("images", []),
+                            "offers": item.get("offers", []),
+                            "lowest_price": item.get("lowest_recorded_price"),
+                            "highest_price": item.get("highest_recorded_price"),
+                            "source": "upcitemdb"
+                        }
+
+                        # Keep every resolved product in the local catalog
+                        await asyncio.to_thread(get_catalog().upsert, product, "upcitemdb")
+
                         return {
                             "success": True,
-                            "product": {
-                                "title": item.get("title", ""),
-                                "description": item.get("description", ""),
-                                "brand": item.get("brand", ""),
-                                "category": item.get("category", ""),
-                                "upc": item.get("upc", ""),
-                                "ean": item.get("ean", ""),
-                                "model": item.get("model", ""),
-                                "color": item.get("color", ""),
-                                "size": item.get("size", ""),
-                                "dimension": item.get("dimension", ""),
-                                "weight": item.get("weight", ""),
-                                "images": item.get("images", []),
-                                "offers": item.get("offers", []),
-                                "lowest_price": item.get("lowest_recorded_price"),
-                                "highest_price": item.get("highest_recorded_price"),
-                                "source": "upcitemdb"
-                            }
+                            "product": product
                         }
                     
                     logger.warning(f"No items found for UPC: {upc}")
@@ -0,0 +1,125 @@
+import asyncio
+import os
+from typing import Iterable, Optional
+
+
+class ByteBudget:
+    """
+    Async semaphore counted in bytes, bounding the upload bytes in flight
+    across all requests of this worker
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def acquire(self, size: int):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        size = min(size, self.limit)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight + size <= self.limit)
+            self.in_flight += size
+
+    async def release(self, size: int):
+        size = min(size, self.limit)
+        async with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware enforcing a per-request body size and a worker-wide
+    in-flight byte budget on upload routes.
+
+    Oversized requests are rejected from Content-Length before any body is
+    read, or as soon as a chunked body crosses the limit. The body itself is
+    still spooled to a temporary file by the multipart parser, so endpoints
+    can hand `UploadFile.file` straight to preprocessing.
+    """
+    def __init__(
+        self,
+        app,
+        path_prefixes: Iterable[str] = ('/api/vision',),
+        max_request_bytes: Optional[int] = None,
+        max_in_flight_bytes: Optional[int] = None,
+        wait_timeout: float = 30.0
+    ):
+        self.app = app
+        self.path_prefixes = tuple(path_prefixes)
+        self.max_request_bytes = max_request_bytes or int(os.getenv('UPLOAD_MAX_REQUEST_BYTES', str(40 * 1024 * 1024)))
+        self.budget = ByteBudget(max_in_flight_bytes or int(os.getenv('UPLOAD_MAX_IN_FLIGHT_BYTES', str(256 * 1024 * 1024))))
+        self.wait_timeout = wait_timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('POST', 'PUT') \
+                or not scope['path'].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = None
+        for name, value in scope.get('headers', []):
+            if name == b'content-length':
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+                break
+
+        if content_length is not None and content_length > self.max_request_bytes:
+            await self._reject(send, 413, f"Upload exceeds {self.max_request_bytes} bytes")
+            return
+
+        reserved = content_length if content_length is not None else self.max_request_bytes
+        try:
+            await asyncio.wait_for(self.budget.acquire(reserved), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            await self._reject(send, 503, "Too many uploads in progress, retry shortly", retry_after=True)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                # Also catches bodies longer than their declared Content-Length
+                if received > reserved:
+                    too_large = True
+                    raise BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if too_large:
+                # The app's error response (e.g. a body parse 400) is replaced by a 413
+                return
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge:
+            pass
+        finally:
+            await self.budget.release(reserved)
+
+        if too_large and not response_started:
+            await self._reject(send, 413, f"Upload exceeds {self.max_request_bytes} bytes")
+
+    async def _reject(self, send, status: int, detail: str, retry_after: bool = False):
+        body = ('{"detail": "%s"}' % detail).encode()
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        if retry_after:
+            headers.append((b'retry-after', b'5'))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
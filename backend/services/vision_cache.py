@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.image_preprocessing import PreparedImage, hamming_distance
+from services.local_store import connect
+from services.tracing import trace_methods
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS vision_annotations (
+    content_hash TEXT PRIMARY KEY,
+    perceptual_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+'''
+
+
+@trace_methods
+class VisionAnnotationCache:
+    """
+    Local cache of Vision results keyed by image content hash. Lookup by
+    perceptual hash is opt-in (VISION_PHASH_DISTANCE > 0): different products
+    shot on the same backdrop can be only a few bits apart. Blocking; call it
+    off the event loop
+    """
+    def __init__(self, db_file: str = 'vision_cache.db', max_distance: Optional[int] = None):
+        self.max_distance = int(os.getenv('VISION_PHASH_DISTANCE', '0')) if max_distance is None else max_distance
+        self._conn = connect(db_file)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            rows = self._conn.execute(
+                "SELECT content_hash, perceptual_hash FROM vision_annotations"
+            ).fetchall() if self.max_distance > 0 else []
+        # Perceptual hashes stay in memory for the Hamming-distance scan
+        self._hashes: List[Tuple[int, str]] = [(int(row[1], 16), row[0]) for row in rows]
+
+    def get(self, image: PreparedImage) -> Optional[Dict[str, Any]]:
+        """
+        Cached result for the same image, or a near-identical one when enabled
+        """
+        result = self._load(image.content_hash)
+        if result is not None or self.max_distance <= 0:
+            return result
+
+        best = None
+        for perceptual_hash, content_hash in self._hashes:
+            distance = hamming_distance(perceptual_hash, image.perceptual_hash)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, content_hash)
+        return self._load(best[1]) if best else None
+
+    def _load(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM vision_annotations WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, image: PreparedImage, result: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vision_annotations (content_hash, perceptual_hash, result, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (image.content_hash, format(image.perceptual_hash, '016x'), json.dumps(result), time.time())
+            )
+        if self.max_distance > 0:
+            self._hashes.append((image.perceptual_hash, image.content_hash))
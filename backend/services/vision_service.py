@@ -1,72 +1,179 @@
 from google.cloud import vision
-import io
+import asyncio
 import os
-from typing import List, Dict, Any
-import json
+from typing import BinaryIO, List, Dict, Any, Union
+from services.color_naming import name_colors, primary_color
+from services.image_preprocessing import prepare_image
+from services.metrics import instrument_upstream
+from services.product_resolver import get_product_index
+from services.tracing import trace_methods
+from services.vision_cache import VisionAnnotationCache
 
+# Annotations requested for every product photo
+FEATURES = [
+    {'type_': vision.Feature.Type.OBJECT_LOCALIZATION},
+    {'type_': vision.Feature.Type.LABEL_DETECTION},
+    {'type_': vision.Feature.Type.TEXT_DETECTION},
+    {'type_': vision.Feature.Type.IMAGE_PROPERTIES},
+]
+
+# images:annotate accepts at most 16 images per request
+MAX_IMAGES_PER_REQUEST = 16
+
+@trace_methods
 class VisionService:
     def __init__(self):
-        self.client = vision.ImageAnnotatorClient()
+        self._client = None
+        self.cache = VisionAnnotationCache()
 
-    async def analyze_image(self, image_content: bytes) -> Dict[str, Any]:
+    @property
+    def client(self) -> vision.ImageAnnotatorAsyncClient:
+        # The async gRPC client binds to the running event loop, so build it on first use
+        if self._client is None:
+            endpoint = os.getenv('VISION_API_ENDPOINT')
+            if endpoint:
+                # Local stand-in for offline runs: plain gRPC, no credentials
+                import grpc
+                from google.cloud.vision_v1.services.image_annotator.transports import (
+                    ImageAnnotatorGrpcAsyncIOTransport
+                )
+                transport = ImageAnnotatorGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(endpoint))
+                self._client = vision.ImageAnnotatorAsyncClient(transport=transport)
+            else:
+                self._client = vision.ImageAnnotatorAsyncClient()
+        return self._client
+
+    async def analyze_image(self, image_content: Union[bytes, BinaryIO]) -> Dict[str, Any]:
         """
         Analyze an image using Google Cloud Vision API
         Returns detailed information about the product in the image
         """
+        result = (await self.analyze_images([image_content]))[0]
+        if 'error' in result:
+            raise Exception(result['error'])
+        return result
+
+    async def analyze_images(self, images: List[Union[bytes, BinaryIO]]) -> List[Dict[str, Any]]:
+        """
+        Analyze several images with batched, non-blocking annotate requests.
+        Images are downscaled first and repeated photos are served from the
+        local annotation cache.
+        Returns one result per image, in order; failed images carry an 'error'
+        """
         try:
-            image = vision.Image(content=image_content)
-            
-            # Perform multiple types of detection
-            response = self.client.annotate_image({
-                'image': image,
-                'features': [
-                    {'type_': vision.Feature.Type.OBJECT_LOCALIZATION},
-                    {'type_': vision.Feature.Type.LABEL_DETECTION},
-                    {'type_': vision.Feature.Type.TEXT_DETECTION},
-                    {'type_': vision.Feature.Type.IMAGE_PROPERTIES},
-                ]
-            })
-
-            # Extract relevant information
-            result = {
-                'objects': [
-                    {
-                        'name': obj.name,
-                        'confidence': obj.score,
-                        'vertices': [[vertex.x, vertex.y] for vertex in obj.bounding_poly.normalized_vertices]
-                    }
-                    for obj in response.localized_object_annotations
-                ],
-                'labels': [
-                    {
-                        'description': label.description,
-                        'confidence': label.score,
-                    }
-                    for label in response.label_annotations
-                ],
-                'text': [
-                    text.description
-                    for text in response.text_annotations
-                ],
-                'colors': [
-                    {
-                        'color': {
-                            'red': color.color.red,
-                            'green': color.color.green,
-                            'blue': color.color.blue
-                        },
-                        'score': color.score,
-                        'pixel_fraction': color.pixel_fraction
-                    }
-                    for color in response.image_properties_annotation.dominant_colors.colors
-                ]
-            }
-
-            return result
+            prepared = await asyncio.gather(*(asyncio.to_thread(prepare_image, image) for image in images))
+        except Exception as e:
+            raise Exception(f"Error reading image: {str(e)}")
 
+        # The cache reads SQLite (and may scan perceptual hashes), so it runs off the event loop
+        results: List[Any] = list(await asyncio.gather(*(asyncio.to_thread(self.cache.get, image) for image in prepared)))
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses:
+            return results
+
+        try:
+            requests = [
+                vision.AnnotateImageRequest(image=vision.Image(content=prepared[i].content), features=FEATURES)
+                for i in misses
+            ]
+            batches = await asyncio.gather(*(
+                self._batch_annotate(requests[i:i + MAX_IMAGES_PER_REQUEST])
+                for i in range(0, len(requests), MAX_IMAGES_PER_REQUEST)
+            ))
         except Exception as e:
             raise Exception(f"Error analyzing image: {str(e)}")
 
+        responses = [response for batch in batches for response in batch.responses]
+        annotated = []
+        for i, response in zip(misses, responses):
+            if response.error.message:
+                results[i] = {'error': f"Error analyzing image: {response.error.message}"}
+            else:
+                results[i] = self._parse_response(response)
+                annotated.append(i)
+        await asyncio.gather(*(asyncio.to_thread(self.cache.put, prepared[i], results[i]) for i in annotated))
+        return results
+
+    @instrument_upstream('vision')
+    async def _batch_annotate(self, requests: List[vision.AnnotateImageRequest]):
+        return await self.client.batch_annotate_images(requests=requests)
+
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """
+        Extract relevant information from an AnnotateImageResponse
+        """
+        return {
+            'objects': [
+                {
+                    'name': obj.name,
+                    'confidence': obj.score,
+                    'vertices': [[vertex.x, vertex.y] for vertex in obj.bounding_poly.normalized_vertices]
+                }
+                for obj in response.localized_object_annotations
+            ],
+            'labels': [
+                {
+                    'description': label.description,
+                    'confidence': label.score,
+                }
+                for label in response.label_annotations
+            ],
+            'text': [
+                text.description
+                for text in response.text_annotations
+            ],
+            'colors': [
+                {
+                    'color': {
+                        'red': color.color.red,
+                        'green': color.color.green,
+                        'blue': color.color.blue
+                    },
+                    'score': color.score,
+                    'pixel_fraction': color.pixel_fraction
+                }
+                for color in response.image_properties_annotation.dominant_colors.colors
+            ]
+        }
+
+    def merge_results(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge the results for several photos of the same product into one.
+        Objects and labels keep their best confidence across images, text is
+        concatenated, and color pixel fractions are averaged over the images
+        """
+        analyzed = [result for result in results if 'error' not in result]
+        if not analyzed:
+            raise Exception(results[0]['error'] if results else "No images to analyze")
+
+        objects: Dict[str, Dict] = {}
+        labels: Dict[str, Dict] = {}
+        full_text = []
+        words = []
+        colors = []
+        for result in analyzed:
+            for obj in result['objects']:
+                if obj['name'] not in objects or obj['confidence'] > objects[obj['name']]['confidence']:
+                    objects[obj['name']] = obj
+            for label in result['labels']:
+                key = label['description'].lower()
+                if key not in labels or label['confidence'] > labels[key]['confidence']:
+                    labels[key] = label
+            if result['text']:
+                full_text.append(result['text'][0])
+                words.extend(result['text'][1:])
+            for color in result['colors']:
+                colors.append({**color, 'pixel_fraction': color['pixel_fraction'] / len(analyzed)})
+
+        return {
+            'objects': sorted(objects.values(), key=lambda o: o['confidence'], reverse=True),
+            'labels': sorted(labels.values(), key=lambda l: l['confidence'], reverse=True),
+            'text': (['\n'.join(full_text)] + words) if full_text else [],
+            'colors': sorted(colors, key=lambda c: c['score'] * c['pixel_fraction'], reverse=True),
+            'image_count': len(analyzed),
+            'errors': [result['error'] for result in results if 'error' in result]
+        }
+
     def extract_product_details(self, vision_result: Dict[str, Any]) -> Dict[str, Any]:
         """
         Extract relevant product details from Vision API results
@@ -90,15 +197,22 @@ class VisionService:
         # Extract any visible text (could be brand names, model numbers, etc.)
         text_content = vision_result['text'][1:] if len(vision_result['text']) > 1 else []
 
-        # Get dominant colors
-        colors = [
-            f"{color['color']['red']}, {color['color']['green']}, {color['color']['blue']}"
-            for color in vision_result['colors'][:3]
-        ]
+        # Identify the product from the text on the packaging
+        identity = get_product_index().resolve(vision_result['text'][0]) if vision_result['text'] else None
+
+        # Name the dominant colors with eBay Color aspect values
+        named_colors = name_colors(vision_result['colors'])
+        color = primary_color(named_colors)
 
         return {
             'main_object': main_object,
             'attributes': relevant_labels,
             'detected_text': text_content,
-            'dominant_colors': colors
+            'dominant_colors': [c['name'] for c in named_colors[:3]],
+            'color': color,
+            # Measured from the photo, so listed as-is
+            'item_specifics': {'Color': color} if color else {},
+            # Read from packaging text; the model verifies these before they're used
+            'item_specific_hints': identity['attributes'] if identity else {},
+            'identity': identity
         }